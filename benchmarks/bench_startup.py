@@ -0,0 +1,67 @@
+# Startup time benchmark : "import errormodel" and GUI first paint, each
+# measured in fresh interpreter processes.
+#
+# Usage : python benchmarks/bench_startup.py [--repeat 5]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+HYDRA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hydra')
+
+IMPORT_MODEL = '''
+import time
+t0 = time.perf_counter()
+import errormodel
+print(time.perf_counter() - t0)
+'''
+
+# Time from the start of the script until the first model result is displayed
+GUI_FIRST_PAINT = '''
+import json, sys, time
+t0 = time.perf_counter()
+from PyQt5 import QtWidgets
+import hydra
+t_import = time.perf_counter()
+app = QtWidgets.QApplication(sys.argv)
+window = hydra.MainWindow()
+window.show()
+app.processEvents()
+t_window = time.perf_counter()
+while window.tableInfo.item(0, 1) is None :
+    app.processEvents()
+    time.sleep(1e-4)
+t_paint = time.perf_counter()
+print(json.dumps({"import" : t_import - t0, "window" : t_window - t0, "first_paint" : t_paint - t0}))
+'''
+
+
+def run(script, env = None) :
+    out = subprocess.run([sys.executable, '-c', script], cwd = HYDRA_DIR, env = env,
+                         check = True, capture_output = True, text = True).stdout
+    return out.strip().splitlines()[-1]
+
+
+def main() :
+    parser = argparse.ArgumentParser(description = 'Benchmark Hydra startup time')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'number of fresh processes per measurement')
+    parser.add_argument('--no-gui', action = 'store_true', help = 'only measure the model import')
+    args = parser.parse_args()
+
+    times = [float(run(IMPORT_MODEL)) for _ in range(args.repeat)]
+    print('import errormodel   : median %.1f ms, min %.1f ms'%(np.median(times)*1e3, min(times)*1e3))
+
+    if not args.no_gui :
+        env = dict(os.environ, QT_QPA_PLATFORM = os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+        runs = [json.loads(run(GUI_FIRST_PAINT, env)) for _ in range(args.repeat)]
+        for stage in ('import', 'window', 'first_paint') :
+            values = [r[stage] for r in runs]
+            print('GUI %-16s: median %.1f ms, min %.1f ms'%(stage, np.median(values)*1e3, min(values)*1e3))
+
+
+if __name__ == '__main__' :
+    main()
@@ -0,0 +1,92 @@
+# Benchmark of the vectorized compute_total_errors against the original
+# per-frequency Python loop.
+#
+# Usage : python benchmarks/bench_total_errors.py [--sizes 100 10000 1000000]
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hydra'))
+import errormodel as em
+
+KHZ = em.KHZ
+MHZ = em.MHZ
+
+PARAMS = dict(Om = 50*KHZ, dzB = 150, nuSE = 1e-7, SBa = 1e-23, SV = 1e-15, nu_XY = 1.5*MHZ,
+              g_factor = em.G_FACTOR_CHIP, vib_mode = em.VIB_MODE_AXIAL_STR,
+              chi = 10**-1.8, SA = 1e-12, nbar = 10**-0.1, sym_fluc = 2*np.pi*3)
+
+
+def compute_total_errors_loop(nu_c_list, Om, dzB, nuSE, SBa, SV, nu_XY, g_factor, vib_mode,
+                              chi, SA, nbar, sym_fluc) :
+    # Reference implementation : one model evaluation per COM frequency, as
+    # compute_total_errors was written before it was vectorized.
+    errors_h, errors_d, errors_t, errors_a = [], [], [], []
+    for nu_c in nu_c_list :
+        nu_s = np.sqrt(3) * nu_c
+        if vib_mode == em.VIB_MODE_AXIAL_STR :
+            eta = em.compute_eta(nu_s, dzB)
+            ndot = em.ndot_STR(nu_c, nu_s, em.DIST_ELECTRODE, nuSE)
+        else :
+            eta = em.compute_eta(nu_c, dzB)
+            ndot = em.ndot_COM(nu_c, nuSE)
+        errors_h += [em.err_heating(ndot, eta, Om, em.HEATING_FACTOR)]
+        
+        tgate = np.pi/(eta * Om) * em.GATE_TIME_COST
+        SBv = em.dBdV(nu_c, dzB, g_factor)**2 * SV
+        SBi = em.dBdI(em.X_RESOLUTION_DAC, em.DIST_ELECTRODE)**2 * SA
+        errors_d += [em.err_decoherence(tgate, em.compute_T2(SBa + SBv + SBi))]
+        
+        if vib_mode == em.VIB_MODE_AXIAL_STR :
+            Kcoeff = em.coefficientKerr(nu_s, nu_XY)
+            var_kerr = 2 * em.kerr_trapfluc_variance(Kcoeff, em.compute_nbar_r(nu_XY))
+        else :
+            var_kerr = 0
+        errors_t += [em.err_trap_fluc(var_kerr + sym_fluc**2, nbar, tgate)]
+        
+        if chi != 0 :
+            amp_noise = em.compute_noise(tgate, em.compute_amp_PSD(chi))
+            errors_a += [em.err_amp_noise(tgate, amp_noise)]
+        else :
+            errors_a += [0]
+    errors_o = em.error_offres(Om, nu_c_list)
+    
+    return np.array(errors_h), np.array(errors_d), np.array(errors_t), np.array(errors_o), np.array(errors_a)
+
+
+def best_time(func, repeat = 5) :
+    # Best wall time of a single call
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat = repeat, number = number))/number
+
+
+def main() :
+    parser = argparse.ArgumentParser(description = 'Benchmark compute_total_errors')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [100, 10000, 1000000],
+                        help = 'number of COM frequency points')
+    args = parser.parse_args()
+    
+    print('%10s %14s %14s %10s %12s'%('points', 'loop [s]', 'vector [s]', 'speedup', 'max rel diff'))
+    for size in args.sizes :
+        nu_c_list = np.linspace(100, 500, size)*KHZ
+        
+        # The loop is timed once, it takes tens of seconds for 10^6 points
+        t_start = time.perf_counter()
+        ref = compute_total_errors_loop(nu_c_list, **PARAMS)
+        t_loop = time.perf_counter() - t_start
+        
+        t_vec = best_time(lambda : em.compute_total_errors(nu_c_list, **PARAMS))
+        out = em.compute_total_errors(nu_c_list, **PARAMS)
+        diff = max(np.max(np.abs(a - b)/np.maximum(np.abs(b), 1e-300)) for a, b in zip(out, ref))
+        
+        print('%10d %14.3e %14.3e %10.1f %12.1e'%(size, t_loop, t_vec, t_loop/t_vec, diff))
+
+
+if __name__ == '__main__' :
+    main()
@@ -0,0 +1,312 @@
+# Benchmark suite for the error model and the GUI update path.
+#
+# Benchmarks follow the asv conventions : classes with time_* methods, optional
+# setup(), and params / param_names for parametrized benchmarks. A setup raising
+# NotImplementedError skips the benchmark. Run them with benchmarks/run.py.
+
+import json
+import os
+import sys
+
+import numpy as np
+
+HYDRA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hydra')
+sys.path.insert(0, HYDRA_DIR)
+
+import errormodel as em
+import calibration
+import evaluate
+import filterfunction
+import graph
+import heatmap
+import msgate
+import sweep
+
+KHZ = em.KHZ
+MHZ = em.MHZ
+
+SIZES = [100, 10000, 1000000]
+VIB_MODES = [em.VIB_MODE_AXIAL_STR, em.VIB_MODE_AXIAL_COM]
+
+PARAMS = dict(Om = 50*KHZ, dzB = 150, nuSE = 1e-7, SBa = 1e-23, SV = 1e-15, nu_XY = 1.5*MHZ,
+              g_factor = em.G_FACTOR_CHIP, chi = 10**-1.8, SA = 1e-12, nbar = 10**-0.1,
+              sym_fluc = 2*np.pi*3)
+
+
+def nu_grid(size) :
+    return np.linspace(100, 500, size)*KHZ
+
+
+class TimeChannels :
+    # Each error channel on its own, from precomputed intermediate quantities
+    params = [SIZES, VIB_MODES]
+    param_names = ['points', 'vib_mode']
+
+    def setup(self, size, vib_mode) :
+        self.nu_c = nu_grid(size)
+        self.nu_s = np.sqrt(3) * self.nu_c
+        self.nu = self.nu_s if vib_mode == em.VIB_MODE_AXIAL_STR else self.nu_c
+        self.vib_mode = vib_mode
+        self.eta = em.compute_eta(self.nu, PARAMS['dzB'])
+        self.tgate = np.pi/(self.eta * PARAMS['Om']) * em.GATE_TIME_COST
+
+    def time_heating(self, size, vib_mode) :
+        if self.vib_mode == em.VIB_MODE_AXIAL_STR :
+            ndot = em.ndot_STR(self.nu_c, self.nu_s, em.DIST_ELECTRODE, PARAMS['nuSE'])
+        else :
+            ndot = em.ndot_COM(self.nu_c, PARAMS['nuSE'])
+        em.err_heating(ndot, self.eta, PARAMS['Om'], em.HEATING_FACTOR)
+
+    def time_decoherence(self, size, vib_mode) :
+        SBv = em.dBdV(self.nu_c, PARAMS['dzB'], PARAMS['g_factor'])**2 * PARAMS['SV']
+        SBi = em.dBdI(em.X_RESOLUTION_DAC, em.DIST_ELECTRODE)**2 * PARAMS['SA']
+        em.err_decoherence(self.tgate, em.compute_T2(PARAMS['SBa'] + SBv + SBi))
+
+    def time_trap_fluc(self, size, vib_mode) :
+        var = 2 * em.kerr_trapfluc_variance(em.coefficientKerr(self.nu_s, PARAMS['nu_XY']),
+                                            em.compute_nbar_r(PARAMS['nu_XY']))
+        em.err_trap_fluc(var + PARAMS['sym_fluc']**2, PARAMS['nbar'], self.tgate)
+
+    def time_offres(self, size, vib_mode) :
+        em.error_offres(PARAMS['Om'], self.nu_c)
+
+    def time_offres_pulse_shaping(self, size, vib_mode) :
+        em.err_offres_ps(PARAMS['Om'], PARAMS['dzB'], self.nu_c)
+
+    def time_amp_noise(self, size, vib_mode) :
+        amp_noise = em.compute_noise(self.tgate, em.compute_amp_PSD(PARAMS['chi']))
+        em.err_amp_noise(self.tgate, amp_noise)
+
+
+class TimeTotalErrors :
+    # compute_total_errors over COM frequency grids
+    params = [SIZES, VIB_MODES, [False, True]]
+    param_names = ['points', 'vib_mode', 'pulse_shaping']
+
+    def setup(self, size, vib_mode, pulse_shaping) :
+        self.nu_c = nu_grid(size)
+
+    def time_compute_total_errors(self, size, vib_mode, pulse_shaping) :
+        em.compute_total_errors(self.nu_c, vib_mode = vib_mode, pulse_shaping = pulse_shaping, **PARAMS)
+
+
+class TimeAllModes :
+    # compute_total_errors for the four vibrational modes side by side in one call
+    params = [SIZES[:2]]
+    param_names = ['points']
+
+    def setup(self, size) :
+        self.nu_c = nu_grid(size)
+        self.vib_mode = np.array([em.VIB_MODE_AXIAL_STR, em.VIB_MODE_AXIAL_COM,
+                                  em.VIB_MODE_RADIAL_STR, em.VIB_MODE_RADIAL_COM])[:, None]
+
+    def time_compute_total_errors(self, size) :
+        em.compute_total_errors(self.nu_c, vib_mode = self.vib_mode, **PARAMS)
+
+
+class TimeOffResInterpolator :
+    # Pulse shaping interpolator over arrays of (Om, dzB, nu_c)
+    params = [SIZES]
+    param_names = ['points']
+
+    def setup(self, size) :
+        rng = np.random.default_rng(0)
+        self.Om = rng.uniform(20, 100, size)*KHZ
+        self.dzB = rng.uniform(25, 200, size)
+        self.nu_c = rng.uniform(100, 500, size)*KHZ
+        em.get_offres_interpolator()
+
+    def time_interpolate(self, size) :
+        em.err_offres_ps(self.Om, self.dzB, self.nu_c)
+
+
+class TimeFilterFunction :
+    # Dephasing of a measured noise spectrum over the gate times of a COM frequency
+    # grid, integrated (first evaluation) and from the cache
+    params = [['free', 'echo', 'cpmg:8']]
+    param_names = ['sequence']
+
+    def setup(self, sequence) :
+        f = np.geomspace(0.1, 1e6, 1000)
+        self.spectrum = filterfunction.NoiseSpectrum(f, 1e-22*(1 + 100/f))
+        self.sequence = sequence
+        self.tgate = em.compute_tgate(np.sqrt(3)*nu_grid(100), PARAMS['dzB'], PARAMS['Om'])
+
+    def time_integrate(self, sequence) :
+        self.spectrum._cache.clear()
+        self.spectrum.dephasing(self.tgate, self.sequence)
+
+    def time_cached(self, sequence) :
+        self.spectrum.dephasing(self.tgate, self.sequence)
+
+
+class TimeMSGate :
+    # RK4 integration of batches of simulated MS gates, 1000 steps
+    params = [[1, 64, 256]]
+    param_names = ['batch']
+
+    def setup(self, batch) :
+        rng = np.random.default_rng(0)
+        Om = rng.uniform(20, 100, batch)*KHZ
+        gate = msgate.gate_parameters(Om, rng.uniform(25, 200, batch), rng.uniform(100, 400, batch)*KHZ)
+        self.args = (Om, gate['eta'], gate['nu'], gate['mu'], gate['T'], em.VIB_MODE_AXIAL_STR, msgate.RAMP,
+                     msgate.N_FOCK, 1000, True)
+
+    def time_integrate(self, batch) :
+        msgate._integrate(*self.args)
+
+
+class TimeOptimizeFidelity :
+    # optimize_fidelity_batch on stacked error curves
+    params = [[1, 100, 10000]]
+    param_names = ['curves']
+
+    def setup(self, curves) :
+        self.nu_c = nu_grid(100)
+        dzB = np.linspace(25, 200, curves)[:, None]
+        self.errors = sum(em.compute_total_errors(self.nu_c[None, :], **dict(PARAMS, dzB = dzB)))
+
+    def time_optimize_batch(self, curves) :
+        em.optimize_fidelity_batch(self.nu_c, self.errors)
+
+    def time_optimize_single(self, curves) :
+        em.optimizeFidelity(self.nu_c, self.errors[0])
+
+
+class TimeSweep :
+    # Full-factorial sweep, including the optimization of every grid point
+    params = [[100, 10000, 1000000]]
+    param_names = ['points']
+
+    def setup(self, points) :
+        n = int(round(points**0.5))
+        self.sweep_params = dict(PARAMS, dzB = np.linspace(25, 200, n), Om = np.linspace(25, 100, points//n)*KHZ)
+
+    def time_sweep(self, points) :
+        sweep.sweep(**self.sweep_params)
+
+
+class TimeEvaluateState :
+    # Model evaluation of a GUI state, as done by the GUI worker
+    params = [VIB_MODES, [False, True]]
+    param_names = ['vib_mode', 'pulse_shaping']
+
+    def setup(self, vib_mode, pulse_shaping) :
+        with open(os.path.join(HYDRA_DIR, 'presets', 'chip_preset.json')) as f :
+            self.state = json.load(f)
+        self.state['vib_mode'] = vib_mode
+        self.state['display'] = {"show_offres" : True, "include_offres" : True, "pulse_shaping" : pulse_shaping}
+        self.nu_c = nu_grid(100)
+
+    def time_evaluate_state(self, vib_mode, pulse_shaping) :
+        evaluate.evaluate_state(self.state, self.nu_c)
+
+    def time_evaluate_state_adaptive(self, vib_mode, pulse_shaping) :
+        evaluate.evaluate_state(self.state)
+
+
+class TimeUpdateSymFluc :
+    # Incremental update of a GUI state on the adaptive grid when only symfluc
+    # changes, through a graph.ModelGraph as in the GUI. The setup checks that
+    # every round of the grid only recomputes the trap frequency fluctuation
+    # errors.
+    params = [VIB_MODES, [False, True]]
+    param_names = ['vib_mode', 'pulse_shaping']
+
+    def setup(self, vib_mode, pulse_shaping) :
+        with open(os.path.join(HYDRA_DIR, 'presets', 'chip_preset.json')) as f :
+            self.state = json.load(f)
+        self.state['vib_mode'] = vib_mode
+        self.state['display'] = {"show_offres" : True, "include_offres" : True, "pulse_shaping" : pulse_shaping}
+        self.graph = graph.ModelGraph()
+        self.symfluc = self.state['slider']['symfluc']
+        evaluate.evaluate_state(self.state, graph = self.graph)
+
+        self.time_update(vib_mode, pulse_shaping)
+        recomputed = self.graph.stage_recomputed()
+        unexpected = {name for names in recomputed for name in names} - {'variance', 'err_trap_fluc'}
+        if unexpected :
+            raise AssertionError('Changing symfluc recomputed %s'%', '.join(sorted(unexpected)))
+
+    def time_update(self, vib_mode, pulse_shaping) :
+        # Alternate between two close values, which leave the grid in place
+        self.state['slider']['symfluc'] = self.symfluc if self.state['slider']['symfluc'] != self.symfluc \
+                                          else self.symfluc + 1e-4
+        evaluate.evaluate_state(self.state, graph = self.graph)
+
+
+class TimeHeatmap :
+    # Heatmap tab over (dzB, Om), first refinement level and full grid
+    params = [[50, 200]]
+    param_names = ['points']
+
+    def setup(self, points) :
+        with open(os.path.join(HYDRA_DIR, 'presets', 'chip_preset.json')) as f :
+            self.state = json.load(f)
+        self.axes = ('dzB', heatmap.axis_values('dzB', points), 'Om', heatmap.axis_values('Om', points))
+        self.nu_c = nu_grid(100)
+
+    def time_first_level(self, points) :
+        next(heatmap.progressive(self.state, *self.axes, self.nu_c))
+
+    def time_full(self, points) :
+        for _ in heatmap.progressive(self.state, *self.axes, self.nu_c) :
+            pass
+
+
+class TimeCalibration :
+    # Fit of nuSE, SBa and SV to measurements simulated from PARAMS, 2 % noise
+    params = [[100, 1000]]
+    param_names = ['measurements']
+
+    def setup(self, measurements) :
+        rng = np.random.default_rng(0)
+        self.params = dict(PARAMS, chi = 0)
+        self.measurements = {"dzB" : rng.uniform(30, 200, measurements), "Om" : rng.uniform(25, 150, measurements)*KHZ,
+                             "nu_c" : rng.uniform(100, 500, measurements)*KHZ, "sigma" : None}
+        errors = em.compute_total_errors(self.measurements['nu_c'], **dict(self.params, dzB = self.measurements['dzB'],
+                                                                           Om = self.measurements['Om']))
+        total = errors[0] + errors[1] + errors[2] + errors[4]
+        self.measurements['infidelity'] = total*np.exp(0.02*rng.standard_normal(measurements))
+
+    def time_fit(self, measurements) :
+        calibration.fit(self.measurements, self.params, ('nuSE', 'SBa', 'SV'))
+
+
+class TimeUpdateGraph :
+    # GUI update path of MainWindow, offscreen : model evaluation of the current
+    # state followed by plotting the trace and filling tableInfo
+    params = [VIB_MODES, [False, True]]
+    param_names = ['vib_mode', 'pulse_shaping']
+
+    def setup(self, vib_mode, pulse_shaping) :
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        try :
+            from PyQt5 import QtWidgets
+            import hydra
+        except ImportError :
+            raise NotImplementedError('PyQt5 and pyqtgraph are required')
+
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        self.window = hydra.MainWindow()
+        self.window.comboBoxVibMode.setCurrentIndex(vib_mode)
+        self.window.radioBtnShowOffRes.setChecked(True)
+        self.window.radioBtnIncludeOffErr.setChecked(True)
+        self.window.radioBtnPulseShaping.setChecked(pulse_shaping)
+        self.window.update_timer.stop()
+        self.window.thread_pool.waitForDone()
+        self.time_update_graph(vib_mode, pulse_shaping)
+
+    def teardown(self, vib_mode, pulse_shaping) :
+        self.window.update_timer.stop()
+        self.window.thread_pool.waitForDone()
+        self.window.close()
+
+    def time_update_graph(self, vib_mode, pulse_shaping) :
+        # Synchronous equivalent of update_graph, bypassing the debounce timer,
+        # the worker thread and the result cache
+        result = evaluate.evaluate_state(self.window.get_state())
+        self.window.apply_result(self.window.active_trace, result)
+
+    def time_plot(self, vib_mode, pulse_shaping) :
+        self.window.traces[self.window.active_trace].plotTrace()
@@ -0,0 +1,133 @@
+# Runner for the benchmark suite in benchmarks.py.
+#
+# Usage :
+#   QT_QPA_PLATFORM=offscreen python benchmarks/run.py -o results.json
+#   python benchmarks/run.py -o new.json --compare old.json
+#   python benchmarks/run.py --bench TimeTotalErrors --max-points 10000
+#
+# Results are written as JSON, with one entry per benchmark and parameter
+# combination, so that runs can be compared across commits.
+
+import argparse
+import datetime
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import timeit
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import benchmarks
+
+
+def git_commit() :
+    try :
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)),
+                              capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) :
+        return None
+
+
+def collect(pattern) :
+    # (name, class, method name, parameter combination) of every selected benchmark
+    for cls_name, cls in inspect.getmembers(benchmarks, inspect.isclass) :
+        if not cls_name.startswith('Time') or cls.__module__ != benchmarks.__name__ :
+            continue
+        combos = list(itertools.product(*cls.params)) if hasattr(cls, 'params') else [()]
+        for method in sorted(name for name in vars(cls) if name.startswith('time_')) :
+            name = '%s.%s'%(cls_name, method)
+            if pattern and not re.search(pattern, name) :
+                continue
+            for combo in combos :
+                yield name, cls, method, combo
+
+
+def run_one(cls, method, combo, repeat) :
+    # Per call wall times of the best of repeat rounds, None if skipped
+    instance = cls()
+    try :
+        if hasattr(instance, 'setup') :
+            instance.setup(*combo)
+    except NotImplementedError :
+        return None
+    try :
+        timer = timeit.Timer(lambda : getattr(instance, method)(*combo))
+        number, _ = timer.autorange()
+        times = [t/number for t in timer.repeat(repeat = repeat, number = number)]
+    finally :
+        if hasattr(instance, 'teardown') :
+            instance.teardown(*combo)
+    return {"number" : number, "min" : min(times), "median" : float(np.median(times)),
+            "max" : max(times), "times" : times}
+
+
+def compare(results, baseline, threshold) :
+    # Print the ratio to a baseline run, returns the number of regressions
+    base = {(r['name'], json.dumps(r['params'])) : r for r in baseline['results']}
+    regressions = 0
+    print('\n%-60s %12s %12s %8s'%('benchmark', 'baseline', 'current', 'ratio'))
+    for r in results :
+        key = (r['name'], json.dumps(r['params']))
+        if key not in base or r['stats'] is None or base[key]['stats'] is None :
+            continue
+        ratio = r['stats']['min']/base[key]['stats']['min']
+        flag = ''
+        if ratio > threshold :
+            flag = '  REGRESSION'
+            regressions += 1
+        label = '%s%s'%(r['name'], r['params'])
+        print('%-60s %12.3e %12.3e %8.2f%s'%(label, base[key]['stats']['min'], r['stats']['min'], ratio, flag))
+    return regressions
+
+
+def main() :
+    parser = argparse.ArgumentParser(description = 'Run the Hydra benchmark suite')
+    parser.add_argument('-o', '--output', help = 'write results to this JSON file')
+    parser.add_argument('--bench', help = 'only run benchmarks matching this regular expression')
+    parser.add_argument('--max-points', type = int, help = "skip parameter combinations with more 'points'")
+    parser.add_argument('--repeat', type = int, default = 5, help = 'timing rounds per benchmark')
+    parser.add_argument('--compare', help = 'baseline results JSON to compare against')
+    parser.add_argument('--threshold', type = float, default = 1.25,
+                        help = 'ratio to the baseline reported as a regression')
+    args = parser.parse_args()
+
+    results = []
+    for name, cls, method, combo in collect(args.bench) :
+        params = dict(zip(getattr(cls, 'param_names', []), combo))
+        if args.max_points is not None and params.get('points', 0) > args.max_points :
+            continue
+        stats = run_one(cls, method, combo, args.repeat)
+        results += [{"name" : name, "params" : params, "stats" : stats}]
+        if stats is None :
+            print('%-60s skipped'%('%s%s'%(name, params)))
+        else :
+            print('%-60s %12.3e s'%('%s%s'%(name, params), stats['min']))
+
+    run = {"commit" : git_commit(),
+           "date" : datetime.datetime.now().isoformat(),
+           "machine" : {"platform" : platform.platform(), "processor" : platform.processor(),
+                        "python" : platform.python_version(), "numpy" : np.__version__,
+                        "cpus" : os.cpu_count()},
+           "results" : results}
+
+    if args.output :
+        with open(args.output, 'w') as f :
+            json.dump(run, f, indent = 1)
+
+    if args.compare :
+        with open(args.compare) as f :
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold) :
+            return 1
+    return 0
+
+
+if __name__ == '__main__' :
+    sys.exit(main())
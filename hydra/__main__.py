@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The modules of the hydra directory import each other by their plain names, as
+# when running hydra.py directly
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cli
+
+if __name__ == '__main__' :
+    sys.exit(cli.main())
@@ -0,0 +1,314 @@
+import copy
+import itertools
+
+import numpy as np
+import errormodel as em
+import evaluate
+import sensitivity
+
+# Calibration of the noise parameters against measured gate infidelities.
+#
+# A measurement file is a table with a header line (.csv comma separated,
+# otherwise whitespace separated, # comments) of the columns
+#   dzB (T/m), Om (kHz), nu_c (kHz), infidelity, and optionally sigma
+# where sigma is the standard deviation of the measured infidelity. Other
+# parameters (radial frequency, architecture, vibrational mode, toggles...) are
+# those of the preset the fit starts from.
+#
+# The parameters of FIT_PARAMS are fitted in decades, like the sliders, by
+# weighted least squares on the logarithm of the infidelity :
+#
+#   cost = sum_i ((ln model_i - ln infidelity_i)/s_i)^2,  s_i = sigma_i/infidelity_i
+#
+# (s_i = 1 without sigma). The model is evaluated at all measurements in one
+# vectorized call, its Jacobian is exact (forward-mode, see sensitivity.py). The
+# starting point is the best of the preset and a coarse grid over the bounds,
+# also evaluated in batched calls, then refined by Levenberg-Marquardt within
+# the bounds of the sliders.
+#
+#   measurements = calibration.load_measurements(['run1.csv', 'run2.csv'])
+#   result = calibration.fit_state(state, measurements)
+#   preset = calibration.fitted_preset(state, result)
+
+FIT_PARAMS = ('nuSE', 'SBa', 'SV', 'chi', 'SA')
+
+# SA only enters the model through the magnetic noise of the current noise, like
+# SBa, the two cannot be told apart and SA is not fitted unless asked for
+DEFAULT_FIT_PARAMS = ('nuSE', 'SBa', 'SV', 'chi')
+
+# Range of the sliders, in decades
+FIT_BOUNDS = {"nuSE" : (-8, -4), "SBa" : (-26, -20), "SV" : (-20, -12), "chi" : (-4, -1), "SA" : (-18, -6)}
+
+# Toggle of the GUI enabling the noise source of a parameter
+TOGGLES = {"chi" : 'amp_noise', "SA" : 'ccw_noise'}
+
+MEASUREMENT_COLUMNS = ('dzB', 'Om', 'nu_c', 'infidelity')
+
+START_POINTS = 3 # Starting values per parameter of the coarse grid
+MAX_ITERATIONS = 200
+TOLERANCE = 1e-9 # Relative decrease of the cost predicted at convergence
+
+# Number of (starting point, measurement) evaluations held in memory at once
+CHUNK_EVALUATIONS = 2**20
+
+
+# ------------------------------------------
+# Measurements
+# ------------------------------------------
+
+def load_measurements(paths) :
+    # Measurements of one or several files (see above), concatenated.
+    # Returns a dict of arrays in the units of em.compute_total_errors :
+    #   dzB, Om, nu_c, infidelity, and sigma (None without uncertainties)
+    columns = {name : [] for name in MEASUREMENT_COLUMNS + ('sigma',)}
+    for path in paths :
+        delimiter = ',' if path.endswith('.csv') else None
+        with open(path) as f :
+            lines = [line for line in f if line.strip() and not line.lstrip().startswith('#')]
+        names = [name.strip() for name in lines[0].split(delimiter)] if lines else []
+        missing = [name for name in MEASUREMENT_COLUMNS if name not in names]
+        if missing :
+            raise ValueError('Measurements %s have no column %s'%(path, ', '.join(missing)))
+        data = np.loadtxt(lines[1:], delimiter = delimiter, comments = '#', ndmin = 2).reshape(-1, len(names))
+        for name in MEASUREMENT_COLUMNS :
+            columns[name].append(data[:, names.index(name)])
+        columns['sigma'].append(data[:, names.index('sigma')] if 'sigma' in names else np.full(len(data), np.nan))
+
+    measurements = {name : np.concatenate(values).astype(float) for name, values in columns.items()}
+    measurements['Om'] = measurements['Om']*em.KHZ
+    measurements['nu_c'] = measurements['nu_c']*em.KHZ
+
+    sigma = measurements['sigma']
+    if np.all(np.isnan(sigma)) :
+        measurements['sigma'] = None
+    elif np.any(np.isnan(sigma)) :
+        raise ValueError('Give sigma for all the measurements or for none')
+    elif np.any(sigma <= 0) :
+        raise ValueError('Measurement uncertainties must be positive')
+
+    infidelity = measurements['infidelity']
+    if len(infidelity) == 0 :
+        raise ValueError('No measurements')
+    if not np.all((infidelity > 0) & (infidelity < 1)) :
+        raise ValueError('Measured infidelities must be in (0, 1)')
+    return measurements
+
+
+# ------------------------------------------
+# Least squares
+# ------------------------------------------
+
+class CalibrationResult :
+    # names : fitted parameters
+    # log10 : fitted values, in decades
+    # covariance : covariance of log10 (decades^2), nan for parameters at a bound
+    # residuals : weighted residuals of the log infidelity at every measurement
+    # model : infidelity of the fitted model at every measurement
+    # chi2, dof : cost at the optimum and degrees of freedom
+    # at_bound : parameters ending on a bound of FIT_BOUNDS
+    # iterations, converged : state of the Levenberg-Marquardt iterations
+
+    def __init__(self, names, log10, covariance, residuals, model, dof, at_bound, iterations, converged) :
+        self.names = names
+        self.log10 = log10
+        self.covariance = covariance
+        self.residuals = residuals
+        self.model = model
+        self.chi2 = float(residuals @ residuals)
+        self.dof = dof
+        self.at_bound = at_bound
+        self.iterations = iterations
+        self.converged = converged
+
+    def __repr__(self) :
+        return 'CalibrationResult(%s)'%', '.join('%s = %.3g'%item for item in self.params.items())
+
+    @property
+    def params(self) :
+        # Fitted values, in the units of em.compute_total_errors
+        return {name : 10**value for name, value in zip(self.names, self.log10)}
+
+    @property
+    def uncertainty(self) :
+        # Standard deviation of the fitted values, in decades
+        return np.sqrt(np.diag(self.covariance))
+
+    @property
+    def correlation(self) :
+        std = self.uncertainty
+        with np.errstate(invalid = 'ignore', divide = 'ignore') :
+            return self.covariance/np.outer(std, std)
+
+
+def _model_params(params, measurements) :
+    # Keyword arguments of em.compute_total_errors at every measurement
+    model = dict(params)
+    model['dzB'] = measurements['dzB']
+    model['Om'] = measurements['Om']
+    return model
+
+def _log_weights(measurements) :
+    if measurements['sigma'] is None :
+        return 1.
+    return measurements['sigma']/measurements['infidelity']
+
+def _linearize(theta, names, params, measurements, include_offres) :
+    # Weighted residuals of the log infidelity and their Jacobian with respect to
+    # the parameters in decades
+    model = _model_params(params, measurements)
+    model.update({name : 10**value for name, value in zip(names, theta)})
+    _, total, grad = sensitivity.gradient(measurements['nu_c'], model, include_offres, wrt = names)
+    if not np.all(np.isfinite(total) & (total > 0)) :
+        raise ValueError('The model is not defined at %d measurements, check that they lie within the '
+                         'off-resonant table'%np.sum(~(np.isfinite(total) & (total > 0))))
+    weights = _log_weights(measurements)
+    residuals = (np.log(total) - np.log(measurements['infidelity']))/weights
+    jacobian = np.stack([grad[name] * model[name] * np.log(10)/(total*weights) for name in names], axis = 1)
+    return residuals, jacobian, total
+
+def _start_point(names, params, measurements, include_offres) :
+    # Best of the nominal parameters and a coarse grid over the bounds, by the cost
+    # of batched model evaluations (the grid along the first axis)
+    low, high = np.array([FIT_BOUNDS[name] for name in names], dtype = float).T
+    fractions = (np.arange(START_POINTS) + 0.5)/START_POINTS
+    grid = np.array(list(itertools.product(*[low[n] + fractions*(high[n] - low[n]) for n in range(len(names))])))
+    nominal = [np.log10(params[name]) if params.get(name, 0) > 0 else 0.5*(low[n] + high[n])
+               for n, name in enumerate(names)]
+    starts = np.vstack([np.clip(nominal, low, high), grid])
+
+    weights = _log_weights(measurements)
+    log_measured = np.log(measurements['infidelity'])
+    cost = np.empty(len(starts))
+    rows = max(1, CHUNK_EVALUATIONS//len(log_measured))
+    for start in range(0, len(starts), rows) :
+        model = _model_params(params, measurements)
+        model.update({name : 10**starts[start:start + rows, n, None] for n, name in enumerate(names)})
+        errors = em.compute_total_errors(measurements['nu_c'], **model)
+        total = errors[0] + errors[1] + errors[2] + errors[4]
+        if include_offres :
+            total = total + errors[3]
+        with np.errstate(divide = 'ignore', invalid = 'ignore') :
+            residuals = (np.log(total) - log_measured)/weights
+        cost[start:start + rows] = np.sum(residuals**2, axis = -1)
+    return starts[np.nanargmin(cost)] if np.any(np.isfinite(cost)) else starts[0]
+
+def fit(measurements, params, names = FIT_PARAMS, include_offres = False, max_iterations = MAX_ITERATIONS,
+        tol = TOLERANCE) :
+    # Fit the parameters in names to the measurements (see load_measurements).
+    # params : keyword arguments of em.compute_total_errors (scalars), the other
+    #          parameters of the model and the nominal fitted values
+    # include_offres : add the off-resonant error to the model infidelity
+    # Returns a CalibrationResult
+    names = tuple(names)
+    for name in names :
+        if name not in FIT_BOUNDS :
+            raise ValueError("Cannot fit '%s', expected one of %s"%(name, ', '.join(FIT_PARAMS)))
+    low, high = np.array([FIT_BOUNDS[name] for name in names], dtype = float).T
+    n_meas, n_params = len(measurements['infidelity']), len(names)
+
+    theta = _start_point(names, params, measurements, include_offres)
+    residuals, jacobian, total = _linearize(theta, names, params, measurements, include_offres)
+    cost = residuals @ residuals
+    damping, growth = 1e-3, 2.
+    converged = False
+
+    for iteration in range(1, max_iterations + 1) :
+        # Parameters on a bound pushed outwards by the gradient are held fixed
+        g = jacobian.T @ residuals
+        free = ~(((theta <= low) & (g > 0)) | ((theta >= high) & (g < 0)))
+        if not np.any(free) :
+            converged = True
+            break
+        A = jacobian[:, free].T @ jacobian[:, free]
+        scale = np.diag(A) + 1e-12*np.max(np.diag(A)) + np.finfo(float).tiny
+
+        step = np.zeros(n_params)
+        step[free] = np.linalg.solve(A + damping*np.diag(scale), -g[free])
+        # Decrease of the cost predicted by the linearized model, before the step
+        # is clipped to the bounds
+        if step[free] @ (damping*scale*step[free] - g[free]) <= tol*cost :
+            converged = True
+            break
+        step = np.clip(theta + step, low, high) - theta
+        predicted = -2*(g @ step) - np.sum((jacobian @ step)**2)
+        trial = theta + step
+        trial_residuals, trial_jacobian, trial_total = _linearize(trial, names, params, measurements, include_offres)
+        trial_cost = trial_residuals @ trial_residuals
+
+        if trial_cost < cost and predicted > 0 :
+            # Damping update of Nielsen, from the ratio of actual to predicted decrease
+            ratio = (cost - trial_cost)/predicted
+            theta, residuals, jacobian, total, cost = trial, trial_residuals, trial_jacobian, trial_total, trial_cost
+            damping *= max(1/3, 1 - (2*ratio - 1)**3)
+            growth = 2.
+        else :
+            damping *= growth
+            growth *= 2
+
+    at_bound = (theta <= low) | (theta >= high)
+    dof = n_meas - np.sum(~at_bound)
+    covariance = np.full((n_params, n_params), np.nan)
+    inner = ~at_bound
+    if np.any(inner) :
+        J = jacobian[:, inner]
+        try :
+            cov = np.linalg.inv(J.T @ J)
+        except np.linalg.LinAlgError :
+            cov = np.linalg.pinv(J.T @ J)
+        # Without uncertainties, the weights are scaled by the scatter of the residuals
+        if measurements['sigma'] is None :
+            cov = cov * (cost/dof if dof > 0 else np.nan)
+        covariance[np.ix_(inner, inner)] = cov
+
+    return CalibrationResult(names, theta, covariance, residuals, total, dof,
+                             tuple(name for name, bound in zip(names, at_bound) if bound), iteration, converged)
+
+
+# ------------------------------------------
+# Presets
+# ------------------------------------------
+
+def default_names(state) :
+    # Parameters of DEFAULT_FIT_PARAMS whose noise source is enabled in the state
+    return tuple(name for name in DEFAULT_FIT_PARAMS if name not in TOGGLES or state['toggles'][TOGGLES[name]])
+
+def fit_state(state, measurements, names = None) :
+    # Fit the parameters in names (None for default_names) starting from a preset
+    # state (see evaluate.py). The noise sources of fitted parameters are enabled,
+    # the display options of the state select the off-resonant model.
+    if names is None :
+        names = default_names(state)
+    state = copy.deepcopy(state)
+    for name in names :
+        if name in TOGGLES :
+            state['toggles'][TOGGLES[name]] = True
+    display = evaluate.get_display(state)
+    return fit(measurements, evaluate.state_to_params(state), names,
+               display['include_offres'] and display['show_offres'])
+
+def fitted_preset(state, result) :
+    # Preset of the state with the fitted parameters, loadable by the GUI and
+    # the command line. The fit itself is kept under "calibration".
+    preset = {key : value for key, value in state.items() if key != 'display'}
+    preset['slider'] = dict(state['slider'])
+    preset['toggles'] = dict(state['toggles'])
+    for name, value in zip(result.names, result.log10) :
+        preset['slider'][name] = float(value)
+        if name in TOGGLES :
+            preset['toggles'][TOGGLES[name]] = True
+
+    preset['calibration'] = {"params" : list(result.names),
+                             "uncertainty" : [None if np.isnan(value) else float(value) for value in result.uncertainty],
+                             "covariance" : np.where(np.isnan(result.covariance), None, result.covariance).tolist(),
+                             "chi2" : result.chi2, "dof" : int(result.dof), "measurements" : len(result.residuals),
+                             "at_bound" : list(result.at_bound), "converged" : result.converged}
+    return preset
+
+def format_result(result) :
+    # Text table of a CalibrationResult
+    lines = ['%-8s %11s %10s'%('param', 'value', '+- dec')]
+    for name, value, std in zip(result.names, result.log10, result.uncertainty) :
+        lines += ['%-8s %11.3e %10.3f%s'%(name, 10**value, std, '  (at bound)' if name in result.at_bound else '')]
+    lines += ['', 'chi2 = %.4g for %d degrees of freedom, %d iterations%s'
+              %(result.chi2, result.dof, result.iterations, '' if result.converged else ' (not converged)')]
+    return '\n'.join(lines)
@@ -0,0 +1,220 @@
+import functools
+
+import numpy as np
+import errormodel as em
+
+# Chains of N ions in a harmonic trap. The error model of errormodel.py assumes
+# two ions, with the STR mode at sqrt(3) nu_c, the two-ion spacing in ndot_STR
+# and the two-ion Kerr coefficient. Here the equilibrium positions and normal
+# modes of any chain are computed, and the error channels are evaluated for a
+# gate on any pair of ions driven through any axial or radial mode.
+#
+# In units of the length scale l = (e^2/(4 pi eps0 M nu_c^2))^(1/3), the
+# equilibrium positions u and the axial Hessian A (in units of M nu_c^2) only
+# depend on N. The modes of a trap frequency nu_c follow by scaling :
+#   axial mode m : nu_c sqrt(lambda_m), eigenvector b_m
+#   radial mode m : sqrt(nu_XY^2 - (lambda_m - 1)/2 nu_c^2), eigenvector b_m
+# where lambda_m, b_m are the eigenvalues and eigenvectors of A, so a single
+# eigendecomposition per N, cached, serves every nu_c and nu_XY of a sweep.
+# Modes are sorted by increasing lambda : mode 0 is the COM mode, mode 1 the
+# STR (breathing / rocking) mode. nu_XY is the radial frequency of a single ion,
+# so that for two ions the radial STR mode is at sqrt(nu_XY^2 - nu_c^2), as in
+# em.coefficientKerr.
+#
+# The channels reduce to those of em.compute_total_errors for two ions :
+#   Lamb-Dicke parameter of ions (i, j) : sqrt(|b_im b_jm|) times the single ion
+#       value at the mode frequency (1/sqrt(2) for two ions)
+#   heating : uniform field noise couples to sum_i b_im, field gradient noise over
+#       the electrode distance to sum_i b_im z_i
+#   Kerr : cross-Kerr coupling of the gate mode with the modes of the other
+#       direction through the cubic Coulomb term, the two-ion coefficient scaled
+#       by the squared coupling tensor relative to two ions
+
+AXIAL = 'axial'
+RADIAL = 'radial'
+DIRECTIONS = (AXIAL, RADIAL)
+
+# Newton iterations of the equilibrium positions
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-13
+
+
+# ------------------------------------------
+# Dimensionless chain
+# ------------------------------------------
+
+def _coulomb(u) :
+    # Pairwise differences and inverse cubed distances of positions u, zero on the diagonal
+    d = u[:, None] - u[None, :]
+    with np.errstate(divide = 'ignore') :
+        inv3 = np.where(np.eye(len(u), dtype = bool), 0., 1/np.abs(d)**3)
+    return d, inv3
+
+def _hessian(u) :
+    # Axial Hessian of the dimensionless energy sum u_i^2/2 + sum_{i<j} 1/|u_i - u_j|
+    _, inv3 = _coulomb(u)
+    return np.diag(1 + 2*inv3.sum(axis = 1)) - 2*inv3
+
+@functools.lru_cache(maxsize = None)
+def equilibrium_positions(n) :
+    # Dimensionless equilibrium positions of n ions, increasing, by Newton iterations
+    # from the approximate spacing of long chains
+    if n < 1 :
+        raise ValueError('A chain needs at least one ion, not %d'%n)
+    u = np.linspace(-1, 1, n) * (n - 1)/2 * 2.018/n**0.559
+    for _ in range(MAX_ITERATIONS) :
+        d, inv3 = _coulomb(u)
+        grad = u - (d*inv3).sum(axis = 1)
+        if np.max(np.abs(grad), initial = 0) < TOLERANCE :
+            break
+        u = u - np.linalg.solve(_hessian(u), grad)
+    u.setflags(write = False)
+    return u
+
+@functools.lru_cache(maxsize = None)
+def normal_modes(n) :
+    # Eigenvalues lambda (increasing) and eigenvectors b (columns, b[i, m] for ion i
+    # and mode m) of the dimensionless axial Hessian of n ions. The sign of every
+    # eigenvector is fixed by its last nonzero component being positive.
+    lam, b = np.linalg.eigh(_hessian(equilibrium_positions(n)))
+    last = n - 1 - np.argmax(np.abs(b[::-1]) > 1e-9, axis = 0)
+    b = b * np.sign(b[last, np.arange(n)])
+    lam.setflags(write = False)
+    b.setflags(write = False)
+    return lam, b
+
+def _kerr_tensor(n) :
+    # Cubic Coulomb coupling T[p, q] = sum_{i<j} (b_jp - b_ip)(b_jq - b_iq)^2/(u_j - u_i)^4
+    # of axial mode p with radial mode q
+    u = equilibrium_positions(n)
+    _, b = normal_modes(n)
+    i, j = np.triu_indices(n, k = 1)
+    db = b[j] - b[i]
+    weights = 1/(u[j] - u[i])**4
+    return np.einsum('k,kp,kq->pq', weights, db, db**2)
+
+@functools.lru_cache(maxsize = None)
+def kerr_factor(n) :
+    # Squared coupling tensor relative to the two-ion STR modes, factor[p, q] for
+    # axial mode p and radial mode q
+    reference = _kerr_tensor(2)[1, 1]
+    factor = (_kerr_tensor(n)/reference)**2
+    factor.setflags(write = False)
+    return factor
+
+
+# ------------------------------------------
+# Modes of a trap
+# ------------------------------------------
+
+def length_scale(nu_c) :
+    # Length scale l of the chain for the axial COM frequency nu_c
+    return (em.E**2/(4*np.pi*em.EPS0*em.M*np.asarray(nu_c)**2))**(1/3)
+
+def positions(n, nu_c) :
+    # Equilibrium positions in m, shape nu_c.shape + (n,)
+    return length_scale(nu_c)[..., None] * equilibrium_positions(n)
+
+def axial_frequencies(n, nu_c) :
+    # Axial mode frequencies, shape nu_c.shape + (n,), COM first
+    lam, _ = normal_modes(n)
+    return np.asarray(nu_c)[..., None] * np.sqrt(lam)
+
+def radial_frequencies(n, nu_c, nu_XY) :
+    # Radial mode frequencies, shape of the broadcast nu_c, nu_XY + (n,), COM
+    # first. nan where the chain is not stable radially (zigzag transition).
+    lam, _ = normal_modes(n)
+    with np.errstate(invalid = 'ignore') :
+        return np.sqrt(np.asarray(nu_XY)[..., None]**2 - (lam - 1)/2 * np.asarray(nu_c)[..., None]**2)
+
+def frequencies(n, direction, nu_c, nu_XY) :
+    if direction == AXIAL :
+        return axial_frequencies(n, nu_c)
+    if direction == RADIAL :
+        return radial_frequencies(n, nu_c, nu_XY)
+    raise ValueError("Unknown direction '%s', expected one of %s"%(direction, ', '.join(DIRECTIONS)))
+
+def lamb_dicke(n, nu_mode, dzB) :
+    # Lamb-Dicke parameters of every ion in every mode, shape nu_mode.shape[:-1] + (n, n)
+    # nu_mode : mode frequencies, shape (..., n)
+    _, b = normal_modes(n)
+    nu_mode = np.asarray(nu_mode)[..., None, :]
+    return b * em.MU_B * np.asarray(dzB)[..., None, None]/(em.HBAR * nu_mode) * np.sqrt(em.HBAR/(2*em.M * nu_mode))
+
+def modes(n, nu_c, nu_XY, dzB = None) :
+    # Normal modes of a chain of n ions, as a dict of
+    #   positions : equilibrium positions (m)
+    #   axial, radial : mode frequencies, COM first
+    #   vectors : eigenvectors b[i, m], shared by both directions
+    #   eta_axial, eta_radial : Lamb-Dicke parameters [..., ion, mode] if dzB is given
+    _, b = normal_modes(n)
+    out = {"positions" : positions(n, nu_c), "axial" : axial_frequencies(n, nu_c),
+           "radial" : radial_frequencies(n, nu_c, nu_XY), "vectors" : b}
+    if dzB is not None :
+        out['eta_axial'] = lamb_dicke(n, out['axial'], dzB)
+        out['eta_radial'] = lamb_dicke(n, out['radial'], dzB)
+    return out
+
+
+# ------------------------------------------
+# Gate mode quantities
+# ------------------------------------------
+
+def _check(n, mode, ions) :
+    if not 0 <= mode < n :
+        raise ValueError('Mode %d does not exist in a chain of %d ions'%(mode, n))
+    if len(set(ions)) != 2 or not all(0 <= i < n for i in ions) :
+        raise ValueError('Ions %s are not a pair of ions of a chain of %d'%(tuple(ions), n))
+
+def gate_eta(n, direction, mode, ions, nu_c, nu_XY, dzB) :
+    # Lamb-Dicke parameter of a gate on the pair ions through the mode
+    _, b = normal_modes(n)
+    i, j = ions
+    nu = frequencies(n, direction, nu_c, nu_XY)[..., mode]
+    return np.sqrt(np.abs(b[i, mode]*b[j, mode])) * np.sqrt(2) * em.compute_eta(nu, dzB)
+
+def heating_rate(n, direction, mode, nu_c, nu_XY, nuSE, d = em.DIST_ELECTRODE) :
+    # Heating rate of a mode from uniform field noise and field gradient noise over d
+    _, b = normal_modes(n)
+    nu = frequencies(n, direction, nu_c, nu_XY)[..., mode]
+    uniform = np.sum(b[:, mode])**2/2
+    gradient = 2*(length_scale(nu_c) * np.dot(equilibrium_positions(n), b[:, mode]))**2/d**2
+    return em.E**2/(4*em.M * em.HBAR * nu**2) * nuSE * (uniform + gradient)
+
+def kerr_variance(n, direction, mode, nu_c, nu_XY) :
+    # Variance of the frequency of the gate mode due to the thermal occupation of
+    # the modes of the other direction it couples to
+    nu_c = np.asarray(nu_c)
+    factor = kerr_factor(n)
+    nu_ax = axial_frequencies(n, nu_c)
+    nu_rad = radial_frequencies(n, nu_c, nu_XY)
+    if direction == AXIAL :
+        # Radial spectators at the Doppler temperature of em.compute_nbar_r(nu_XY),
+        # times 2 for both radial directions
+        coupled = np.flatnonzero(factor[mode] > 0)
+        K = em.coefficientKerr(nu_ax[..., mode, None], None, nu_rad[..., coupled], nu_c[..., None], factor[mode, coupled])
+        nbar_r = em.compute_nbar_r(np.asarray(nu_XY))[..., None]
+        return 2 * np.sum(em.kerr_trapfluc_variance(K, nbar_r), axis = -1)
+    if direction == RADIAL :
+        # Axial spectators at their Doppler temperature
+        coupled = np.flatnonzero(factor[:, mode] > 0)
+        K = em.coefficientKerr(nu_ax[..., coupled], None, nu_rad[..., mode, None], nu_c[..., None], factor[coupled, mode])
+        return np.sum(em.kerr_trapfluc_variance(K, em.compute_nbar_r(nu_ax[..., coupled])), axis = -1)
+    raise ValueError("Unknown direction '%s', expected one of %s"%(direction, ', '.join(DIRECTIONS)))
+
+
+def compute_chain_errors(nu_c_list, Om, dzB, nuSE, SBa, SV, nu_XY, n_ions = 2, direction = AXIAL, mode = 1,
+                         ions = (0, 1), pulse_shaping = False, g_factor = em.G_FACTOR_CHIP, chi = 0, SA = 0,
+                         nbar = 0, sym_fluc = 0, spectrum = None, sequence = 'free') :
+    # Error channels of a gate on the pair ions of a chain of n_ions, driven through
+    # the given mode (index in DIRECTIONS order, 0 = COM, 1 = STR, ...). Parameters
+    # broadcast as in em.compute_total_errors, and for n_ions = 2 the channels are
+    # those of em.compute_total_errors for the corresponding vib_mode.
+    # Returns the tuple (heating, decoherence, trap fluc, off-res, amp noise)
+    _check(n_ions, mode, ions)
+    nu_c = np.asarray(nu_c_list)
+    eta = gate_eta(n_ions, direction, mode, ions, nu_c, nu_XY, dzB)
+    ndot = heating_rate(n_ions, direction, mode, nu_c, nu_XY, nuSE)
+    variance = kerr_variance(n_ions, direction, mode, nu_c, nu_XY)
+    return em.compute_mode_errors(nu_c, eta, ndot, variance, Om, dzB, SBa, SV, pulse_shaping,
+                                  g_factor, chi, SA, nbar, sym_fluc, spectrum, sequence)
@@ -0,0 +1,559 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import errormodel as em
+import calibration
+import evaluate
+import filterfunction
+import inverse
+import montecarlo
+import msgate
+import pareto
+import sensitivity
+import sweep
+import sweepstore
+
+# Headless command line interface. Only the error model is imported, neither Qt
+# nor pyqtgraph are required.
+#
+#   python -m hydra eval chip_preset.json run1.json -o results.csv
+#   python -m hydra sweep spec.json -o sweep.npz --workers 8
+#   python -m hydra sweep spec.json -o big.sweep --workers 8   (on disk, resumable)
+#   python -m hydra mc chip -o mc.npz --samples 100000 --uncertainty noise.json
+#   python -m hydra budget chip --include-offres
+#   python -m hydra pareto chip -o front.csv --samples 1000000 --heating-rate
+#   python -m hydra solve chip --target 1e-3 --free dzB=25:400 --free Om=20:150:kHz --cost dzB=1,Om=1
+#   python -m hydra fit chip run1.csv run2.csv -o fitted.json --fit nuSE,SBa,SV
+#   python -m hydra offres -o offres.npy --om 20:150:27 --dzB 25:300:23 --nu 80:600:27 --workers 8
+#   python -m hydra --offres-table offres.npy eval chip --pulse-shaping -o results.csv
+#   python -m hydra --offres-table fast=offres.npy eval chip --pulse-shaping fast -o results.csv
+#   python -m hydra --noise-spectrum bnoise.csv --sequence echo budget chip
+
+KHZ = em.KHZ
+MHZ = em.MHZ
+
+PRESET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'presets')
+BUILTIN_PRESETS = {"chip" : os.path.join(PRESET_DIR, 'chip_preset.json'),
+                   "macro" : os.path.join(PRESET_DIR, 'macro_preset.json')}
+
+UNITS = {"": 1, "Hz" : 2*np.pi, "kHz" : KHZ, "MHz" : MHZ}
+
+# Sweeps can also be streamed to a sweepstore directory
+SWEEP_FORMATS = ('csv', 'json', 'npz', 'sweep')
+
+EVAL_FIELDS = ('preset', 'fidelity', 'infidelity', 'nu_opt_khz', 'tgate_ms', 'heating_rate')
+
+
+# Measured magnetic noise spectrum of the --noise-spectrum option, applied to every
+# preset loaded (see evaluate.py)
+_noise_spectrum = None
+
+def load_preset(name, base_dir = '.') :
+    # Load a preset JSON file (save_presets schema), or a builtin preset by name
+    path = BUILTIN_PRESETS.get(name, os.path.join(base_dir, name))
+    with open(path) as f :
+        state = json.load(f)
+    if _noise_spectrum is not None :
+        state['noise_spectrum'] = _noise_spectrum
+    return state
+
+def nu_grid(args) :
+    return np.linspace(args.nu_min, args.nu_max, args.nu_points)*KHZ
+
+def display_options(args) :
+    return {"show_offres" : args.show_offres or args.include_offres or args.pulse_shaping,
+            "include_offres" : args.include_offres,
+            "pulse_shaping" : args.pulse_shaping,
+            "optimize" : args.fix_nu is None,
+            "fix_nu" : args.fix_nu if args.fix_nu is not None else evaluate.DEFAULT_DISPLAY['fix_nu'],
+            "nu_grid" : {"nu_min" : args.nu_min, "nu_max" : args.nu_max, "points" : args.nu_points}}
+
+def output_format(path, fmt, formats = ('csv', 'json', 'npz')) :
+    if fmt is not None :
+        return fmt
+    ext = os.path.splitext(path.rstrip('/' + os.sep))[1].lower().lstrip('.')
+    if ext not in formats :
+        raise ValueError('Cannot infer output format from %s, use --format'%path)
+    return ext
+
+
+# ------------------------------------------
+# Preset evaluation
+# ------------------------------------------
+
+def evaluate_presets(names, nu_c_list, display) :
+    # Evaluate preset files, returns a list of rows with EVAL_FIELDS
+    # nu_c_list : COM frequencies, None for the adaptive grid of display['nu_grid']
+    rows = []
+    for name in names :
+        state = load_preset(name)
+        state['display'] = display
+        result = evaluate.evaluate_state(state, nu_c_list)
+        rows += [{"preset" : name,
+                  "fidelity" : 1 - float(result['err_min']),
+                  "infidelity" : float(result['err_min']),
+                  "nu_opt_khz" : float(result['nu_min'])/KHZ,
+                  "tgate_ms" : float(result['tgate'])*1e3,
+                  "heating_rate" : float(result['ndot'])}]
+    return rows
+
+def write_rows(rows, path, fmt) :
+    write_table(rows, EVAL_FIELDS, path, fmt)
+
+def write_table(rows, fields, path, fmt) :
+    # Write a list of dicts with the given fields
+    if fmt == 'csv' :
+        with open(path, 'w', newline = '') as f :
+            writer = csv.DictWriter(f, fieldnames = fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif fmt == 'json' :
+        with open(path, 'w') as f :
+            json.dump(rows, f, indent = 1)
+    elif fmt == 'npz' :
+        np.savez(path, **{field : np.array([row[field] for row in rows]) for field in fields})
+
+
+# ------------------------------------------
+# Sweeps
+# ------------------------------------------
+
+def parse_axis(spec) :
+    # Grid values of a sweep axis. spec is either a list of values or a dict
+    # {"start", "stop", "num", "log" (optional, log spaced), "unit" (optional)}
+    if isinstance(spec, dict) :
+        if spec.get('log', False) :
+            values = np.geomspace(spec['start'], spec['stop'], spec['num'])
+        else :
+            values = np.linspace(spec['start'], spec['stop'], spec['num'])
+        return values*UNITS[spec.get('unit', '')]
+    return np.asarray(spec, dtype = float)
+
+def load_sweep_spec(path) :
+    # A sweep spec is a JSON file :
+    #   {"preset" : "chip" or a preset file relative to the spec,
+    #    "display" : {...} (optional plot options, see evaluate.DEFAULT_DISPLAY),
+    #    "axes" : {"dzB" : {"start" : 25, "stop" : 200, "num" : 50},
+    #              "Om" : {"start" : 25, "stop" : 100, "num" : 40, "unit" : "kHz"}, ...}}
+    # Parameters not swept are taken from the preset. Axis values are in the units
+    # of em.compute_total_errors unless a unit is given.
+    # Returns (params, pulse_shaping, include_offres, preset schema version)
+    with open(path) as f :
+        spec = json.load(f)
+
+    state = load_preset(spec.get('preset', 'chip'), os.path.dirname(os.path.abspath(path)))
+    state['display'] = spec.get('display', {})
+    params = evaluate.state_to_params(state)
+    display = evaluate.get_display(state)
+
+    # Swept parameters are moved to the end, so that axes follow the order of the spec
+    for name, axis in spec['axes'].items() :
+        params.pop(name, None)
+        params[name] = parse_axis(axis)
+
+    pulse_shaping = params.pop('pulse_shaping')
+    spectrum, _ = params.pop('spectrum'), params.pop('sequence')
+    if spectrum is not None :
+        raise ValueError('Sweeps do not support measured noise spectra')
+    include_offres = display['include_offres'] and display['show_offres']
+    return params, pulse_shaping, include_offres, state.get('version')
+
+def write_sweep(result, path, fmt) :
+    if fmt == 'npz' :
+        arrays = {name : result[name] for name in sweep.OUTPUTS}
+        arrays.update({'axis_' + dim : result.coords[dim] for dim in result.dims})
+        np.savez(path, dims = np.array(result.dims), **arrays)
+    elif fmt == 'json' :
+        data = {"dims" : list(result.dims),
+                "coords" : {dim : result.coords[dim].tolist() for dim in result.dims},
+                "fixed" : {name : float(value) for name, value in result.fixed.items()},
+                "data" : {name : result[name].tolist() for name in sweep.OUTPUTS}}
+        with open(path, 'w') as f :
+            json.dump(data, f)
+    elif fmt == 'csv' :
+        grids = np.meshgrid(*[result.coords[dim] for dim in result.dims], indexing = 'ij')
+        columns = list(result.dims) + list(sweep.OUTPUTS)
+        values = [grid.reshape(-1) for grid in grids] + [result[name].reshape(-1) for name in sweep.OUTPUTS]
+        with open(path, 'w', newline = '') as f :
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(zip(*values))
+
+
+# ------------------------------------------
+# Monte Carlo
+# ------------------------------------------
+
+def load_uncertainty(path) :
+    # Distributions of the noise parameters (see montecarlo.py), default half a
+    # decade log-normal on every noise parameter
+    if path is None :
+        return montecarlo.DEFAULT_SPEC
+    with open(path) as f :
+        return json.load(f)
+
+def write_montecarlo(result, path, fmt) :
+    # Every sample (sampled parameters, minimum infidelity and optimal nu) and, for
+    # JSON and NPZ, the quantile bands of the total infidelity
+    columns = dict(result.samples)
+    columns['err_min'] = result.err_min
+    columns['nu_opt_khz'] = result.nu_opt/KHZ
+    if fmt == 'csv' :
+        with open(path, 'w', newline = '') as f :
+            writer = csv.writer(f)
+            writer.writerow(list(columns))
+            writer.writerows(zip(*columns.values()))
+    elif fmt == 'json' :
+        summary = result.summary()
+        data = {"quantiles" : list(result.quantiles),
+                "nu_c_khz" : (result.nu_c_list/KHZ).tolist(),
+                "bands" : result.bands.tolist(),
+                "err_min_quantiles" : summary['err_min'].tolist(),
+                "nu_opt_khz_quantiles" : (summary['nu_opt']/KHZ).tolist(),
+                "samples" : {name : values.tolist() for name, values in columns.items()}}
+        with open(path, 'w') as f :
+            json.dump(data, f)
+    elif fmt == 'npz' :
+        np.savez(path, quantiles = np.array(result.quantiles), nu_c_khz = result.nu_c_list/KHZ,
+                 bands = result.bands, **columns)
+
+
+# ------------------------------------------
+# Error budget
+# ------------------------------------------
+
+def write_budget(result, path) :
+    channels, params = sensitivity.error_budget(result)
+    data = {"err_min" : float(result['err_min']),
+            "nu_opt_khz" : float(result['nu_opt']/KHZ),
+            "channels" : [{"name" : name, "infidelity" : value, "fraction" : fraction}
+                          for name, value, fraction in channels],
+            "params" : [{"name" : name, "elasticity" : elasticity, "gradient" : grad}
+                        for name, elasticity, grad in params]}
+    with open(path, 'w') as f :
+        json.dump(data, f, indent = 1)
+
+
+# ------------------------------------------
+# Inverse design
+# ------------------------------------------
+
+def parse_free(specs, names = tuple(inverse.CHEAP_END)) :
+    # Parameters in names given as name=low:high or name=low:high:unit, in order
+    # Returns the bounds in compute_total_errors units and the unit of every parameter
+    free, units = {}, {}
+    for spec in specs :
+        name, _, bounds = spec.partition('=')
+        fields = bounds.split(':')
+        if name not in names or len(fields) not in (2, 3) :
+            raise ValueError("Invalid free parameter '%s', expected name=low:high[:unit]"%spec)
+        units[name] = fields[2] if len(fields) == 3 else ''
+        free[name] = (float(fields[0])*UNITS[units[name]], float(fields[1])*UNITS[units[name]])
+    return free, units
+
+def linear_cost(free, weights) :
+    # Weighted sum of the distances of the free parameters from the cheap end of
+    # their bounds, as fractions of the bounds (in decades for LOG_PARAMS)
+    def cost(**values) :
+        total = 0
+        for name, weight in weights.items() :
+            low, high = inverse._to_axis(name, free[name])
+            x = (inverse._to_axis(name, values[name]) - low)/(high - low)
+            total = total + weight * (x if inverse.CHEAP_END[name] == 'low' else 1 - x)
+        return total
+    return cost
+
+def parse_weights(spec, free) :
+    weights = {name : 1. for name in free}
+    if spec :
+        weights = {}
+        for item in spec.split(',') :
+            name, _, weight = item.partition('=')
+            if name not in free :
+                raise ValueError("Cost parameter '%s' is not a free parameter"%name)
+            weights[name] = float(weight)
+    return weights
+
+
+# ------------------------------------------
+# Off-resonant tables
+# ------------------------------------------
+
+def parse_range(spec) :
+    # Grid low:high:num of a table axis, at least two points to interpolate
+    values = spec.split(':')
+    if len(values) != 3 or int(values[2]) < 2 :
+        raise ValueError("Invalid range '%s', expected low:high:num with num >= 2"%spec)
+    return np.linspace(float(values[0]), float(values[1]), int(values[2]))
+
+
+# ------------------------------------------
+# Entry point
+# ------------------------------------------
+
+def build_parser() :
+    parser = argparse.ArgumentParser(prog = 'python -m hydra',
+                                     description = 'Headless evaluation of the Hydra error model')
+    parser.add_argument('--offres-table', action = 'append', default = [], metavar = '[NAME=]PATH',
+                        help = 'simulated off-resonant table (see the offres command) used with pulse shaping, '
+                               'replaces the default table or adds the table NAME, can be repeated')
+    parser.add_argument('--noise-spectrum', metavar = 'PATH',
+                        help = 'measured PSD of the magnetic field noise (two columns, Hz and T^2/Hz, .csv or .npy) '
+                               'added to the white noise of the presets')
+    parser.add_argument('--sequence', default = 'free',
+                        help = 'pulse sequence filtering the noise spectrum : free, echo, cpmg:N or udd:N')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    def add_common(sub, formats = ('csv', 'json', 'npz')) :
+        sub.add_argument('-o', '--output', required = True, help = 'output file (%s)'%', '.join('.' + ext for ext in formats))
+        sub.add_argument('--format', choices = formats, help = 'output format, default from extension')
+        sub.add_argument('--nu-min', type = float, default = 100, help = 'lowest COM frequency in kHz')
+        sub.add_argument('--nu-max', type = float, default = 500, help = 'highest COM frequency in kHz')
+        sub.add_argument('--nu-points', type = int, default = 100, help = 'number of COM frequencies')
+
+    sub = subparsers.add_parser('eval', help = 'evaluate preset files')
+    sub.add_argument('presets', nargs = '+', help = "preset JSON files, or the builtin 'chip' and 'macro'")
+    sub.add_argument('--show-offres', action = 'store_true', help = 'compute off-resonant errors')
+    sub.add_argument('--include-offres', action = 'store_true', help = 'include off-resonant errors in the total')
+    sub.add_argument('--pulse-shaping', nargs = '?', const = True, default = False, metavar = 'TABLE',
+                     help = 'use the pulse shaping off-resonant model, optionally with a named table')
+    sub.add_argument('--fix-nu', type = float, help = 'evaluate at this COM frequency in kHz instead of optimizing')
+    sub.add_argument('--adaptive', action = 'store_true', help = 'refine the COM frequencies near the minimum instead of a uniform grid')
+    add_common(sub)
+
+    sub = subparsers.add_parser('mc', help = 'Monte Carlo uncertainty of a preset')
+    sub.add_argument('preset', help = "preset JSON file, or the builtin 'chip' and 'macro'")
+    sub.add_argument('--uncertainty', help = 'JSON file of the noise parameter distributions')
+    sub.add_argument('--samples', type = int, default = 10000, help = 'number of samples')
+    sub.add_argument('--seed', type = int, help = 'random seed')
+    sub.add_argument('--include-offres', action = 'store_true', help = 'include off-resonant errors in the total')
+    sub.add_argument('--pulse-shaping', nargs = '?', const = True, default = False, metavar = 'TABLE',
+                     help = 'use the pulse shaping off-resonant model, optionally with a named table')
+    sub.add_argument('--workers', type = int, default = 1, help = 'number of worker processes')
+    add_common(sub)
+
+    sub = subparsers.add_parser('budget', help = 'ranked error budget and sensitivities of a preset')
+    sub.add_argument('preset', help = "preset JSON file, or the builtin 'chip' and 'macro'")
+    sub.add_argument('--include-offres', action = 'store_true', help = 'include off-resonant errors in the total')
+    sub.add_argument('--pulse-shaping', nargs = '?', const = True, default = False, metavar = 'TABLE',
+                     help = 'use the pulse shaping off-resonant model, optionally with a named table')
+    sub.add_argument('-o', '--output', help = 'also write the budget to this JSON file')
+    sub.add_argument('--nu-min', type = float, default = 100, help = 'lowest COM frequency in kHz')
+    sub.add_argument('--nu-max', type = float, default = 500, help = 'highest COM frequency in kHz')
+    sub.add_argument('--nu-points', type = int, default = 100, help = 'number of COM frequencies')
+
+    sub = subparsers.add_parser('pareto', help = 'Pareto front of gate time and infidelity')
+    sub.add_argument('preset', help = "preset JSON file, or the builtin 'chip' and 'macro'")
+    sub.add_argument('--samples', type = int, default = 10**6, help = 'number of random configurations')
+    sub.add_argument('--seed', type = int, help = 'random seed')
+    sub.add_argument('--box', action = 'append', default = [],
+                     help = 'box parameter name=low:high[:unit], default the dzB and Om of pareto.DEFAULT_BOX '
+                            'and nu_c from --nu-min to --nu-max')
+    sub.add_argument('--nu-min', type = float, default = 100, help = 'lowest COM frequency in kHz')
+    sub.add_argument('--nu-max', type = float, default = 500, help = 'highest COM frequency in kHz')
+    sub.add_argument('--heating-rate', action = 'store_true', help = 'add the heating rate as a third objective')
+    sub.add_argument('--include-offres', action = 'store_true', help = 'include off-resonant errors in the total')
+    sub.add_argument('--pulse-shaping', nargs = '?', const = True, default = False, metavar = 'TABLE',
+                     help = 'use the pulse shaping off-resonant model, optionally with a named table')
+    sub.add_argument('-o', '--output', required = True, help = 'output file (.csv, .json or .npz)')
+    sub.add_argument('--format', choices = ('csv', 'json', 'npz'), help = 'output format, default from extension')
+
+    sub = subparsers.add_parser('solve', help = 'cheapest parameters reaching a target infidelity')
+    sub.add_argument('preset', help = "preset JSON file, or the builtin 'chip' and 'macro'")
+    sub.add_argument('--target', type = float, required = True, help = 'target infidelity, e.g. 1e-3')
+    sub.add_argument('--free', action = 'append', required = True,
+                     help = 'free parameter name=low:high[:unit], repeat for several')
+    sub.add_argument('--cost', nargs = '?', const = '',
+                     help = 'find the cheapest point for a linear cost name=weight,... (default weights 1)')
+    sub.add_argument('--points', type = int, default = 50, help = 'grid points per free parameter but the last')
+    sub.add_argument('--include-offres', action = 'store_true', help = 'include off-resonant errors in the total')
+    sub.add_argument('--pulse-shaping', nargs = '?', const = True, default = False, metavar = 'TABLE',
+                     help = 'use the pulse shaping off-resonant model, optionally with a named table')
+    sub.add_argument('-o', '--output', help = 'write the feasible boundary to this file (.csv, .json or .npz)')
+    sub.add_argument('--format', choices = ('csv', 'json', 'npz'), help = 'output format, default from extension')
+    sub.add_argument('--nu-min', type = float, default = 100, help = 'lowest COM frequency in kHz')
+    sub.add_argument('--nu-max', type = float, default = 500, help = 'highest COM frequency in kHz')
+    sub.add_argument('--nu-points', type = int, default = 100, help = 'number of COM frequencies')
+
+    sub = subparsers.add_parser('sweep', help = 'evaluate a sweep spec')
+    sub.add_argument('spec', help = 'sweep spec JSON file')
+    sub.add_argument('--workers', type = int, default = 1, help = 'number of worker processes')
+    sub.add_argument('--quiet', action = 'store_true', help = 'do not report progress')
+    sub.add_argument('--restart', action = 'store_true', help = 'discard a partial .sweep store instead of resuming it')
+    add_common(sub, SWEEP_FORMATS)
+
+    sub = subparsers.add_parser('fit', help = 'fit the noise parameters of a preset to measured infidelities')
+    sub.add_argument('preset', help = "preset JSON file the fit starts from, or the builtin 'chip' and 'macro'")
+    sub.add_argument('measurements', nargs = '+',
+                     help = 'measurement files with columns dzB (T/m), Om (kHz), nu_c (kHz), infidelity and optionally sigma')
+    sub.add_argument('--fit', help = 'fitted parameters among %s, comma separated (default the enabled noise '
+                                     'sources of %s)'%(', '.join(calibration.FIT_PARAMS), ', '.join(calibration.DEFAULT_FIT_PARAMS)))
+    sub.add_argument('--include-offres', action = 'store_true', help = 'include off-resonant errors in the model')
+    sub.add_argument('--pulse-shaping', nargs = '?', const = True, default = False, metavar = 'TABLE',
+                     help = 'use the pulse shaping off-resonant model, optionally with a named table')
+    sub.add_argument('-o', '--output', required = True, help = 'fitted preset JSON file')
+
+    sub = subparsers.add_parser('offres', help = 'simulate the off-resonant errors of MS gates into a table')
+    sub.add_argument('-o', '--output', required = True, help = 'output table (.npy, with a .json header)')
+    sub.add_argument('--om', default = '20:100:10', help = 'sideband powers low:high:num in kHz')
+    sub.add_argument('--dzB', default = '25:200:10', help = 'gradients low:high:num in T/m')
+    sub.add_argument('--nu', default = '100:400:10', help = 'COM frequencies low:high:num in kHz')
+    sub.add_argument('--ramp', type = float, default = msgate.RAMP, help = 'ramp time of the pulse as a fraction of the gate time')
+    sub.add_argument('--square', action = 'store_true', help = 'square pulses instead of shaped pulses')
+    sub.add_argument('--steps-per-period', type = int, default = msgate.STEPS_PER_PERIOD, help = 'integration steps per period of the fastest term')
+    sub.add_argument('--fock', type = int, default = msgate.N_FOCK, help = 'number of Fock states of the gate mode')
+    sub.add_argument('--workers', type = int, default = 1, help = 'number of worker processes')
+    sub.add_argument('--quiet', action = 'store_true', help = 'do not report progress')
+
+    return parser
+
+def main(argv = None) :
+    global _noise_spectrum
+    args = build_parser().parse_args(argv)
+
+    if args.noise_spectrum :
+        filterfunction.pulse_times(args.sequence)
+        _noise_spectrum = {"path" : os.path.abspath(args.noise_spectrum), "sequence" : args.sequence}
+
+    if args.offres_table :
+        # Through the environment, so that worker processes load them as well
+        os.environ[em.OFFRES_TABLE_ENV] = os.pathsep.join(args.offres_table)
+        for name in em.offres_tables() :
+            em.get_offres_interpolator(name)
+
+    if args.command == 'offres' :
+        options = {"pulse_shaping" : not args.square, "ramp" : args.ramp, "n_fock" : args.fock,
+                   "steps_per_period" : args.steps_per_period}
+
+        def progress(done, total) :
+            sys.stderr.write('\r%d / %d gates'%(done, total))
+            if done == total :
+                sys.stderr.write('\n')
+
+        om, dzB, nu, infid = msgate.simulate_table(parse_range(args.om), parse_range(args.dzB), parse_range(args.nu),
+                                                   workers = args.workers, progress = None if args.quiet else progress,
+                                                   **options)
+        msgate.save_table(args.output, om, dzB, nu, infid, **options)
+        # See the top of msgate.py
+        ratio = msgate.default_table_ratio(om, dzB, nu, infid)
+        sys.stderr.write('warning : simulated tables are not validated against the default off-resonant table, %s\n'
+                         %('no cell is in its range' if np.isnan(ratio) else
+                           'median ratio to it over the cells in its range : %.3g'%ratio))
+        return 0
+
+    if args.command == 'budget' :
+        state = load_preset(args.preset)
+        state['display'] = {"show_offres" : args.include_offres or args.pulse_shaping,
+                            "include_offres" : args.include_offres, "pulse_shaping" : args.pulse_shaping}
+        result = sensitivity.sensitivity(evaluate.state_to_params(state), nu_grid(args), args.include_offres)
+        print(sensitivity.format_budget(result))
+        if args.output :
+            write_budget(result, args.output)
+        return 0
+
+    if args.command == 'fit' :
+        state = load_preset(args.preset)
+        state['display'] = {"show_offres" : args.include_offres or args.pulse_shaping,
+                            "include_offres" : args.include_offres, "pulse_shaping" : args.pulse_shaping}
+        result = calibration.fit_state(state, calibration.load_measurements(args.measurements),
+                                       args.fit.split(',') if args.fit else None)
+        print(calibration.format_result(result))
+        with open(args.output, 'w') as f :
+            json.dump(calibration.fitted_preset(state, result), f, indent = 1)
+        return 0
+
+    if args.command == 'pareto' :
+        state = load_preset(args.preset)
+        state['display'] = {"show_offres" : args.include_offres or args.pulse_shaping,
+                            "include_offres" : args.include_offres, "pulse_shaping" : args.pulse_shaping}
+        params = evaluate.state_to_params(state)
+        box = pareto.default_box({"nu_min" : args.nu_min, "nu_max" : args.nu_max})
+        if args.box :
+            box, _ = parse_free(args.box, pareto.BOX_PARAMS)
+        for name in box :
+            params.pop(name, None)
+        objectives = ('tgate', 'infidelity') + (('heating_rate',) if args.heating_rate else ())
+        result = pareto.pareto_front(box, params, objectives, args.samples, args.seed, args.include_offres)
+        rows = [result.point(i) for i in range(len(result))]
+        write_table(rows, list(box) + list(objectives), args.output, output_format(args.output, args.format))
+        print('%d Pareto optimal configurations out of %d'%(len(result), result.n_candidates))
+        return 0
+
+    if args.command == 'solve' :
+        state = load_preset(args.preset)
+        state['display'] = {"show_offres" : args.include_offres or args.pulse_shaping,
+                            "include_offres" : args.include_offres, "pulse_shaping" : args.pulse_shaping}
+        params = evaluate.state_to_params(state)
+        free, units = parse_free(args.free)
+        show = lambda name, value : ('%s = %.6g %s'%(name, value/UNITS[units[name]], units[name])).strip()
+        for name in free :
+            params.pop(name)
+        
+        if len(free) == 1 :
+            name, bounds = next(iter(free.items()))
+            value = inverse.feasible_threshold(name, args.target, bounds, params, nu_c_list = nu_grid(args),
+                                               include_offres = args.include_offres)
+            print('%s = infeasible'%name if np.isnan(value) else show(name, value))
+        else :
+            axes, threshold = inverse.feasible_boundary(free, args.target, params, nu_grid(args),
+                                                        args.include_offres, args.points)
+            if args.output :
+                grids = np.meshgrid(*axes.values(), indexing = 'ij')
+                columns = [grid.reshape(-1) for grid in grids] + [threshold.reshape(-1)]
+                rows = [{name : value/UNITS[units[name]] for name, value in zip(free, values)}
+                        for values in zip(*columns)]
+                write_table(rows, list(free), args.output, output_format(args.output, args.format))
+            print('%d of %d boundary points feasible'%(np.isfinite(threshold).sum(), threshold.size))
+        
+        if args.cost is not None :
+            best = inverse.cheapest(free, args.target, linear_cost(free, parse_weights(args.cost, free)), params,
+                                    nu_grid(args), args.include_offres, args.points)
+            if best is None :
+                print('No point within the bounds reaches the target')
+            else :
+                print('Cheapest point : ' + ', '.join(show(name, best[name]) for name in free)
+                      + ' (infidelity %.4g)'%best['err_min'])
+        return 0
+
+    fmt = output_format(args.output, args.format, SWEEP_FORMATS if args.command == 'sweep' else ('csv', 'json', 'npz'))
+
+    if args.command == 'eval' :
+        rows = evaluate_presets(args.presets, None if args.adaptive else nu_grid(args), display_options(args))
+        write_rows(rows, args.output, fmt)
+
+    elif args.command == 'mc' :
+        state = load_preset(args.preset)
+        state['display'] = {"show_offres" : args.include_offres or args.pulse_shaping,
+                            "include_offres" : args.include_offres, "pulse_shaping" : args.pulse_shaping}
+        result = montecarlo.monte_carlo(nu_grid(args), evaluate.state_to_params(state), load_uncertainty(args.uncertainty),
+                                        args.samples, seed = args.seed, include_offres = args.include_offres,
+                                        workers = args.workers, nu_min = args.nu_min*KHZ, nu_max = args.nu_max*KHZ)
+        write_montecarlo(result, args.output, fmt)
+
+    elif args.command == 'sweep' :
+        params, pulse_shaping, include_offres, version = load_sweep_spec(args.spec)
+
+        def progress(done, total) :
+            sys.stderr.write('\r%d / %d points'%(done, total))
+            if done == total :
+                sys.stderr.write('\n')
+
+        if fmt == 'sweep' :
+            # Streamed to a store on disk, a partial store of the same sweep is resumed
+            if args.restart and os.path.isdir(args.output) :
+                shutil.rmtree(args.output)
+            store = sweepstore.create(args.output, nu_c_list = nu_grid(args), pulse_shaping = pulse_shaping,
+                                      include_offres = include_offres, schema_version = version, **params)
+            store.run(workers = args.workers, progress = None if args.quiet else progress)
+        else :
+            result = sweep.sweep(nu_c_list = nu_grid(args), pulse_shaping = pulse_shaping,
+                                 include_offres = include_offres, workers = args.workers,
+                                 progress = None if args.quiet else progress, **params)
+            write_sweep(result, args.output, fmt)
+
+    return 0
@@ -0,0 +1,233 @@
+import os
+import numpy as np
+import errormodel as em
+import filterfunction
+import montecarlo
+import nugrid
+import profiling
+from collections import OrderedDict
+
+# Evaluation of a GUI state with the error model. This module does not depend on
+# Qt so that it can run in worker threads and headless scripts.
+#
+# A state is the preset dictionary written by MainWindow.save_presets, i.e.
+#   {"version", "slider" : {...}, "toggles" : {...}, "architecture", "vnoise", "vib_mode"}
+# with an optional measured spectrum of the magnetic field noise, filtered by the
+# pulse sequence of the gate (see filterfunction.py) :
+#   "noise_spectrum" : None or {"path", "sequence"}
+# optionally extended with a "display" dictionary describing the plot options :
+#   {"show_offres", "include_offres", "pulse_shaping", "optimize", "fix_nu", "montecarlo", "nu_grid"}
+# where montecarlo is None, or the settings of the uncertainty bands :
+#   {"samples", "seed", "spec" (see montecarlo.py)}
+# and nu_grid the settings of the COM frequency grid (see nugrid.py), None for
+# the defaults.
+
+KHZ = em.KHZ
+MHZ = em.MHZ
+
+CBOX_ARCH_ID_CHIP = 0
+CBOX_ARCH_ID_MACRO = 1
+
+CBOX_VNOISE_ID_CORR = 0
+
+DEFAULT_DISPLAY = {"show_offres" : False, "include_offres" : False, "pulse_shaping" : False,
+                   "optimize" : True, "fix_nu" : 300, "montecarlo" : None, "nu_grid" : None}
+
+# A fixed seed keeps the bands from jittering as the parameters change
+DEFAULT_MONTECARLO = {"samples" : 10000, "seed" : 0, "spec" : montecarlo.DEFAULT_SPEC}
+
+
+def get_display(state) :
+    # Plot options of a state, filled in with DEFAULT_DISPLAY
+    display = dict(DEFAULT_DISPLAY)
+    display.update(state.get('display', {}))
+    return display
+
+def state_to_params(state) :
+    # Convert a state into keyword arguments of em.compute_total_errors
+    slider = state['slider']
+    toggles = state['toggles']
+    display = get_display(state)
+
+    if state['vnoise'] == CBOX_VNOISE_ID_CORR :
+        if state['architecture'] == CBOX_ARCH_ID_MACRO :
+            g_factor = em.G_FACTOR_MACRO
+        else :
+            g_factor = em.G_FACTOR_CHIP
+    else :
+        g_factor = 0
+
+    params = {"Om" : slider['Om']*KHZ,
+                  "dzB" : slider['dzB'],
+                  "nuSE" : 10**slider['nuSE'],
+                  "SBa" : 10**slider['SBa'],
+                  "SV" : 10**slider['SV'],
+                  "nu_XY" : slider['nuXY']*MHZ,
+                  "pulse_shaping" : display['pulse_shaping'] if display['show_offres'] else False,
+                  "g_factor" : g_factor,
+                  "vib_mode" : state['vib_mode'],
+                  "chi" : 10**slider['chi'] if toggles['amp_noise'] else 0,
+                  "SA" : 10**slider['SA'] if toggles['ccw_noise'] else 0,
+                  "nbar" : 10**slider['nbar'],
+                  "sym_fluc" : 2*np.pi*slider['symfluc'] if toggles['sym_fluc'] else 0,
+                  "spectrum" : None,
+                  "sequence" : 'free'}
+
+    if state.get('noise_spectrum') :
+        params['spectrum'] = filterfunction.load_spectrum(state['noise_spectrum']['path'])
+        params['sequence'] = state['noise_spectrum'].get('sequence', 'free')
+    return params
+
+def evaluate_state(state, nu_c_list = None, graph = None) :
+    # Evaluate the error model for a state over the COM frequencies nu_c_list.
+    # nu_c_list : COM frequencies, None for the grid of the display option
+    #             nu_grid, adaptive by default
+    # graph : optional graph.ModelGraph, reused between calls so that only the
+    #         quantities depending on changed parameters are recomputed, for every
+    #         round of the adaptive grid (see graph.ModelGraph.stage)
+    # Returns a dict with :
+    #   nu_c : COM frequencies of the curves
+    #   errors : [heating, decoherence, trap freq fluc, off-res, amp noise, total]
+    #   err_min, nu_min : infidelity at the optimal (or fixed) COM frequency
+    #   tgate : gate time, ndot : heating rate of the gate mode at nu_min
+    #   montecarlo : None, or if enabled in the display options a dict with the
+    #                quantiles and bands of the total infidelity over nu_c,
+    #                and the quantiles of the minimum infidelity and optimal nu
+    params = state_to_params(state)
+    display = get_display(state)
+    include_offres = display['include_offres'] and display['show_offres']
+
+    # Rounds of the grid evaluated so far, each on its own stage of the graph
+    rounds = []
+
+    def model(nu) :
+        if graph is None :
+            errors = list(em.compute_total_errors(nu, **params))
+        else :
+            stage = graph.stage(len(rounds))
+            rounds.append(stage)
+            stage.set(nu_c = np.asarray(nu), **params)
+            errors = list(stage.errors())
+        err_tot = errors[0] + errors[1] + errors[2] + errors[4]
+        if include_offres : err_tot = err_tot + errors[3]
+        return errors + [err_tot]
+
+    adaptive = nu_c_list is None
+    with profiling.stage('model') :
+        if adaptive :
+            nu_c_list, errors = nugrid.adaptive(model, display['nu_grid'])
+        else :
+            errors = model(nu_c_list)
+    err_h, err_d, err_t, err_o, err_a, err_tot = errors
+    if not display['show_offres'] : err_o = np.zeros_like(err_o)
+
+    if display['optimize'] :
+        with profiling.stage('optimization') :
+            if adaptive :
+                err_min, nu_min = nugrid.optimize(nu_c_list, err_tot, display['nu_grid'])
+            else :
+                # Searched over the range of the grid given
+                err_min, nu_min = em.optimize_fidelity_batch(nu_c_list, err_tot, nu_c_list[0], nu_c_list[-1])
+                err_min, nu_min = float(err_min), float(nu_min)
+    else :
+        nu_min = display['fix_nu']*KHZ
+        err_min = np.interp(nu_min, nu_c_list, err_tot)
+
+    nu_mode = em.compute_mode_frequency(nu_min, params['nu_XY'], params['vib_mode'])
+    ndot = em.compute_ndot(nu_min, nu_mode, params['nuSE'], params['vib_mode'])
+    tgate = em.compute_tgate(nu_mode, params['dzB'], params['Om'])
+
+    mc = None
+    if display['montecarlo'] :
+        mc_display = dict(DEFAULT_MONTECARLO)
+        mc_display.update(display['montecarlo'])
+        with profiling.stage('montecarlo') :
+            mc_result = montecarlo.monte_carlo(nu_c_list, params, mc_display['spec'], mc_display['samples'],
+                                               seed = mc_display['seed'], include_offres = include_offres,
+                                               nu_min = nu_c_list[0], nu_max = nu_c_list[-1])
+        mc = mc_result.summary()
+        mc['bands'] = mc_result.bands
+    
+    return {"nu_c" : nu_c_list, "errors" : [err_h, err_d, err_t, err_o, err_a, err_tot],
+            "err_min" : err_min, "nu_min" : nu_min, "tgate" : tgate, "ndot" : ndot,
+            "montecarlo" : mc}
+
+
+# ------------------------------------------
+# Result cache
+# ------------------------------------------
+
+def canonical_key(obj) :
+    # Hashable canonical form of a state : dicts become sorted tuples of items,
+    # lists become tuples and arrays their dtype, shape and raw bytes
+    if isinstance(obj, dict) :
+        return tuple(sorted((key, canonical_key(value)) for key, value in obj.items()))
+    if isinstance(obj, (list, tuple)) :
+        return tuple(canonical_key(value) for value in obj)
+    if isinstance(obj, np.ndarray) :
+        return (obj.dtype.str, obj.shape, obj.tobytes())
+    return obj
+
+def result_nbytes(result) :
+    # Approximate memory held by a result of evaluate_state
+    nbytes = sum(np.asarray(err).nbytes for err in result['errors']) + np.asarray(result['nu_c']).nbytes + 256
+    if result['montecarlo'] is not None :
+        nbytes += result['montecarlo']['bands'].nbytes
+    return nbytes
+
+def spectrum_stamp(state) :
+    # Modification time and size of the noise spectrum file of a state, None
+    # without a spectrum (or if the file cannot be read), so that results are not
+    # reused once the file is edited, as filterfunction.load_spectrum
+    if not state.get('noise_spectrum') :
+        return None
+    try :
+        stat = os.stat(state['noise_spectrum']['path'])
+    except OSError :
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+class ResultCache :
+    # Bounded LRU cache of evaluate_state results, keyed on canonical_key of the
+    # state, the COM frequencies and the stamp of the noise spectrum file of the
+    # state. Entries are evicted, least recently used first, once either
+    # max_entries or max_bytes is exceeded.
+
+    def __init__(self, max_entries = 512, max_bytes = 32*2**20) :
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, state, nu_c_list) :
+        return canonical_key((state, np.asarray(nu_c_list), spectrum_stamp(state)))
+
+    def get(self, key) :
+        # Cached result for key, or None
+        result = self.entries.get(key)
+        if result is None :
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result) :
+        if key in self.entries :
+            self.nbytes -= result_nbytes(self.entries.pop(key))
+        self.entries[key] = result
+        self.nbytes += result_nbytes(result)
+
+        while self.entries and (len(self.entries) > self.max_entries or self.nbytes > self.max_bytes) :
+            _, evicted = self.entries.popitem(last = False)
+            self.nbytes -= result_nbytes(evicted)
+
+    def clear(self) :
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self) :
+        return {"entries" : len(self.entries), "nbytes" : self.nbytes,
+                "hits" : self.hits, "misses" : self.misses}
@@ -0,0 +1,231 @@
+import functools
+import os
+
+import numpy as np
+import errormodel as em
+
+# Decoherence of the gate due to colored magnetic field noise, with the filter
+# function formalism. em.compute_T2 treats the magnetic noise as white, the
+# dephasing of a sampled spectrum S(f) (one-sided, T^2/Hz) over a gate of
+# duration t is
+#
+#   chi(t) = 4 pi (MU_B/HBAR)^2 int_0^inf S(f) F(2 pi f, t) df
+#
+# where F(w, t) = |int_0^t y(s) exp(i w s) ds|^2 is the filter function of the
+# sequence, y(s) = +-1 switching sign at every refocusing pulse. For white noise
+# of density SB, chi(t) = t/T2 with T2 = em.compute_T2(SB), whatever the sequence.
+#
+# A sequence is given by name :
+#   'free' : no refocusing pulse (the MS gate on its own)
+#   'echo' : a pi pulse half way, between the two loops of the gate
+#   'cpmg:N' : N pi pulses, CPMG timing
+#   'udd:N' : N pi pulses, Uhrig timing
+# or as a sequence of pulse times, in fractions of the gate time.
+#
+# The overlap integral is vectorized over the gate times : the filter function is
+# tabulated once per sequence over cells of x = 2 pi f t, which scale with the
+# gate time, and the power of the spectrum in every cell is read from its
+# cumulative integral, so that narrow lines are not missed. The first PERIODS
+# oscillations of the filter function per interval of the sequence are resolved,
+# further up it is replaced by its average. The dephasing is cached per gate
+# time, so that re-evaluations which only change the other noise parameters do
+# not integrate again.
+#
+#   spectrum = filterfunction.load_spectrum('noise.csv')   # f (Hz), S (T^2/Hz)
+#   errors = em.compute_total_errors(nu_c, spectrum = spectrum, sequence = 'echo', **params)
+
+SEQUENCES = ('free', 'echo', 'cpmg', 'udd')
+
+POINTS_PER_DECADE = 200 # Refinement of the samples of the spectrum
+CELLS_PER_PERIOD = 32 # Quadrature cells per oscillation of the filter function
+PERIODS = 32 # Oscillations integrated exactly, per interval of the sequence
+LOG_CELLS = 300 # Logarithmic cells below the first oscillation, from x = 2 pi 1e-6
+CHUNK_EVALUATIONS = 2**20 # Number of (gate time, cell) evaluations held in memory at once
+CACHE_SIZE = 2**16 # Gate times cached per sequence
+MAX_EXACT = 4096 # Beyond this number of new gate times, interpolate a table of this size
+
+# Prefactor of the dephasing, em.compute_T2 for white noise
+DEPHASING_FACTOR = 4*np.pi * em.MU_B**2 / em.HBAR**2
+
+
+# ------------------------------------------
+# Sequences and filter functions
+# ------------------------------------------
+
+def cpmg(n) :
+    # Pulse times of the CPMG sequence of n pi pulses
+    return tuple((k + 0.5)/n for k in range(n))
+
+def udd(n) :
+    # Pulse times of the Uhrig sequence of n pi pulses
+    return tuple(np.sin(np.pi*k/(2*n + 2))**2 for k in range(1, n + 1))
+
+@functools.lru_cache(maxsize = None)
+def pulse_times(sequence) :
+    # Pulse times of a sequence (name or pulse times, see above), a sorted tuple
+    # of fractions of the gate time
+    if not isinstance(sequence, str) :
+        times = tuple(sorted(float(s) for s in sequence))
+        if any(s <= 0 or s >= 1 for s in times) :
+            raise ValueError('Pulse times must be fractions of the gate time in (0, 1)')
+        return times
+
+    name, _, n = sequence.partition(':')
+    if name == 'free' and not n :
+        return ()
+    if name == 'echo' and not n :
+        return (0.5,)
+    if name in ('cpmg', 'udd') and n.isdigit() and int(n) > 0 :
+        return cpmg(int(n)) if name == 'cpmg' else udd(int(n))
+    raise ValueError("Unknown sequence '%s', expected one of free, echo, cpmg:N, udd:N"%sequence)
+
+def _segments(pulses) :
+    # Sign, length and middle of the intervals between pulses, in gate times
+    edges = np.array((0.,) + pulses + (1.,))
+    sign = (-1.)**np.arange(len(edges) - 1)
+    return sign, np.diff(edges), 0.5*(edges[1:] + edges[:-1])
+
+def filter_function(omega, tgate, sequence = 'free') :
+    # Filter function F(omega, tgate) of a sequence, in s^2. Arguments broadcast.
+    # Written as a sum over the intervals of sinc terms, which has no cancellation
+    # at low frequencies.
+    sign, length, middle = _segments(pulse_times(sequence))
+    x = np.asarray(omega * tgate)[..., None]
+    amp = sign * length * np.sinc(x*length/(2*np.pi))
+    return tgate**2 * (np.sum(amp*np.cos(x*middle), axis = -1)**2 + np.sum(amp*np.sin(x*middle), axis = -1)**2)
+
+@functools.lru_cache(maxsize = None)
+def _cells(pulses) :
+    # Edges of the cells of x = omega tgate over which the filter function is
+    # integrated exactly : logarithmic up to one period, then CELLS_PER_PERIOD
+    # cells per period up to x_cut = 2 pi PERIODS (n + 1). Returns (edges, x_cut).
+    x_cut = 2*np.pi * PERIODS * (len(pulses) + 1)
+    edges = np.concatenate(([0], np.geomspace(2*np.pi*1e-6, 2*np.pi, LOG_CELLS, endpoint = False),
+                            np.arange(2*np.pi, x_cut, 2*np.pi/CELLS_PER_PERIOD), [x_cut]))
+    return edges, x_cut
+
+def average_filter_function(omega, sequence = 'free') :
+    # Average of the filter function over its oscillations, in s^2. Independent of
+    # the gate time : every pulse and both ends contribute a step of the modulation.
+    n = len(pulse_times(sequence))
+    return (2 + 4*n)/np.asarray(omega)**2
+
+
+# ------------------------------------------
+# Noise spectra
+# ------------------------------------------
+
+class NoiseSpectrum :
+    # Sampled one-sided PSD of the magnetic field noise.
+    # f : frequencies (Hz), psd : PSD at f (T^2/Hz)
+    # The PSD is interpolated log-log between samples and zero outside of the
+    # measured band.
+
+    def __init__(self, f, psd) :
+        f = np.asarray(f, dtype = float)
+        psd = np.asarray(psd, dtype = float)
+        if f.ndim != 1 or f.shape != psd.shape or len(f) < 2 :
+            raise ValueError('A noise spectrum needs at least two samples of (f, psd)')
+        if np.any(f <= 0) or np.any(psd < 0) or not np.all(np.isfinite(psd)) :
+            raise ValueError('Noise spectrum frequencies must be positive and PSD values non negative')
+        order = np.argsort(f)
+        self.f = f[order]
+        self.psd = psd[order]
+        self._log_f = np.log(self.f)
+        self._log_psd = np.log(np.maximum(self.psd, np.finfo(float).tiny))
+        self._cumulative = None
+        self._cache = {}
+
+    @classmethod
+    def load(cls, path) :
+        # Spectrum of a two column file of f (Hz) and PSD (T^2/Hz) : a .npy array of
+        # shape (N, 2) or (2, N), or a text file (.csv comma separated, otherwise
+        # whitespace separated). Header lines and # comments are skipped.
+        if path.endswith('.npy') :
+            data = np.load(path)
+        else :
+            data = np.genfromtxt(path, delimiter = ',' if path.endswith('.csv') else None,
+                                 comments = '#', invalid_raise = False)
+        data = np.atleast_2d(np.asarray(data, dtype = float))
+        if data.shape[0] == 2 and data.shape[1] != 2 :
+            data = data.T
+        if data.ndim != 2 or data.shape[1] < 2 :
+            raise ValueError('Noise spectrum %s must have two columns, frequency and PSD'%path)
+        data = data[np.all(np.isfinite(data[:, :2]), axis = 1)]
+        return cls(data[:, 0], data[:, 1])
+
+    def __call__(self, f) :
+        # PSD at the frequencies f (Hz)
+        f = np.asarray(f, dtype = float)
+        with np.errstate(divide = 'ignore') :
+            psd = np.exp(np.interp(np.log(f), self._log_f, self._log_psd))
+        return np.where((f >= self.f[0]) & (f <= self.f[-1]), psd, 0.)
+
+    def _integrals(self) :
+        # Cumulative integrals of the PSD, P(f) = int_0^f S and Q(f) = int_f^inf S/f^2,
+        # over the samples refined logarithmically
+        if self._cumulative is None :
+            decades = np.log10(self.f[-1]/self.f[0])
+            f = np.union1d(self.f, np.geomspace(self.f[0], self.f[-1], int(np.ceil(decades * POINTS_PER_DECADE)) + 1))
+            psd = self(f)
+            P = np.append(0, np.cumsum(0.5*(psd[1:] + psd[:-1])*np.diff(f)))
+            Q = np.cumsum((0.5*(psd[1:]/f[1:]**2 + psd[:-1]/f[:-1]**2)*np.diff(f))[::-1])[::-1]
+            self._cumulative = (f, P, np.append(Q, 0))
+        return self._cumulative
+
+    def _dephasing(self, tgate, pulses) :
+        # Dephasing of 1-D gate times, integrated over cells of x = 2 pi f tgate :
+        # the PSD averaged over every cell (exact for narrow lines), the filter
+        # function at its middle. Past x_cut the filter function is replaced by its
+        # average, integrated exactly.
+        f_int, P, Q = self._integrals()
+        edges, x_cut = _cells(pulses)
+        middle = 0.5*(edges[1:] + edges[:-1])
+        F = filter_function(middle, 1., pulses)
+        chi = np.empty(len(tgate))
+        rows = max(1, CHUNK_EVALUATIONS//len(edges))
+        for start in range(0, len(tgate), rows) :
+            t = tgate[start:start + rows, None]
+            power = np.diff(np.interp(edges/(2*np.pi*t), f_int, P), axis = 1)
+            tail = np.interp(x_cut/(2*np.pi*t[:, 0]), f_int, Q) * average_filter_function(2*np.pi, pulses)
+            chi[start:start + rows] = t[:, 0]**2 * (power @ F) + tail
+        return DEPHASING_FACTOR * chi
+
+    def dephasing(self, tgate, sequence = 'free') :
+        # Dephasing chi(tgate) of the sequence, any shape of gate times. Gate times
+        # seen before are taken from the cache. When more than MAX_EXACT gate times
+        # are new, the dephasing is interpolated (log-log) from MAX_EXACT gate times
+        # spanning their range.
+        pulses = pulse_times(sequence)
+        cache = self._cache.setdefault(pulses, {})
+        tgate = np.asarray(tgate, dtype = float)
+        unique, inverse = np.unique(tgate, return_inverse = True)
+        valid = np.isfinite(unique) & (unique > 0)
+        # Read from the cache once, it may be updated by other threads
+        found = {t : cache.get(t) for t in unique[valid]}
+        new = np.array([t for t, value in found.items() if value is None])
+
+        if len(new) > MAX_EXACT :
+            grid = np.geomspace(new[0], new[-1], MAX_EXACT)
+            chi = np.maximum(self._dephasing(grid, pulses), np.finfo(float).tiny)
+            found.update(zip(new, np.exp(np.interp(np.log(new), np.log(grid), np.log(chi)))))
+        elif len(new) :
+            computed = dict(zip(new, self._dephasing(new, pulses)))
+            if len(cache) + len(computed) > CACHE_SIZE :
+                cache.clear()
+            cache.update(computed)
+            found.update(computed)
+
+        chi = np.full(unique.shape, np.nan)
+        chi[valid] = [found[t] for t in unique[valid]]
+        return chi[inverse].reshape(tgate.shape)
+
+@functools.lru_cache(maxsize = 8)
+def _load_spectrum(path, mtime) :
+    return NoiseSpectrum.load(path)
+
+def load_spectrum(path) :
+    # Spectrum of a file (see NoiseSpectrum.load), shared between calls until the
+    # file changes, so that the cache of dephasings is kept
+    path = os.path.abspath(path)
+    return _load_spectrum(path, os.path.getmtime(path))
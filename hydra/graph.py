@@ -0,0 +1,142 @@
+import numpy as np
+import errormodel as em
+
+# The error model of em.compute_total_errors expressed as a dependency graph of
+# named intermediate quantities. Every node caches its value, changing an input
+# only invalidates the nodes downstream of it, so that e.g. changing sym_fluc
+# recomputes the trap frequency fluctuation errors and nothing else.
+
+INPUTS = ('nu_c', 'Om', 'dzB', 'nuSE', 'SBa', 'SV', 'nu_XY', 'pulse_shaping', 'g_factor',
+          'vib_mode', 'chi', 'SA', 'nbar', 'sym_fluc', 'spectrum', 'sequence')
+
+DEFAULT_INPUTS = {"pulse_shaping" : False, "g_factor" : em.G_FACTOR_CHIP,
+                  "vib_mode" : em.VIB_MODE_AXIAL_STR, "chi" : 0, "SA" : 0, "nbar" : 0,
+                  "sym_fluc" : 0, "spectrum" : None, "sequence" : 'free'}
+
+# Error nodes, in the order returned by em.compute_total_errors
+ERROR_NODES = ('err_heating', 'err_decoherence', 'err_trap_fluc', 'err_offres', 'err_amp_noise')
+
+
+# name : (dependencies, function of the dependencies), the steps of
+# em.compute_total_errors and em.compute_mode_errors
+NODES = {
+    "nu_s" : (('nu_c',), lambda nu_c : np.sqrt(3) * nu_c),
+    "nu_mode" : (('nu_c', 'nu_XY', 'vib_mode'), em.compute_mode_frequency),
+    "eta" : (('nu_mode', 'dzB'), em.compute_eta),
+    "ndot" : (('nu_c', 'nu_mode', 'nuSE', 'vib_mode'), em.compute_ndot),
+    "err_heating" : (('ndot', 'eta', 'Om'), lambda ndot, eta, Om : em.err_heating(ndot, eta, Om, em.HEATING_FACTOR)),
+    "tgate" : (('eta', 'Om'), em.compute_gate_time),
+    "SBv" : (('nu_c', 'dzB', 'g_factor', 'SV'), em.compute_SBv),
+    "SBi" : (('SA',), em.compute_SBi),
+    "SBtot" : (('SBa', 'SBv', 'SBi'), lambda SBa, SBv, SBi : SBa + SBv + SBi),
+    "T2" : (('SBtot',), em.compute_T2),
+    "dephasing" : (('tgate', 'spectrum', 'sequence'), em.compute_dephasing),
+    "err_decoherence" : (('tgate', 'T2', 'dephasing'), em.compute_decoherence_error),
+    "variance_kerr" : (('nu_s', 'nu_XY', 'vib_mode'), em.compute_kerr_variance),
+    "variance" : (('variance_kerr', 'sym_fluc'), lambda variance_kerr, sym_fluc : variance_kerr + sym_fluc**2),
+    "err_trap_fluc" : (('variance', 'nbar', 'tgate'), em.err_trap_fluc),
+    "err_amp_noise" : (('tgate', 'chi'), em.compute_amp_noise_error),
+    "err_offres" : (('Om', 'dzB', 'nu_c', 'pulse_shaping'), em.compute_offres_error),
+}
+
+
+def _descendants() :
+    # Map every input and node to the set of nodes depending on it, directly or not
+    children = {name : set() for name in INPUTS + tuple(NODES)}
+    for name, (deps, _) in NODES.items() :
+        for dep in deps :
+            children[dep].add(name)
+
+    def collect(name) :
+        out = set(children[name])
+        for child in children[name] :
+            out |= collect(child)
+        return out
+
+    return {name : collect(name) for name in children}
+
+DESCENDANTS = _descendants()
+
+
+class ModelGraph :
+    # Cached, incrementally updated evaluation of the error model.
+    # Usage :
+    #   graph = ModelGraph()
+    #   graph.set(nu_c = nu_c_list, Om = Om, dzB = dzB, ...)
+    #   err_h, err_d, err_t, err_o, err_a = graph.errors()
+    #   graph.recomputed  # nodes evaluated by the last call(s) since set()
+    # The rounds of an adaptive COM frequency grid are evaluated on graph.stage(i).
+
+    def __init__(self) :
+        self.inputs = dict(DEFAULT_INPUTS)
+        self.values = {}
+        self.recomputed = []
+        self.stages = []
+        self.n_stages = 1
+
+    def stage(self, i) :
+        # Graph of round i of an adaptive grid (see nugrid.adaptive) : round 0, the
+        # coarse grid, is this graph, every round of midpoints has a graph of its
+        # own. Each round thus keeps the cache of its COM frequencies, and only the
+        # nodes downstream of changed inputs are recomputed as long as the grid of
+        # the round does not move. stage(0) starts a new evaluation.
+        if i == 0 :
+            self.n_stages = 1
+            return self
+        while len(self.stages) < i :
+            self.stages += [ModelGraph()]
+        self.n_stages = max(self.n_stages, i + 1)
+        return self.stages[i - 1]
+
+    def stage_recomputed(self) :
+        # Nodes recomputed by every round of the last evaluation
+        return [graph.recomputed for graph in [self] + self.stages[:self.n_stages - 1]]
+
+    def set(self, **inputs) :
+        # Update inputs, invalidating the nodes downstream of those which changed.
+        # Also resets the list of recomputed nodes.
+        self.recomputed = []
+        for name, value in inputs.items() :
+            if name not in INPUTS :
+                raise TypeError("Unknown model input '%s'"%name)
+            if name in self.inputs and self._equal(self.inputs[name], value) :
+                continue
+            self.inputs[name] = value
+            for node in DESCENDANTS[name] :
+                self.values.pop(node, None)
+
+    @staticmethod
+    def _equal(a, b) :
+        if np.ndim(a) == 0 and np.ndim(b) == 0 :
+            return a == b and type(a) == type(b)
+        return np.shape(a) == np.shape(b) and np.array_equal(a, b)
+
+    def get(self, name) :
+        # Value of an input or node, computing stale nodes as needed
+        if name in INPUTS :
+            if name not in self.inputs :
+                raise ValueError("Model input '%s' is not set"%name)
+            return self.inputs[name]
+        if name not in self.values :
+            deps, func = NODES[name]
+            with np.errstate(invalid = 'ignore') :
+                self.values[name] = func(*[self.get(dep) for dep in deps])
+            self.recomputed += [name]
+        return self.values[name]
+
+    def errors(self) :
+        # Errors in the same form as em.compute_total_errors
+        errors = [self.get(name) for name in ERROR_NODES]
+        shape = np.broadcast_shapes(*[np.shape(err) for err in errors])
+        return tuple(em._as_full_array(err, shape) for err in errors)
+
+    def describe(self) :
+        # Debug view of the nodes recomputed since the last set(), per round of an
+        # adaptive grid
+        rounds = self.stage_recomputed()
+        if not any(rounds) :
+            return 'Model graph : nothing recomputed'
+        if len(rounds) == 1 :
+            return 'Model graph : recomputed %s'%', '.join(self.recomputed)
+        return 'Model graph : recomputed %s'%' | '.join('round %d : %s'%(i, ', '.join(names) or '-')
+                                                          for i, names in enumerate(rounds))
@@ -0,0 +1,97 @@
+import copy
+
+import numpy as np
+import errormodel as em
+import evaluate
+
+# Optimal infidelity over a grid of two slider parameters, the others fixed at
+# the values of a GUI state. Axes are given in slider units (log10 of the noise
+# parameters, kHz, MHz, ...) and converted with evaluate.state_to_params, so that
+# the toggles of the state apply as in the main plot.
+#
+# The grid is refined progressively : progressive() first evaluates every
+# coarsest-step point, then fills in the points of every finer level, reusing the
+# points already computed, and yields the image after every level. The coarse
+# image is available after a fraction of the full cost.
+
+# Slider key : (label, unit, low, high, log), ranges of MainWindow.init_sliders
+SLIDER_AXES = {"dzB" : ('Gradient', 'T/m', 25, 200, False),
+               "Om" : ('Rabi Frequency', 'kHz', 25, 150, False),
+               "nuSE" : ('Electric Noise', '', -8, -4, True),
+               "SBa" : ('Ambient Magnetic Noise', '', -26, -20, True),
+               "SV" : ('Voltage Noise', '', -20, -12, True),
+               "nuXY" : ('Radial Frequency', 'MHz', 1, 5, False),
+               "chi" : ('Amplitude Noise', '', -4, -1, True),
+               "SA" : ('CCW Amplitude Noise', '', -18, -6, True),
+               "nbar" : ('Mean Phonon Number', '', -1, 1, True),
+               "symfluc" : ('Symmetric Fluctuation', 'Hz', 0, 100, False)}
+
+# Grid steps of the refinement levels, coarsest first
+LEVELS = (4, 2, 1)
+
+
+def axis_values(name, n, low = None, high = None) :
+    # n slider values of parameter name, over its slider range by default
+    _, _, slider_low, slider_high, _ = SLIDER_AXES[name]
+    return np.linspace(slider_low if low is None else low, slider_high if high is None else high, n)
+
+def grid_params(state, x_name, x_values, y_name, y_values) :
+    # Keyword arguments of em.compute_total_errors for the grid points (y, x) of
+    # two slider parameters, the other parameters taken from state
+    state = copy.deepcopy(state)
+    state['slider'][x_name] = np.asarray(x_values, dtype = float)[None, :]
+    state['slider'][y_name] = np.asarray(y_values, dtype = float)[:, None]
+    return evaluate.state_to_params(state)
+
+def optimal_infidelity(params, nu_c_list, include_offres = True) :
+    # Minimum total infidelity over nu_c_list, parameters broadcast. The whole
+    # range of nu_c_list is searched.
+    # Returns (err_min, nu_opt) with the broadcast shape of the parameters
+    nu_c_list = np.asarray(nu_c_list, dtype = float)
+    values = {name : np.asarray(value)[..., None] if name not in em.OPTION_PARAMS else value
+              for name, value in params.items()}
+    errors = em.compute_total_errors(nu_c_list, **values)
+    err_tot = errors[0] + errors[1] + errors[2] + errors[4]
+    if include_offres :
+        err_tot = err_tot + errors[3]
+    return em.optimize_fidelity_batch(nu_c_list, err_tot, nu_c_list[0], nu_c_list[-1])
+
+def _include_offres(state) :
+    display = evaluate.get_display(state)
+    return display['include_offres'] and display['show_offres']
+
+def heatmap(state, x_name, x_values, y_name, y_values, nu_c_list) :
+    # Optimal infidelity and COM frequency over the full grid, shape (len(y), len(x))
+    params = grid_params(state, x_name, x_values, y_name, y_values)
+    return optimal_infidelity(params, nu_c_list, _include_offres(state))
+
+def progressive(state, x_name, x_values, y_name, y_values, nu_c_list, levels = LEVELS) :
+    # Generator of progressively refined heatmaps. Yields (step, err_min, nu_opt)
+    # after every level, with arrays of shape (len(y), len(x)) : the points on the
+    # grid of the current step are computed, the others hold the value of the
+    # nearest computed point below and to the left.
+    x_values = np.asarray(x_values, dtype = float)
+    y_values = np.asarray(y_values, dtype = float)
+    shape = (len(y_values), len(x_values))
+    params = grid_params(state, x_name, x_values, y_name, y_values)
+    include_offres = _include_offres(state)
+
+    err_min = np.full(shape, np.nan)
+    nu_opt = np.full(shape, np.nan)
+    done = np.zeros(shape, dtype = bool)
+    for step in levels :
+        # New points of this level, evaluated as one flat batch
+        todo = np.zeros(shape, dtype = bool)
+        todo[::step, ::step] = True
+        todo &= ~done
+        iy, ix = np.nonzero(todo)
+        if len(iy) :
+            points = {name : (np.broadcast_to(value, shape)[iy, ix] if np.ndim(value) and name not in em.OPTION_PARAMS else value)
+                      for name, value in params.items()}
+            err_min[iy, ix], nu_opt[iy, ix] = optimal_infidelity(points, nu_c_list, include_offres)
+            done |= todo
+
+        # Fill the missing points from the coarse grid of this level
+        rows = (np.arange(shape[0])//step)*step
+        cols = (np.arange(shape[1])//step)*step
+        yield step, err_min[np.ix_(rows, cols)], nu_opt[np.ix_(rows, cols)]
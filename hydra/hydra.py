@@ -1,11 +1,20 @@
-from PyQt5 import QtWidgets, uic, QtCore, QtGui
-from pyqtgraph import PlotWidget, TextItem
+from PyQt5 import QtWidgets, QtCore, QtGui
 import pyqtgraph as pg
 import sys, os
+import hashlib
+import time
 import numpy as np
-import errormodel as em
+import calibration
+import evaluate
+import filterfunction
+import heatmap
+import montecarlo
+import nugrid
+import pareto
+import profiling
+import sensitivity
+from graph import ModelGraph
 import json
-from scipy.interpolate import griddata, interp1d
 
 VERSION = '1.1'
 
@@ -35,39 +44,95 @@ C3 = '#FF9912'
 C4 = '#3CAEA3'
 COLORS = [C1, C2, C3, C4, 'k']
 
+# Delay after the last slider move before the model is re-evaluated
+UPDATE_DEBOUNCE_MS = int(os.environ.get('HYDRA_DEBOUNCE_MS', 30))
+
+# Report the model graph nodes recomputed by every update
+DEBUG_GRAPH = bool(os.environ.get('HYDRA_DEBUG_GRAPH'))
+
 def resource_path(relative_path):
     bundle_dir = getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__)))
     path_to_dat = os.path.abspath(os.path.join(bundle_dir, relative_path))
     return path_to_dat
     
-CHIP_PRESET_FILE = resource_path("presets\\chip_preset.json")
-MACRO_PRESET_FILE = resource_path("presets\\macro_preset.json")
+CHIP_PRESET_FILE = resource_path(os.path.join("presets", "chip_preset.json"))
+MACRO_PRESET_FILE = resource_path(os.path.join("presets", "macro_preset.json"))
 
-with open(CHIP_PRESET_FILE) as json_file:
-    CHIP_PRESET_DATA = json.load(json_file)
-with open(MACRO_PRESET_FILE) as json_file:
-    MACRO_PRESET_DATA = json.load(json_file)
+def read_preset(path) :
+    # Presets are only read when they are loaded
+    with open(path) as json_file:
+        return json.load(json_file)
     
 WINDOW_UI_FILE = resource_path('window.ui')
+# Form precompiled from window.ui, regenerate it with : python hydra.py --compile-ui
+WINDOW_UI_MODULE_FILE = resource_path('ui_window.py')
+
+def ui_source_hash() :
+    # Hash of window.ui, independent of line endings
+    with open(WINDOW_UI_FILE, 'rb') as f :
+        return hashlib.sha1(f.read().replace(b'\r\n', b'\n')).hexdigest()
+
+def compile_ui() :
+    # Precompile window.ui into ui_window.py, stamped with the hash of its source.
+    # The header names window.ui relative to the repository rather than the path
+    # of the build machine, and the Qt modules the form does not use are not
+    # imported.
+    import io
+    from PyQt5 import uic
+    form = io.StringIO()
+    uic.compileUi(WINDOW_UI_FILE, form)
+    source = form.getvalue().replace(repr(WINDOW_UI_FILE), repr('hydra/window.ui'))
+    modules = [name for name in ('QtCore', 'QtGui', 'QtWidgets')
+               if name + '.' in source.split('from PyQt5 import', 1)[1].split('\n', 1)[1]]
+    source = source.replace('from PyQt5 import QtCore, QtGui, QtWidgets', 'from PyQt5 import ' + ', '.join(modules))
+    with open(WINDOW_UI_MODULE_FILE, 'w') as f :
+        f.write(source)
+        f.write('\nUI_SOURCE_HASH = %r\n'%ui_source_hash())
+
+def load_ui(window) :
+    # Build the widgets of window.ui into window. The precompiled form is used
+    # when it matches window.ui, otherwise the XML is compiled at runtime.
+    try :
+        import ui_window
+        precompiled = not os.path.exists(WINDOW_UI_FILE) or ui_window.UI_SOURCE_HASH == ui_source_hash()
+    except (ImportError, AttributeError) :
+        precompiled = False
+        
+    if precompiled :
+        form = ui_window.Ui_MainWindow()
+        form.setupUi(window)
+        for name, widget in vars(form).items() :
+            setattr(window, name, widget)
+    else :
+        from PyQt5 import uic
+        uic.loadUi(WINDOW_UI_FILE, window)
    
 class Trace:
     
     curves = []
     errors = []
-    NU_C_LIST = np.linspace(100, 500, 100)*KHZ
+    nu_c = [300*KHZ]
     hide = False
     update = False
     active = False
     point = None
+    band = None
+    bands = None
     table = {"tgate" : 0, "numin" : 0, "errmin" : 1, "ndot" : 0}
     
     params = {}
     
     def __init__(self):
-        return None
+        self.graph = ModelGraph()
                 
-    def updateErrors(self, errors):
+    def updateErrors(self, errors, nu_c):
+        # Error curves over the COM frequencies nu_c
         self.errors = errors
+        self.nu_c = nu_c
+        
+    def updateBands(self, bands) :
+        # Monte Carlo quantiles of the total infidelity, None when disabled
+        self.bands = bands
         
     def updateTable(self, tgate = 0, numin = 0, errmin = 1, ndot = 0) :
         if self.update :
@@ -78,10 +143,522 @@ class Trace:
             for curve in self.curves : 
                 curve.setData([300], [1])
             self.point.setData([300], [1])   
+            self.plotBand()
         elif self.update : 
             for curve, err in zip(self.curves, self.errors) :
-                curve.setData(self.NU_C_LIST/KHZ, err)
+                curve.setData(self.nu_c/KHZ, err)
             self.point.setData([self.table["numin"]/KHZ], [self.table["errmin"]])
+            self.plotBand()
+            
+    def plotBand(self) :
+        # Fill between the lowest and highest Monte Carlo quantiles
+        if self.band is None :
+            return
+        low, high = self.band
+        if self.hide or self.bands is None :
+            low.setData([300], [1])
+            high.setData([300], [1])
+        else :
+            low.setData(self.nu_c/KHZ, self.bands[0])
+            high.setData(self.nu_c/KHZ, self.bands[-1])
+
+
+class ModelWorkerSignals(QtCore.QObject) :
+    # job id, trace id, cache key, result of evaluate.evaluate_state (None on failure)
+    finished = QtCore.pyqtSignal(int, int, object, object)
+    
+class ModelWorker(QtCore.QRunnable) :
+    # Evaluates a GUI state with the error model outside of the Qt main thread
+    
+    def __init__(self, job_id, trace_id, key, state, nu_c_list, graph) :
+        super(ModelWorker, self).__init__()
+        self.job_id = job_id
+        self.trace_id = trace_id
+        self.key = key
+        self.state = state
+        self.nu_c_list = nu_c_list
+        self.graph = graph
+        self.signals = ModelWorkerSignals()
+        
+    def run(self) :
+        try :
+            with profiling.cprofile_thread() :
+                result = evaluate.evaluate_state(self.state, self.nu_c_list, graph = self.graph)
+        except Exception as e :
+            print('Error : Model evaluation failed (%s)'%e)
+            result = None
+        self.signals.finished.emit(self.job_id, self.trace_id, self.key, result)
+        
+
+class TaskSignals(QtCore.QObject) :
+    # result of the task, None on failure
+    finished = QtCore.pyqtSignal(object)
+    
+class TaskWorker(QtCore.QRunnable) :
+    # Runs a long computation func(*args) outside of the Qt main thread
+    
+    def __init__(self, func, *args) :
+        super(TaskWorker, self).__init__()
+        self.func = func
+        self.args = args
+        self.signals = TaskSignals()
+        
+    def run(self) :
+        try :
+            result = self.func(*self.args)
+        except Exception as e :
+            print('Error : Task failed (%s)'%e)
+            result = None
+        self.signals.finished.emit(result)
+
+
+class ParetoTab(QtWidgets.QWidget) :
+    # Pareto front of gate time against infidelity (optionally heating rate) over
+    # the slider ranges of dzB and Om and the range of the COM frequency grid
+    # settings, the other parameters are those of the active trace. Hover a
+    # point to inspect its parameters.
+    
+    def __init__(self, window) :
+        super(ParetoTab, self).__init__()
+        self.window = window
+        self.result = None
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        
+        self.spinBoxSamples = QtWidgets.QSpinBox(self)
+        self.spinBoxSamples.setRange(10000, 10000000)
+        self.spinBoxSamples.setSingleStep(100000)
+        self.spinBoxSamples.setValue(1000000)
+        self.checkBoxHeating = QtWidgets.QCheckBox('Heating rate objective', self)
+        self.checkBoxOffRes = QtWidgets.QCheckBox('Include off-res error', self)
+        self.checkBoxOffRes.setChecked(True)
+        self.btnCompute = QtWidgets.QPushButton('Compute', self)
+        self.btnCompute.clicked.connect(lambda : self.compute())
+        
+        controls = QtWidgets.QHBoxLayout()
+        controls.addWidget(QtWidgets.QLabel('Samples', self))
+        controls.addWidget(self.spinBoxSamples)
+        controls.addWidget(self.checkBoxHeating)
+        controls.addWidget(self.checkBoxOffRes)
+        controls.addStretch()
+        controls.addWidget(self.btnCompute)
+        
+        self.plotWidget = pg.PlotWidget(self)
+        self.plotWidget.setBackground(None)
+        self.plotWidget.setLogMode(True, True)
+        self.plotWidget.setLabel('bottom', 'Gate Time', 's')
+        self.plotWidget.setLabel('left', 'Infidelity')
+        self.scatter = pg.ScatterPlotItem(hoverable = True, hoverSize = 12, tip = None)
+        self.scatter.sigHovered.connect(self.hover)
+        self.plotWidget.addItem(self.scatter)
+        
+        self.labelInfo = QtWidgets.QLabel('Press Compute to sample dzB, Om and the COM frequency over their ranges', self)
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(self.plotWidget)
+        layout.addWidget(self.labelInfo)
+        
+    def compute(self) :
+        params = evaluate.state_to_params(self.window.get_state())
+        box = pareto.default_box(self.window.nu_grid_settings)
+        for name in box :
+            params.pop(name, None)
+        objectives = ('tgate', 'infidelity')
+        if self.checkBoxHeating.isChecked() :
+            objectives += ('heating_rate',)
+        
+        self.btnCompute.setEnabled(False)
+        self.labelInfo.setText('Computing...')
+        worker = TaskWorker(pareto.pareto_front, box, params, objectives, self.spinBoxSamples.value(),
+                            0, self.checkBoxOffRes.isChecked())
+        worker.signals.finished.connect(self.show_result)
+        self.thread_pool.start(worker)
+        
+    def show_result(self, result) :
+        self.btnCompute.setEnabled(True)
+        self.result = result
+        if result is None or len(result) == 0 :
+            self.scatter.clear()
+            self.labelInfo.setText('No Pareto front found')
+            return
+        
+        objectives = result.objectives
+        brush = pg.mkBrush(COLORS[0])
+        if 'heating_rate' in objectives :
+            # Color by heating rate, on a log scale
+            rate = np.log10(objectives['heating_rate'])
+            scale = (rate - rate.min())/max(np.ptp(rate), 1e-12)
+            brush = [pg.mkBrush(color) for color in pg.colormap.get('viridis').map(scale, mode = 'qcolor')]
+        
+        self.scatter.setData(x = np.log10(objectives['tgate']), y = np.log10(objectives['infidelity']),
+                             data = np.arange(len(result)), brush = brush, pen = None, size = 6)
+        self.labelInfo.setText('%d Pareto optimal configurations out of %d'%(len(result), result.n_candidates))
+        
+    def hover(self, item, points, ev) :
+        if self.result is None or len(points) == 0 :
+            return
+        point = self.result.point(int(points[0].data()))
+        text = 'dzB = %.1f T/m, Om = %.1f kHz, nu = %.1f kHz, gate time = %.3f ms, infidelity = %.3e'%(
+            point['dzB'], point['Om']/KHZ, point['nu_c']/KHZ, point['tgate']*1e3, point['infidelity'])
+        if 'heating_rate' in point :
+            text += ', heating rate = %.3g'%point['heating_rate']
+        self.labelInfo.setText(text)
+        
+
+class HeatmapSignals(QtCore.QObject) :
+    # job id, refinement step, optimal infidelity image (None on failure)
+    level = QtCore.pyqtSignal(int, int, object)
+    
+class HeatmapWorker(QtCore.QRunnable) :
+    # Computes the levels of heatmap.progressive outside of the Qt main thread,
+    # stopping early once a newer job has been requested
+    
+    def __init__(self, tab, job_id, state, x_name, x_values, y_name, y_values, nu_c_list) :
+        super(HeatmapWorker, self).__init__()
+        self.tab = tab
+        self.job_id = job_id
+        self.args = (state, x_name, x_values, y_name, y_values, nu_c_list)
+        self.signals = HeatmapSignals()
+        
+    def run(self) :
+        try :
+            for step, err_min, nu_opt in heatmap.progressive(*self.args) :
+                self.signals.level.emit(self.job_id, step, err_min)
+                if self.tab.job != self.job_id :
+                    return
+        except Exception as e :
+            print('Error : Heatmap evaluation failed (%s)'%e)
+            self.signals.level.emit(self.job_id, 0, None)
+            
+
+class HeatmapTab(QtWidgets.QWidget) :
+    # Optimal infidelity over the slider ranges of two parameters, the other
+    # parameters are those of the active trace. The map follows the sliders while
+    # the tab is visible, a coarse image is shown first and then refined.
+    
+    def __init__(self, window) :
+        super(HeatmapTab, self).__init__()
+        self.window = window
+        self.job = 0
+        self.pending = False
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(UPDATE_DEBOUNCE_MS)
+        self.timer.timeout.connect(lambda : self.compute())
+        
+        self.comboBoxX = QtWidgets.QComboBox(self)
+        self.comboBoxY = QtWidgets.QComboBox(self)
+        for name, (label, unit, low, high, log) in heatmap.SLIDER_AXES.items() :
+            self.comboBoxX.addItem(label, name)
+            self.comboBoxY.addItem(label, name)
+        self.comboBoxX.setCurrentIndex(self.comboBoxX.findData('dzB'))
+        self.comboBoxY.setCurrentIndex(self.comboBoxY.findData('Om'))
+        self.spinBoxPoints = QtWidgets.QSpinBox(self)
+        self.spinBoxPoints.setRange(20, 1000)
+        self.spinBoxPoints.setSingleStep(20)
+        self.spinBoxPoints.setValue(200)
+        self.comboBoxX.currentIndexChanged.connect(lambda : self.update_map())
+        self.comboBoxY.currentIndexChanged.connect(lambda : self.update_map())
+        self.spinBoxPoints.valueChanged.connect(lambda : self.update_map())
+        
+        controls = QtWidgets.QHBoxLayout()
+        controls.addWidget(QtWidgets.QLabel('X', self))
+        controls.addWidget(self.comboBoxX)
+        controls.addWidget(QtWidgets.QLabel('Y', self))
+        controls.addWidget(self.comboBoxY)
+        controls.addWidget(QtWidgets.QLabel('Points', self))
+        controls.addWidget(self.spinBoxPoints)
+        controls.addStretch()
+        
+        self.plotWidget = pg.PlotWidget(self)
+        self.plotWidget.setBackground(None)
+        self.image = pg.ImageItem(axisOrder = 'row-major')
+        self.plotWidget.addItem(self.image)
+        self.colorBar = pg.ColorBarItem(label = 'log10 Infidelity', colorMap = pg.colormap.get('viridis'),
+                                        interactive = False)
+        self.colorBar.setImageItem(self.image, insert_in = self.plotWidget.getPlotItem())
+        
+        self.labelInfo = QtWidgets.QLabel(self)
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(self.plotWidget)
+        layout.addWidget(self.labelInfo)
+        
+    def axis(self, comboBox) :
+        name = comboBox.currentData()
+        label, unit, low, high, log = heatmap.SLIDER_AXES[name]
+        return name, heatmap.axis_values(name, self.spinBoxPoints.value()), ('log10 ' + label if log else label), unit
+        
+    def update_map(self) :
+        # Schedule a recomputation if the tab is shown
+        if self.isVisible() :
+            self.timer.start()
+            
+    def showEvent(self, event) :
+        self.update_map()
+        super(HeatmapTab, self).showEvent(event)
+        
+    def compute(self) :
+        x_name, x_values, x_label, x_unit = self.axis(self.comboBoxX)
+        y_name, y_values, y_label, y_unit = self.axis(self.comboBoxY)
+        if x_name == y_name :
+            self.labelInfo.setText('Choose two different parameters')
+            return
+        
+        # A running job stops after its current level, the newest request follows
+        self.job += 1
+        self.started = time.perf_counter()
+        self.plotWidget.setLabel('bottom', x_label, x_unit)
+        self.plotWidget.setLabel('left', y_label, y_unit)
+        # Pixels are centered on the grid values
+        dx, dy = np.diff(x_values[:2])[0], np.diff(y_values[:2])[0]
+        self.rect = QtCore.QRectF(x_values[0] - dx/2, y_values[0] - dy/2, len(x_values)*dx, len(y_values)*dy)
+        worker = HeatmapWorker(self, self.job, self.window.get_state(), x_name, x_values, y_name, y_values,
+                               nugrid.uniform(self.window.nu_grid_settings))
+        worker.signals.level.connect(self.show_level)
+        self.thread_pool.start(worker)
+        
+    def show_level(self, job_id, step, err_min) :
+        if job_id != self.job :
+            return
+        if err_min is None :
+            self.labelInfo.setText('Heatmap evaluation failed')
+            return
+        
+        with profiling.stage('heatmap'), np.errstate(divide = 'ignore') :
+            image = np.log10(err_min)
+            self.image.setImage(image, autoLevels = False)
+            self.image.setRect(self.rect)
+            finite = image[np.isfinite(image)]
+            if len(finite) :
+                self.colorBar.setLevels((finite.min(), finite.max()))
+        
+        elapsed = 1e3*(time.perf_counter() - self.started)
+        if step > 1 :
+            self.labelInfo.setText('Refining... (step %d, %.0f ms)'%(step, elapsed))
+        else :
+            self.labelInfo.setText('%d x %d points in %.0f ms, best infidelity %.3e'
+                                   %(image.shape[1], image.shape[0], elapsed, np.nanmin(err_min)))
+        
+
+class ProfilingPanel(QtWidgets.QDialog) :
+    # Small window showing the percentiles of the profiled stages, refreshed
+    # while it is visible
+    
+    COLUMNS = ('count', 'mean', 'p50', 'p90', 'p99', 'max')
+    
+    def __init__(self, parent = None) :
+        super(ProfilingPanel, self).__init__(parent)
+        self.setWindowTitle('Profiling')
+        self.resize(520, 240)
+        
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(['count'] + ['%s (ms)'%c for c in self.COLUMNS[1:]])
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.label = QtWidgets.QLabel(self)
+        resetButton = QtWidgets.QPushButton('Reset', self)
+        resetButton.clicked.connect(lambda : self.reset())
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addWidget(self.label)
+        layout.addWidget(resetButton)
+        
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(lambda : self.refresh())
+        
+    def showEvent(self, event) :
+        self.refresh()
+        self.timer.start()
+        super(ProfilingPanel, self).showEvent(event)
+        
+    def hideEvent(self, event) :
+        self.timer.stop()
+        super(ProfilingPanel, self).hideEvent(event)
+        
+    def reset(self) :
+        profiling.reset()
+        self.refresh()
+        
+    def refresh(self) :
+        stats = profiling.stats()
+        self.table.setRowCount(len(stats))
+        self.table.setVerticalHeaderLabels(list(stats))
+        for row, summary in enumerate(stats.values()) :
+            self.table.setItem(row, 0, QtWidgets.QTableWidgetItem('%d'%summary['count']))
+            for col, name in enumerate(self.COLUMNS[1:], 1) :
+                self.table.setItem(row, col, QtWidgets.QTableWidgetItem('%.3f'%(summary[name]*1e3)))
+        
+        if profiling.is_enabled() :
+            self.label.setText('Last %d calls per stage'%profiling.MAX_SAMPLES)
+        else :
+            self.label.setText('Profiling is disabled (Tools > Enable Profiling)')
+
+
+class MonteCarloDialog(QtWidgets.QDialog) :
+    # Settings of the Monte Carlo uncertainty bands : number of samples, and the
+    # distribution of every noise parameter around its slider value
+    
+    DISTRIBUTIONS = {"lognormal" : 'Log-normal (sigma, decades)',
+                     "uniform" : 'Uniform (half width, decades)'}
+    
+    def __init__(self, settings, parent = None) :
+        super(MonteCarloDialog, self).__init__(parent)
+        self.setWindowTitle('Monte Carlo Settings')
+        layout = QtWidgets.QFormLayout(self)
+        
+        self.spinBoxSamples = QtWidgets.QSpinBox(self)
+        self.spinBoxSamples.setRange(100, 1000000)
+        self.spinBoxSamples.setSingleStep(1000)
+        self.spinBoxSamples.setValue(settings['samples'])
+        layout.addRow('Samples', self.spinBoxSamples)
+        
+        self.rows = {}
+        for name in montecarlo.UNCERTAIN_PARAMS :
+            dist = settings['spec'].get(name, {"dist" : "lognormal", "sigma" : 0})
+            comboBox = QtWidgets.QComboBox(self)
+            comboBox.addItems(list(self.DISTRIBUTIONS.values()))
+            comboBox.setCurrentIndex(list(self.DISTRIBUTIONS).index(dist['dist']))
+            spinBox = QtWidgets.QDoubleSpinBox(self)
+            spinBox.setRange(0, 5)
+            spinBox.setSingleStep(0.1)
+            spinBox.setValue(dist.get('sigma', dist.get('width', 0)))
+            
+            row = QtWidgets.QHBoxLayout()
+            row.addWidget(comboBox)
+            row.addWidget(spinBox)
+            layout.addRow(name, row)
+            self.rows[name] = (comboBox, spinBox)
+        
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel, parent = self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        self.seed = settings['seed']
+        
+    def settings(self) :
+        spec = {}
+        for name, (comboBox, spinBox) in self.rows.items() :
+            dist = list(self.DISTRIBUTIONS)[comboBox.currentIndex()]
+            if spinBox.value() > 0 :
+                spec[name] = {"dist" : dist, ("sigma" if dist == 'lognormal' else "width") : spinBox.value()}
+        return {"samples" : self.spinBoxSamples.value(), "seed" : self.seed, "spec" : spec}
+
+
+class NuGridDialog(QtWidgets.QDialog) :
+    # Settings of the grid of COM frequencies, see nugrid.py
+    
+    def __init__(self, settings, parent = None) :
+        super(NuGridDialog, self).__init__(parent)
+        self.setWindowTitle('COM Frequency Grid')
+        layout = QtWidgets.QFormLayout(self)
+        self.settings_in = settings
+        
+        def spinBox(value, low, high, step, decimals = 0) :
+            box = QtWidgets.QDoubleSpinBox(self) if decimals else QtWidgets.QSpinBox(self)
+            if decimals :
+                box.setDecimals(decimals)
+            box.setRange(low, high)
+            box.setSingleStep(step)
+            box.setValue(value)
+            return box
+        
+        self.spinBoxNuMin = spinBox(settings['nu_min'], 10, 2000, 10, 1)
+        self.spinBoxNuMax = spinBox(settings['nu_max'], 10, 2000, 10, 1)
+        self.checkBoxAdaptive = QtWidgets.QCheckBox('Refine near the minimum and high curvature', self)
+        self.checkBoxAdaptive.setChecked(settings['adaptive'])
+        self.spinBoxPoints = spinBox(settings['points'], 10, 10000, 10)
+        self.spinBoxTol = spinBox(settings['tol'], 0.0001, 1, 0.005, 4)
+        self.spinBoxResolution = spinBox(settings['resolution'], 0.001, 50, 0.01, 3)
+        self.spinBoxMaxPoints = spinBox(settings['max_points'], 10, 10000, 10)
+        layout.addRow('Lowest frequency (kHz)', self.spinBoxNuMin)
+        layout.addRow('Highest frequency (kHz)', self.spinBoxNuMax)
+        layout.addRow('Adaptive', self.checkBoxAdaptive)
+        layout.addRow('Uniform points', self.spinBoxPoints)
+        layout.addRow('Curvature tolerance (decades)', self.spinBoxTol)
+        layout.addRow('Resolution at minimum (kHz)', self.spinBoxResolution)
+        layout.addRow('Maximum adaptive points', self.spinBoxMaxPoints)
+        
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel, parent = self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        
+    def settings(self) :
+        settings = dict(self.settings_in)
+        nu_min, nu_max = sorted((self.spinBoxNuMin.value(), self.spinBoxNuMax.value()))
+        settings.update({"nu_min" : nu_min, "nu_max" : nu_max, "adaptive" : self.checkBoxAdaptive.isChecked(),
+                         "points" : self.spinBoxPoints.value(), "tol" : self.spinBoxTol.value(),
+                         "resolution" : self.spinBoxResolution.value(), "max_points" : self.spinBoxMaxPoints.value()})
+        return settings
+
+
+class NoiseSpectrumDialog(QtWidgets.QDialog) :
+    # Measured spectrum of the magnetic field noise and the pulse sequence of the
+    # gate filtering it, see filterfunction.py
+    
+    SEQUENCES = {"free" : 'Free (no refocusing)', "echo" : 'Spin echo', "cpmg" : 'CPMG', "udd" : 'Uhrig (UDD)'}
+    
+    def __init__(self, settings, parent = None) :
+        super(NoiseSpectrumDialog, self).__init__(parent)
+        self.setWindowTitle('Magnetic Noise Spectrum')
+        layout = QtWidgets.QFormLayout(self)
+        settings = settings or {"path" : '', "sequence" : 'free'}
+        name, _, pulses = settings['sequence'].partition(':')
+        
+        self.lineEditPath = QtWidgets.QLineEdit(settings['path'], self)
+        browse = QtWidgets.QPushButton('Browse', self)
+        browse.clicked.connect(lambda : self.browse())
+        row = QtWidgets.QHBoxLayout()
+        row.addWidget(self.lineEditPath)
+        row.addWidget(browse)
+        layout.addRow('PSD file (Hz, T^2/Hz)', row)
+        
+        self.comboBoxSequence = QtWidgets.QComboBox(self)
+        self.comboBoxSequence.addItems(list(self.SEQUENCES.values()))
+        self.comboBoxSequence.setCurrentIndex(list(self.SEQUENCES).index(name))
+        self.spinBoxPulses = QtWidgets.QSpinBox(self)
+        self.spinBoxPulses.setRange(1, 64)
+        self.spinBoxPulses.setValue(int(pulses or 4))
+        self.comboBoxSequence.currentIndexChanged.connect(lambda : self.toggle_pulses())
+        self.toggle_pulses()
+        layout.addRow('Sequence', self.comboBoxSequence)
+        layout.addRow('Pi pulses', self.spinBoxPulses)
+        
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel
+                                             | QtWidgets.QDialogButtonBox.Reset, parent = self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        buttons.button(QtWidgets.QDialogButtonBox.Reset).setText('Remove')
+        buttons.button(QtWidgets.QDialogButtonBox.Reset).clicked.connect(lambda : self.remove())
+        layout.addRow(buttons)
+        
+    def browse(self) :
+        filename = QtWidgets.QFileDialog.getOpenFileName(self, 'Load Noise Spectrum', '', '*.csv *.txt *.dat *.npy')[0]
+        if filename :
+            self.lineEditPath.setText(filename)
+    
+    def toggle_pulses(self) :
+        self.spinBoxPulses.setEnabled(list(self.SEQUENCES)[self.comboBoxSequence.currentIndex()] in ('cpmg', 'udd'))
+    
+    def remove(self) :
+        self.lineEditPath.clear()
+        self.accept()
+        
+    def settings(self) :
+        # None when no file is given
+        path = self.lineEditPath.text().strip()
+        if not path :
+            return None
+        name = list(self.SEQUENCES)[self.comboBoxSequence.currentIndex()]
+        if name in ('cpmg', 'udd') :
+            name += ':%d'%self.spinBoxPulses.value()
+        return {"path" : os.path.abspath(path), "sequence" : name}
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -91,7 +668,7 @@ class MainWindow(QtWidgets.QMainWindow):
         super(MainWindow, self).__init__(*args, **kwargs)
                
         #Load the UI Page     
-        uic.loadUi(WINDOW_UI_FILE, self)    
+        load_ui(self)
         self.setWindowTitle('Hydra - 1.0')         
         
         # Innitialize Traces
@@ -104,10 +681,26 @@ class MainWindow(QtWidgets.QMainWindow):
         self.radioBtnTraceUpdate.toggled.connect(lambda : self.trace_update())
         self.radioBtnTraceHide.toggled.connect(lambda : self.trace_hide() )
         
+        # Innitialize background model evaluation
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.update_running = False
+        self.update_pending = False
+        self.update_job = 0
+        self.update_timer = QtCore.QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(UPDATE_DEBOUNCE_MS)
+        self.update_timer.timeout.connect(self.start_update)
+        self.result_cache = evaluate.ResultCache()
+        
         # Innitialize  Graph
-        self.NU_C_LIST = np.linspace(100, 500, 100)*KHZ
+        self.nu_grid_settings = nugrid.get_settings()
+        self.noise_spectrum = None
         self.init_graph()
         
+        # Innitialize Heatmap tab, which follows the sliders
+        self.heatmapTab = HeatmapTab(self)
+        
         # Innitialize all slider and their labels
         self.init_sliders()
         
@@ -121,12 +714,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.radioBtnSymFluc.toggled.connect(lambda : self.toggle_symfluc_btn())
     
         # Innitialize Table Info 
-        self.tableInfo.setRowCount(4)
+        self.tableInfo.setRowCount(5)
         self.tableInfo.setColumnCount(2)
         self.tableInfo.setItem(0,0, QtWidgets.QTableWidgetItem("Fidelity"))
         self.tableInfo.setItem(1,0, QtWidgets.QTableWidgetItem("Optimal nu"))
         self.tableInfo.setItem(2,0, QtWidgets.QTableWidgetItem("Gate Time"))
-        self.tableInfo.setItem(3,0, QtWidgets.QTableWidgetItem("STR Heating Rate"))
+        self.tableInfo.setItem(3,0, QtWidgets.QTableWidgetItem("Heating Rate"))
+        self.tableInfo.setItem(4,0, QtWidgets.QTableWidgetItem("Fidelity 5-95 %"))
             
         # Innitialize combo boxes
         self.comboBoxArchitecture.currentIndexChanged.connect(lambda : self.update_graph())
@@ -134,10 +728,28 @@ class MainWindow(QtWidgets.QMainWindow):
         self.comboBoxVibMode.currentIndexChanged.connect(lambda : self.update_graph())
             
         # Innitialize Menubar items
-        self.actionLoadChip.triggered.connect(lambda : self.load_presets(CHIP_PRESET_DATA))
-        self.actionLoadMacro.triggered.connect(lambda : self.load_presets(MACRO_PRESET_DATA))
+        self.actionLoadChip.triggered.connect(lambda : self.load_presets(read_preset(CHIP_PRESET_FILE)))
+        self.actionLoadMacro.triggered.connect(lambda : self.load_presets(read_preset(MACRO_PRESET_FILE)))
         self.actionSavePresetFile.triggered.connect(lambda : self.save_preset_file())
         self.actionLoadPresetFile.triggered.connect(lambda : self.load_preset_file())
+        self.actionProfiling.setChecked(profiling.is_enabled())
+        self.actionProfiling.toggled.connect(lambda checked : profiling.enable(checked))
+        self.actionProfilingStats.triggered.connect(lambda : self.show_profiling_stats())
+        self.actionStartCProfile.triggered.connect(lambda : self.start_cprofile())
+        self.actionSaveCProfile.triggered.connect(lambda : self.save_cprofile())
+        self.profiling_panel = None
+        self.actionMonteCarlo.toggled.connect(lambda : self.update_graph())
+        self.actionMonteCarloSettings.triggered.connect(lambda : self.edit_montecarlo_settings())
+        self.montecarlo_settings = dict(evaluate.DEFAULT_MONTECARLO)
+        self.actionErrorBudget.triggered.connect(lambda : self.show_error_budget())
+        self.actionFitMeasurements.triggered.connect(lambda : self.fit_measurements())
+        self.actionNuGrid.triggered.connect(lambda : self.edit_nu_grid_settings())
+        self.actionNoiseSpectrum.triggered.connect(lambda : self.edit_noise_spectrum())
+        
+        # Innitialize Pareto tab
+        self.paretoTab = ParetoTab(self)
+        self.tabWidget.insertTab(1, self.paretoTab, 'Pareto')
+        self.tabWidget.insertTab(2, self.heatmapTab, 'Heatmap')
         
         # Initialize legend and update graph
         self.init_legend()
@@ -174,6 +786,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.traces[self.active_trace].active = True
             self.traces[self.active_trace].curves = [self.graphWidget.plot([1], [1], pen=pen) for pen in self.get_pens(COLORS[self.active_trace])]
             self.traces[self.active_trace].point = self.graphWidget.plot([0], [1], pen= pg.mkPen(None), brush = 'k', symbol = 'o')
+            self.traces[self.active_trace].band = self.init_band(COLORS[self.active_trace])
         
         else :
             params = self.traces[self.active_trace].params
@@ -223,6 +836,32 @@ class MainWindow(QtWidgets.QMainWindow):
             print('Error : Load preset file failed')
             
             
+    def show_profiling_stats(self) :
+        if self.profiling_panel is None :
+            self.profiling_panel = ProfilingPanel(self)
+        self.profiling_panel.show()
+        self.profiling_panel.raise_()
+        
+    def start_cprofile(self) :
+        profiling.start_cprofile()
+        self.actionStartCProfile.setEnabled(False)
+        self.actionSaveCProfile.setEnabled(True)
+        self.statusbar.showMessage('cProfile running, save the trace from the Tools menu')
+        
+    def save_cprofile(self) :
+        filename = QtWidgets.QFileDialog.getSaveFileName(self, 'Save cProfile Trace', 'hydra.prof', '*.prof')[0]
+        if not filename :
+            return
+        
+        try :
+            profiling.stop_cprofile(filename)
+            self.statusbar.showMessage('cProfile trace saved to %s'%filename)
+        except Exception as e :
+            print('Error : Save cProfile trace failed (%s)'%e)
+        
+        self.actionStartCProfile.setEnabled(True)
+        self.actionSaveCProfile.setEnabled(False)
+            
     def save_presets(self) :
         
         dzB = self.sliderGradient.value()
@@ -249,7 +888,8 @@ class MainWindow(QtWidgets.QMainWindow):
                              "SV" : SV, "nuXY" : nuXY, 'chi' : chi, 'SA' : SA, 
                              'nbar' : nbar, 'symfluc' : sym_fluc},
                 "toggles" : {'amp_noise' : toggle_amp_noise, 'ccw_noise' : toggle_ccw_noise, 'sym_fluc' : toggle_sym_fluc},
-                "architecture" : arch,"vnoise" : vnoise,"vib_mode" : vmode}
+                "architecture" : arch,"vnoise" : vnoise,"vib_mode" : vmode,
+                "noise_spectrum" : self.noise_spectrum}
     
     def load_presets(self, data) :
        
@@ -259,25 +899,25 @@ class MainWindow(QtWidgets.QMainWindow):
         self.sliderPower.setValue(data['slider']['Om'])
         self.labelPower.setText(str(data['slider']['Om']) + ' KHz')
         
-        self.sliderENoise.setValue(int(data['slider']['nuSE']*10))
+        self.sliderENoise.setValue(round(data['slider']['nuSE']*10))
         self.labelENoise.setText(str('%.2E'%(10**(data['slider']['nuSE']))))
         
-        self.sliderBAmbient.setValue(int(data['slider']['SBa']*10))
+        self.sliderBAmbient.setValue(round(data['slider']['SBa']*10))
         self.labelBAmbient.setText(str('%.2E'%(10**(data['slider']['SBa']))))
         
-        self.sliderVNoise.setValue(int(data['slider']['SV']*10))
+        self.sliderVNoise.setValue(round(data['slider']['SV']*10))
         self.labelVNoise.setText(str('%.2E'%(10**(data['slider']['SV']))))
         
-        self.sliderNuXY.setValue(int(data['slider']['nuXY']*10))
+        self.sliderNuXY.setValue(round(data['slider']['nuXY']*10))
         self.labelNuXY.setText(str(data['slider']['nuXY']) + ' MHz')
         
-        self.sliderChi.setValue(int(data['slider']['chi']*10))
+        self.sliderChi.setValue(round(data['slider']['chi']*10))
         self.labelChi.setText(str('%.2E'%(10**(data['slider']['chi']))))
         
-        self.sliderSA.setValue(int(data['slider']['SA']*10))
+        self.sliderSA.setValue(round(data['slider']['SA']*10))
         self.labelSA.setText(str('%.2E'%(10**(data['slider']['SA']))))
         
-        self.sliderNbar.setValue(int(data['slider']['nbar']*10))
+        self.sliderNbar.setValue(round(data['slider']['nbar']*10))
         self.labelNbar.setText(str('%.2f'%(10**(data['slider']['nbar']))))
         
         self.sliderSymFluc.setValue(int(data['slider']['symfluc']))
@@ -290,15 +930,22 @@ class MainWindow(QtWidgets.QMainWindow):
         self.radioBtnAmpNoise.setChecked(data['toggles']['amp_noise'])
         self.radioBtnCCWNoise.setChecked(data['toggles']['ccw_noise'])
         self.radioBtnSymFluc.setChecked(data['toggles']['sym_fluc'])
+        
+        self.noise_spectrum = data.get('noise_spectrum')
+        self.update_graph()
             
         return 0
     
-    def update_table(self, err_min, nu_min, tgate, ndot) :
+    def update_table(self, err_min, nu_min, tgate, ndot, mc = None) :
     
         self.tableInfo.setItem(0,1, QtWidgets.QTableWidgetItem('%.3f'%((1 - err_min)*100) + ' %'))
         self.tableInfo.setItem(1,1, QtWidgets.QTableWidgetItem('%.1f'%(nu_min/KHZ) + ' KHZ'))
         self.tableInfo.setItem(2,1, QtWidgets.QTableWidgetItem('%.3f'%(tgate*1e3) + ' ms')) 
         self.tableInfo.setItem(3,1, QtWidgets.QTableWidgetItem('%.3f'%ndot))
+        if mc is None :
+            self.tableInfo.setItem(4,1, QtWidgets.QTableWidgetItem('-'))
+        else :
+            self.tableInfo.setItem(4,1, QtWidgets.QTableWidgetItem('%.3f - %.3f %%'%((1 - mc['err_min'][-1])*100, (1 - mc['err_min'][0])*100)))
     
     def update_offres_radio(self) :
         
@@ -347,12 +994,13 @@ class MainWindow(QtWidgets.QMainWindow):
            
         self.graphWidget.setBackground(None)
                 
-        self.graphWidget.plot([self.NU_C_LIST[0]/KHZ, self.NU_C_LIST[-1]/KHZ], [1e-2, 1e-2], pen=pg.mkPen('#666666', width=1, style=QtCore.Qt.DashLine))
-        self.graphWidget.plot([self.NU_C_LIST[0]/KHZ, self.NU_C_LIST[-1]/KHZ], [1e-4, 1e-4], pen=pg.mkPen('#666666', width=1, style=QtCore.Qt.DashLine))
+        self.graphWidget.addItem(pg.InfiniteLine(pos = np.log10(1e-2), angle = 0, pen=pg.mkPen('#666666', width=1, style=QtCore.Qt.DashLine)))
+        self.graphWidget.addItem(pg.InfiniteLine(pos = np.log10(1e-4), angle = 0, pen=pg.mkPen('#666666', width=1, style=QtCore.Qt.DashLine)))
         
         self.traces[0].curves = [self.graphWidget.plot([0], [0], pen=pen) for pen in self.get_pens(COLORS[0])]
         self.traces[0].errors = [[0], [0], [0], [0], [0], [0], [0]]
         self.traces[0].point = self.graphWidget.plot([0], [1], pen= pg.mkPen(None), brush = 'k', symbol = 'o')
+        self.traces[0].band = self.init_band(COLORS[0])
         
         self.graphWidget.plot([300], [2e-1])
         self.graphWidget.plot([300], [1e-5])
@@ -361,84 +1009,169 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.graphWidget.setLabel('left', 'Infidelity')
         self.graphWidget.setLabel('bottom', 'COM Frequency', 'KHZ')
-        self.graphWidget.setXRange(100, 520, padding=0)
+        self.set_nu_range()
         self.graphWidget.setYRange(-5, -1, padding=0.02)
         
     
+    def set_nu_range(self) :
+        settings = self.nu_grid_settings
+        self.graphWidget.setXRange(settings['nu_min'], settings['nu_max'] + 0.05*(settings['nu_max'] - settings['nu_min']), padding=0)
+    
+    def edit_nu_grid_settings(self) :
+        dialog = NuGridDialog(self.nu_grid_settings, self)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted :
+            self.nu_grid_settings = dialog.settings()
+            self.set_nu_range()
+            self.update_graph()
+    
+    def edit_noise_spectrum(self) :
+        dialog = NoiseSpectrumDialog(self.noise_spectrum, self)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted :
+            settings = dialog.settings()
+            if settings is not None :
+                try :
+                    filterfunction.load_spectrum(settings['path'])
+                except (OSError, ValueError) as e :
+                    QtWidgets.QMessageBox.warning(self, 'Magnetic Noise Spectrum', 'Cannot load the spectrum : %s'%e)
+                    return
+            self.noise_spectrum = settings
+            self.update_graph()
+    
+    def init_band(self, color) :
+        # Translucent area between two invisible curves, for the Monte Carlo bands
+        low = self.graphWidget.plot([300], [1], pen = pg.mkPen(None))
+        high = self.graphWidget.plot([300], [1], pen = pg.mkPen(None))
+        brush = pg.mkColor(color)
+        brush.setAlpha(50)
+        self.graphWidget.addItem(pg.FillBetweenItem(low, high, brush = brush))
+        return low, high
+    
+    def edit_montecarlo_settings(self) :
+        dialog = MonteCarloDialog(self.montecarlo_settings, self)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted :
+            self.montecarlo_settings = dialog.settings()
+            self.actionMonteCarlo.setChecked(True)
+            self.update_graph()
+    
+    def show_error_budget(self) :
+        # Ranked error channels and parameter sensitivities at the optimum of the
+        # current state
+        state = self.get_state()
+        display = evaluate.get_display(state)
+        result = sensitivity.sensitivity(evaluate.state_to_params(state), nugrid.uniform(self.nu_grid_settings),
+                                         display['include_offres'] and display['show_offres'])
+        
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle('Error Budget')
+        text = QtWidgets.QPlainTextEdit(sensitivity.format_budget(result), dialog)
+        text.setReadOnly(True)
+        text.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        layout = QtWidgets.QVBoxLayout(dialog)
+        layout.addWidget(text)
+        dialog.resize(460, 420)
+        dialog.show()
+    
+    def fit_measurements(self) :
+        # Fit the enabled noise parameters to measured infidelities, starting from
+        # the current state, and move the sliders to the result
+        filenames = QtWidgets.QFileDialog.getOpenFileNames(self, 'Fit to Measurements', '', '*.csv *.txt *.dat')[0]
+        if not filenames :
+            return
+        
+        state = self.get_state()
+        try :
+            result = calibration.fit_state(state, calibration.load_measurements(filenames))
+        except (OSError, ValueError) as e :
+            QtWidgets.QMessageBox.warning(self, 'Fit to Measurements', 'Cannot fit the measurements : %s'%e)
+            return
+        self.load_presets(calibration.fitted_preset(state, result))
+        
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle('Fit to Measurements')
+        text = QtWidgets.QPlainTextEdit(calibration.format_result(result), dialog)
+        text.setReadOnly(True)
+        text.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        layout = QtWidgets.QVBoxLayout(dialog)
+        layout.addWidget(text)
+        dialog.resize(460, 240)
+        dialog.show()
+    
+    def get_state(self) :
+        # Preset dictionary of the current GUI state, extended with the plot options
+        state = self.save_presets()
+        state['display'] = {"show_offres" : self.radioBtnShowOffRes.isChecked(),
+                            "include_offres" : self.radioBtnIncludeOffErr.isChecked(),
+                            "pulse_shaping" : self.radioBtnPulseShaping.isChecked(),
+                            "optimize" : self.radioBtnOptFid.isChecked(),
+                            "fix_nu" : self.sliderFixNu.value(),
+                            "montecarlo" : self.montecarlo_settings if self.actionMonteCarlo.isChecked() else None,
+                            "nu_grid" : self.nu_grid_settings}
+        return state
+    
     def update_graph(self) :
-        
-        architecture = self.comboBoxArchitecture.currentIndex()
-        if self.comboBoxVNoise.currentIndex() == CBOX_VNOISE_ID_CORR :
-            if architecture is CBOX_ARCH_ID_CHIP :
-                g_factor = em.G_FACTOR_CHIP
-            if architecture is CBOX_ARCH_ID_MACRO :
-                g_factor = em.G_FACTOR_MACRO
-        else :
-            g_factor = 0
+        # Schedule a recomputation. Requests arriving within the debounce interval
+        # are coalesced into a single evaluation of the newest GUI state.
+        self.update_timer.start()
+        self.heatmapTab.update_map()
+        
+    def start_update(self) :
+        # Evaluate the current GUI state in the worker thread, unless it is cached.
+        # If an evaluation is already running, only remember that a newer state is
+        # waiting.
+        if self.update_running :
+            self.update_pending = True
+            return
+        
+        self.update_pending = False
+        state = self.get_state()
+        key = self.result_cache.key(state, None)
+        
+        result = self.result_cache.get(key)
+        if result is not None :
+            self.apply_result(self.active_trace, result)
+            return
+        
+        self.update_running = True
+        self.update_job += 1
+        self.update_started = time.perf_counter()
+        
+        worker = ModelWorker(self.update_job, self.active_trace, key, state, None,
+                             self.traces[self.active_trace].graph)
+        worker.signals.finished.connect(self.finish_update)
+        self.thread_pool.start(worker)
+        
+    def finish_update(self, job_id, trace_id, key, result) :
+        # Cache and display the result of a worker evaluation, then start the next
+        # one if the GUI state changed in the meantime
+        self.update_running = False
+        
+        if result is not None :
+            self.result_cache.put(key, result)
+            self.apply_result(trace_id, result)
             
-        vib_mode = self.comboBoxVibMode.currentIndex()
-        include_amp_noise = self.radioBtnAmpNoise.isChecked()
-        include_ccw_noise = self.radioBtnCCWNoise.isChecked()
-        include_symfluc_noise = self.radioBtnSymFluc.isChecked()
-        
-        show_offres = self.radioBtnShowOffRes.isChecked()
-        inc_offres_err = self.radioBtnIncludeOffErr.isChecked()
-        pulse_shaping = self.radioBtnPulseShaping.isChecked() and show_offres
-        
-        dzB = self.sliderGradient.value()
-        Om = self.sliderPower.value()* KHZ
-        nuSE = 10**(self.sliderENoise.value()/10)
-        SBa = 10**(self.sliderBAmbient.value()/10)
-        SV = 10**(self.sliderVNoise.value()/10)
-        NuXY = self.sliderNuXY.value()/10*MHZ
-        nbar = 10**(self.sliderNbar.value()/10)
-        
-        if include_amp_noise :
-            chi = 10**(self.sliderChi.value()/10)
-        else : chi = 0
-        
-        if include_ccw_noise :
-            SA = 10**(self.sliderSA.value()/10)
-        else : SA = 0
-        
-        if include_symfluc_noise :
-            sym_fluc = 2*np.pi* self.sliderSymFluc.value()
-        else : sym_fluc = 0
-        
-        err_h, err_d, err_t, err_o, err_a = em.compute_total_errors(self.NU_C_LIST, Om, dzB, nuSE, SBa, SV, NuXY, 
-                                                pulse_shaping = pulse_shaping, g_factor = g_factor, 
-                                                vib_mode = vib_mode, chi = chi, dx = 1e-9, SA = SA,
-                                                nbar = nbar, sym_fluc = sym_fluc)
-        err_tot = err_h + err_d + err_t + err_a 
-        
-        if inc_offres_err and show_offres: err_tot += err_o
-        elif not show_offres : err_o = [0]*len(err_o)  
-       
-        if self.radioBtnOptFid.isChecked() : 
-            err_min, nu_min = em.optimizeFidelity(self.NU_C_LIST, err_tot)
-        else :
-            interp_func = interp1d(self.NU_C_LIST, err_tot, kind='linear')
-            nu_min = self.sliderFixNu.value()*KHZ
-            err_min = interp_func(nu_min)
-       
-        tgate = em.compute_tgate(nu_min, dzB, Om)
-        
-        if vib_mode is em.VIB_MODE_AXIAL_STR :
-            ndot = em.ndot_STR(nu_min, nu_min*np.sqrt(3), em.DIST_ELECTRODE, nuSE)
-            tgate = em.compute_tgate(nu_min*np.sqrt(3), dzB, Om)
-        elif vib_mode is em.VIB_MODE_AXIAL_COM :
-            ndot = em.ndot_COM(nu_min, nuSE)
-            tgate = em.compute_tgate(nu_min, dzB, Om)
+            if profiling.is_enabled() :
+                profiling.record('update', time.perf_counter() - self.update_started)
             
-            
-        self.update_table(err_min, nu_min, tgate, ndot)
-        
-        #self.opt_point.setData([nu_min/KHZ], [err_min])
-        
-        self.traces[self.active_trace].updateTable(tgate = tgate, numin = nu_min, errmin = err_min, ndot = ndot)
-        self.traces[self.active_trace].updateErrors([err_h, err_d, err_t, err_o, err_a, err_tot])
-        self.traces[self.active_trace].plotTrace()
+            if DEBUG_GRAPH :
+                self.statusbar.showMessage(self.traces[trace_id].graph.describe())
         
+        if self.update_pending :
+            self.start_update()
+            
+    def apply_result(self, trace_id, result) :
+        # Display a result of evaluate.evaluate_state on the given trace
+        err_min, nu_min, tgate, ndot = result['err_min'], result['nu_min'], result['tgate'], result['ndot']
+        
+        if trace_id == self.active_trace :
+            with profiling.stage('table') :
+                self.update_table(err_min, nu_min, tgate, ndot, result['montecarlo'])
+        
+        self.traces[trace_id].updateTable(tgate = tgate, numin = nu_min, errmin = err_min, ndot = ndot)
+        self.traces[trace_id].updateErrors(result['errors'], result['nu_c'])
+        mc = result['montecarlo']
+        self.traces[trace_id].updateBands(None if mc is None else mc['bands'])
+        with profiling.stage('plotting') :
+            self.traces[trace_id].plotTrace()
              
     def init_sliders(self) :
         
@@ -491,10 +1224,7 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.sliderFixNu.valueChanged.connect(lambda : self.update_graph())
         
-        with open(CHIP_PRESET_FILE) as json_file:
-            data = json.load(json_file)
-            
-        self.load_presets(data)
+        self.load_presets(read_preset(CHIP_PRESET_FILE))
         
     def update_sldr_label(self, sldr_id = 0) :
         
@@ -542,10 +1272,18 @@ class MainWindow(QtWidgets.QMainWindow):
 
         
 def main():
+    if '--compile-ui' in sys.argv :
+        compile_ui()
+        return
+    
     app = QtWidgets.QApplication(sys.argv)
     main = MainWindow()
     main.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    main.thread_pool.waitForDone()
+    main.paretoTab.thread_pool.waitForDone()
+    main.heatmapTab.thread_pool.waitForDone()
+    sys.exit(exit_code)
 
 if __name__ == '__main__':         
     main()
@@ -0,0 +1,172 @@
+import numpy as np
+import errormodel as em
+import nugrid
+
+# Inverse design : the cheapest hardware parameters reaching a target infidelity.
+#
+# The infidelity of a parameter set is its minimum over the COM frequency
+# (em.optimize_fidelity_batch). For one free parameter, feasible_threshold finds
+# the cheapest value reaching the target : a coarse scan from the cheap end of
+# the bounds brackets the first feasible value, which is then refined by
+# bisection. Every step is a single vectorized model call, over all the
+# problems when the other parameters are arrays.
+#
+# feasible_boundary solves the threshold of one parameter over a grid of the
+# others, and cheapest minimizes a cost function along that boundary.
+
+NU_C_LIST = nugrid.uniform()
+
+# End of the range which is cheapest to build : weak gradients and low powers,
+# large noise levels
+CHEAP_END = {"dzB" : 'low', "Om" : 'low', "nu_XY" : 'low', "g_factor" : 'high',
+             "nuSE" : 'high', "SBa" : 'high', "SV" : 'high', "chi" : 'high', "SA" : 'high',
+             "nbar" : 'high', "sym_fluc" : 'high'}
+
+# Parameters spanning decades, scanned and bisected in log space
+LOG_PARAMS = ('nuSE', 'SBa', 'SV', 'chi', 'SA', 'nbar')
+
+
+def min_infidelity(params, nu_c_list = NU_C_LIST, include_offres = True) :
+    # Minimum infidelity over nu_c_list for every parameter set.
+    # params : keyword arguments of em.compute_total_errors, arrays broadcast
+    # Returns (err_min, nu_opt) with the broadcast shape of the parameters
+    nu_c_list = np.asarray(nu_c_list, dtype = float)
+    grid_params = {name : np.asarray(value)[..., None] if name not in em.OPTION_PARAMS else value
+                   for name, value in params.items()}
+    errors = em.compute_total_errors(nu_c_list, **grid_params)
+    err_tot = errors[0] + errors[1] + errors[2] + errors[4]
+    if include_offres :
+        err_tot = err_tot + errors[3]
+    return em.optimize_fidelity_batch(nu_c_list, err_tot, nu_c_list[0], nu_c_list[-1])
+
+def _to_axis(name, values) :
+    return np.log10(values) if name in LOG_PARAMS else np.asarray(values, dtype = float)
+
+def _from_axis(name, x) :
+    return 10**x if name in LOG_PARAMS else x
+
+def feasible_threshold(name, target, bounds, params, cheap = None, nu_c_list = NU_C_LIST,
+                       include_offres = True, scan_points = 16, iterations = 40) :
+    # Cheapest value of parameter name within bounds for which the minimum
+    # infidelity is at most target.
+    # bounds : (low, high), in compute_total_errors units
+    # params : the other parameters, arrays broadcast and give independent problems
+    # cheap : 'low' or 'high', the cheap end of the bounds, default CHEAP_END[name]
+    # scan_points : number of points of the bracketing scan. Feasible intervals
+    #               narrower than a scan step may be missed if the infidelity is
+    #               not monotonic in the parameter.
+    # iterations : bisection steps, each halving the bracket
+    # Returns the threshold, with the broadcast shape of params, nan where no
+    # scanned value reaches the target.
+    cheap = CHEAP_END.get(name, 'low') if cheap is None else cheap
+    if cheap not in ('low', 'high') :
+        raise ValueError("cheap must be 'low' or 'high', not %r"%cheap)
+    if name in params :
+        raise ValueError("Free parameter '%s' must not be given in params"%name)
+
+    shape = np.broadcast_shapes(*[np.shape(value) for key, value in params.items() if key not in em.OPTION_PARAMS])
+    params = {key : (np.broadcast_to(value, shape) if key not in em.OPTION_PARAMS else value)
+              for key, value in params.items()}
+
+    def feasible(x) :
+        # x : axis values broadcasting with (..., *shape)
+        values = _from_axis(name, x)
+        scan_params = {key : value for key, value in params.items()}
+        scan_params[name] = values
+        err_min, _ = min_infidelity(scan_params, nu_c_list, include_offres)
+        return err_min <= target
+
+    # Scan from the cheap end
+    ends = _to_axis(name, bounds)
+    if cheap == 'high' :
+        ends = ends[::-1]
+    scan = np.linspace(ends[0], ends[1], scan_points)
+    ok = feasible(scan.reshape((-1,) + (1,)*len(shape)))
+
+    found = ok.any(axis = 0)
+    first = np.argmax(ok, axis = 0)
+
+    # Bisect between the last infeasible and the first feasible scanned values.
+    # Problems feasible at the cheap end need no refinement.
+    bad = scan[np.maximum(first - 1, 0)]
+    good = scan[first]
+    refine = found & (first > 0)
+    if np.any(refine) :
+        for _ in range(iterations) :
+            mid = (bad + good)/2
+            ok = feasible(mid)
+            good = np.where(refine & ok, mid, good)
+            bad = np.where(refine & ~ok, mid, bad)
+
+    return np.where(found, _from_axis(name, good), np.nan)
+
+def feasible_boundary(free, target, params, nu_c_list = NU_C_LIST, include_offres = True,
+                      points = 50, **kwargs) :
+    # Boundary of the feasible region of several free parameters.
+    # free : dict {name : (low, high)}, in order. The threshold of the last
+    #        parameter is solved over a grid of points values of the others.
+    # kwargs : passed to feasible_threshold (cheap, scan_points, iterations)
+    # Returns (axes, threshold) : axes maps the grid parameters to their values,
+    # threshold has shape (points,)*(len(free) - 1) plus the shape of params.
+    names = list(free)
+    solved = names[-1]
+    axes = {}
+    grid_params = dict(params)
+    for n, name in enumerate(names[:-1]) :
+        low, high = _to_axis(name, free[name])
+        axes[name] = _from_axis(name, np.linspace(low, high, points))
+        # Grid axes lead, the shape of the parameters follows
+        grid_shape = [1]*(len(names) - 1)
+        grid_shape[n] = points
+        grid_params[name] = axes[name].reshape(grid_shape + [1]*_params_ndim(params))
+
+    threshold = feasible_threshold(solved, target, free[solved], grid_params, nu_c_list = nu_c_list,
+                                   include_offres = include_offres, **kwargs)
+    return axes, threshold
+
+def _params_ndim(params) :
+    return max([np.ndim(value) for name, value in params.items() if name not in em.OPTION_PARAMS] + [0])
+
+def cheapest(free, target, cost, params, nu_c_list = NU_C_LIST, include_offres = True,
+             points = 50, refine = 3, **kwargs) :
+    # Cheapest point of the feasible region under a cost function.
+    # free : dict {name : (low, high)} of free parameters (scalar params only)
+    # cost : function of the free parameters as keyword arguments, vectorized,
+    #        e.g. lambda dzB, Om : dzB/100 + Om/(100*em.KHZ)
+    # refine : number of times the grid is narrowed around the best point
+    # Assuming the cost does not decrease towards the expensive end of the last
+    # free parameter, the cheapest point lies on the feasible boundary, which is
+    # searched on a grid of the other parameters.
+    # Returns a dict {"cost", "err_min", name : value for each free parameter},
+    # None if no point of the bounds reaches the target.
+    names = list(free)
+    bounds = dict(free)
+    best = None
+    for _ in range(refine + 1) :
+        axes, threshold = feasible_boundary(bounds, target, params, nu_c_list, include_offres, points, **kwargs)
+        grids = np.meshgrid(*[axes[name] for name in names[:-1]], indexing = 'ij')
+        values = dict(zip(names[:-1], grids))
+        values[names[-1]] = threshold
+        with np.errstate(invalid = 'ignore') :
+            costs = np.where(np.isnan(threshold), np.inf, cost(**values))
+        if not np.isfinite(costs).any() :
+            break
+
+        index = np.unravel_index(np.argmin(costs), costs.shape)
+        if best is None or costs[index] <= best['cost'] :
+            best = {name : float(values[name][index]) for name in names}
+            best['cost'] = float(costs[index])
+
+        # Narrow the grid to the neighbouring cells of the best point
+        for name, i in zip(names[:-1], index) :
+            axis = _to_axis(name, axes[name])
+            low, high = axis[max(i - 1, 0)], axis[min(i + 1, len(axis) - 1)]
+            bounds[name] = tuple(_from_axis(name, np.array([low, high])))
+        if len(names) == 1 :
+            break
+
+    if best is not None :
+        point = dict(params)
+        point.update({name : best[name] for name in names})
+        best['err_min'] = float(min_infidelity(point, nu_c_list, include_offres)[0])
+    return best
@@ -0,0 +1,160 @@
+import numpy as np
+import errormodel as em
+
+# Monte Carlo propagation of the uncertainty of the noise parameters to the
+# infidelity. Noise parameters are sampled from the distributions of a spec :
+#
+#   {"nuSE" : {"dist" : "lognormal", "sigma" : 0.5},
+#    "SBa" : {"dist" : "uniform", "low" : 1e-24, "high" : 1e-22}, ...}
+#
+# lognormal : log10 of the parameter is normally distributed around log10 of the
+#             nominal value, with standard deviation sigma (in decades)
+# uniform : the parameter is uniformly distributed in [low, high], or, given a
+#           width in decades instead, in [nominal/10**width, nominal*10**width]
+#
+# Parameters not in the spec keep their nominal value. Every sample is optimized
+# over the COM frequencies, the distribution of the minimum infidelity and of the
+# optimal COM frequency is returned, and optionally quantile bands of the total
+# infidelity at every COM frequency.
+
+UNCERTAIN_PARAMS = ('nuSE', 'SBa', 'SV', 'chi', 'SA', 'nbar')
+
+DISTRIBUTIONS = ('lognormal', 'uniform')
+
+# Half a decade of uncertainty on every noise parameter
+DEFAULT_SPEC = {name : {"dist" : "lognormal", "sigma" : 0.5} for name in UNCERTAIN_PARAMS}
+
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+
+# Number of (sample, COM frequency) evaluations held in memory at once
+CHUNK_EVALUATIONS = 2**21
+
+
+def sample_params(params, spec, n_samples, seed = None) :
+    # Draw n_samples values of the parameters of spec around the nominal params
+    # (keyword arguments of em.compute_total_errors).
+    # Returns a dict mapping each sampled parameter to an array of shape (n_samples,)
+    rng = np.random.default_rng(seed)
+    samples = {}
+    # Parameters are drawn in a fixed order, so that a seed gives the same samples
+    # whatever the order of spec
+    for name in sorted(spec) :
+        if name not in UNCERTAIN_PARAMS :
+            raise ValueError("Unknown uncertain parameter '%s'"%name)
+        dist = spec[name]
+        if dist['dist'] == 'lognormal' :
+            nominal = params[name]
+            if nominal == 0 :
+                # A disabled noise source stays disabled
+                samples[name] = np.zeros(n_samples)
+            else :
+                samples[name] = nominal * 10**(dist['sigma'] * rng.standard_normal(n_samples))
+        elif dist['dist'] == 'uniform' :
+            if 'width' in dist :
+                low, high = params[name] * 10**-dist['width'], params[name] * 10**dist['width']
+            else :
+                low, high = dist['low'], dist['high']
+            samples[name] = rng.uniform(low, high, n_samples)
+        else :
+            raise ValueError("Unknown distribution '%s', expected one of %s"%(dist['dist'], ', '.join(DISTRIBUTIONS)))
+    return samples
+
+def evaluate_samples(start, stop, samples, params, nu_c_list, include_offres = True) :
+    # Total infidelity of samples [start, stop) over the COM frequencies
+    # Returns an array of shape (stop - start, len(nu_c_list))
+    sample_params = dict(params)
+    for name, values in samples.items() :
+        sample_params[name] = values[start:stop, None]
+
+    nu_c_list = np.asarray(nu_c_list)
+    errors = em.compute_total_errors(nu_c_list[None, :], **sample_params)
+    err_tot = errors[0] + errors[1] + errors[2] + errors[4]
+    if include_offres :
+        err_tot = err_tot + errors[3]
+    return np.broadcast_to(err_tot, (stop - start, len(nu_c_list)))
+
+def _chunk_bounds(n_samples, chunk_size) :
+    return [(start, min(start + chunk_size, n_samples)) for start in range(0, n_samples, chunk_size)]
+
+def _run_chunk(n, samples, params, nu_c_list, include_offres, quantiles, nu_min, nu_max) :
+    # Optimize the n samples of a chunk, keeping their curves only when bands are needed
+    # samples : values of the sampled parameters of the chunk only, so that only
+    #           those are sent to a worker process
+    err_tot = evaluate_samples(0, n, samples, params, nu_c_list, include_offres)
+    err_min, nu_opt = em.optimize_fidelity_batch(nu_c_list, err_tot, nu_min, nu_max)
+    return err_min, nu_opt, (err_tot if quantiles is not None else None)
+
+
+class MonteCarloResult :
+    # samples : dict of the sampled parameter values, arrays of shape (n_samples,)
+    # err_min, nu_opt : minimum infidelity and optimal COM frequency of every sample
+    # nu_c_list : COM frequencies of the bands
+    # quantiles, bands : quantiles of the total infidelity at every COM frequency,
+    #                    bands has shape (len(quantiles), len(nu_c_list)), None if
+    #                    no quantiles were requested
+
+    def __init__(self, samples, err_min, nu_opt, nu_c_list, quantiles, bands) :
+        self.samples = samples
+        self.err_min = err_min
+        self.nu_opt = nu_opt
+        self.nu_c_list = nu_c_list
+        self.quantiles = quantiles
+        self.bands = bands
+
+    def __repr__(self) :
+        return 'MonteCarloResult(%d samples)'%len(self.err_min)
+
+    def summary(self, quantiles = DEFAULT_QUANTILES) :
+        # Quantiles of the minimum infidelity and of the optimal COM frequency
+        return {"quantiles" : tuple(quantiles),
+                "err_min" : np.nanquantile(self.err_min, quantiles),
+                "nu_opt" : np.nanquantile(self.nu_opt, quantiles)}
+
+
+def monte_carlo(nu_c_list, params, spec = DEFAULT_SPEC, n_samples = 10000, seed = None,
+                quantiles = DEFAULT_QUANTILES, include_offres = True, chunk_size = None, workers = None,
+                nu_min = em.NU_OPT_MIN, nu_max = em.NU_OPT_MAX) :
+    # Propagate the uncertainty of the noise parameters to the infidelity.
+    # nu_c_list : COM frequencies over which every sample is optimized
+    # params : nominal keyword arguments of em.compute_total_errors (scalars)
+    # spec : distributions of the uncertain parameters, see the top of this module
+    # seed : seed of the random samples, a fixed seed gives reproducible results
+    # quantiles : quantiles of the bands of total infidelity, None to skip the
+    #             bands (the curves of all samples are then not kept in memory)
+    # include_offres : add the off-resonant error to the total infidelity
+    # chunk_size : number of samples evaluated at once
+    # workers : number of worker processes. None or 1 evaluates in this process.
+    # nu_min, nu_max : range of COM frequencies searched for the optimum of every
+    #                  sample, that of the displayed grid (see nugrid.optimize)
+    # Returns a MonteCarloResult
+    nu_c_list = np.asarray(nu_c_list, dtype = float)
+    samples = sample_params(params, spec, n_samples, seed)
+
+    if chunk_size is None :
+        chunk_size = max(1, CHUNK_EVALUATIONS//len(nu_c_list))
+    chunks = _chunk_bounds(n_samples, chunk_size)
+    task = (params, nu_c_list, include_offres, quantiles, nu_min, nu_max)
+
+    def chunk_samples(start, stop) :
+        return {name : values[start:stop] for name, values in samples.items()}
+
+    if workers is None or workers <= 1 :
+        results = [_run_chunk(stop - start, chunk_samples(start, stop), *task) for start, stop in chunks]
+    else :
+        # The process pool machinery is only imported when it is used
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers = workers) as pool :
+            futures = [pool.submit(_run_chunk, stop - start, chunk_samples(start, stop), *task)
+                       for start, stop in chunks]
+            results = [future.result() for future in futures]
+
+    err_min = np.concatenate([r[0] for r in results]) if results else np.empty(0)
+    nu_opt = np.concatenate([r[1] for r in results]) if results else np.empty(0)
+
+    bands = None
+    if quantiles is not None and results :
+        curves = np.concatenate([r[2] for r in results])
+        with np.errstate(invalid = 'ignore') :
+            bands = np.quantile(curves, quantiles, axis = 0)
+
+    return MonteCarloResult(samples, err_min, nu_opt, nu_c_list, quantiles, bands)
@@ -0,0 +1,319 @@
+import functools
+
+import numpy as np
+import errormodel as em
+
+# Simulation of the two-ion Molmer-Sorensen gate driven by microwaves in a static
+# magnetic field gradient, used to tabulate the off-resonant errors with pulse
+# shaping (em.err_offres_ps).
+#
+# In the frame of the qubits and of the gate mode (frequency nu), to first order
+# in the Lamb-Dicke parameter eta, the bichromatic drive at the qubit frequency
+# +- mu, mu = nu - delta, gives
+#   H(t) = Om g(t) cos(mu t) sum_j [sigma_x^j + eta s_j sigma_y^j i(a^+ e^(i nu t) - a e^(-i nu t))]
+# where s_j = +-1 is the mode vector of ion j (s = (1, 1) for COM modes, (-1, 1)
+# for STR modes) and g the pulse envelope. Nothing is dropped : the first term is
+# the carrier driven off-resonantly, the second term keeps the counter-rotating
+# sidebands at nu + mu.
+#
+# The envelope is flat with sin^2 ramps of a fraction `ramp` of the gate time at
+# both ends, ramp = 0 is a square pulse (no pulse shaping). For every envelope the
+# detuning delta closes the phase space loop and the gate time T gives the phase
+# of a maximally entangling gate exp(-i pi/8 S_y^2) in the resonant part of H,
+# both from a calibration in units of T which only depends on the envelope. For
+# a square pulse T = pi/(eta Om), as em.compute_tgate without GATE_TIME_COST.
+#
+# The Schrodinger equation is integrated with RK4 in units of T for a batch of
+# gates at once, the state of the batch is an array (spin, Fock state, batch).
+# The infidelity is that of the Bell state prepared from |down, down> |n = 0>,
+# the motion traced out.
+#
+#   infid = msgate.simulate(Om, dzB, nu_c)                    # arrays broadcast
+#   om, dzB, nu, infid = msgate.simulate_table(om, dzB, nu, workers = 8)
+#   msgate.save_table('offres.npy', om, dzB, nu, infid)   # em.load_offres_table
+#
+# Validation : for a square pulse the off-resonant carrier rotates every ion by
+# phi = (Om/mu) sin(mu T) about x, an error 2 phi^2 (square_pulse_error). The
+# simulated square pulse infidelity agrees with it to within (Om/mu)^2 of its
+# envelope 2 (Om/mu)^2 : 0.5 % at Om/mu = 0.09, 1.2 % at 0.15 and 5 % at 0.29
+# (Om = 30 - 150 kHz, nu_c = 150 - 400 kHz, dzB = 50 - 200 T/m, axial STR
+# mode), the counter-rotating sidebands and the integration adding less than
+# 0.1 %. With mu close to nu_s = sqrt(3) nu_c, the error averaged over the
+# phase mu T is (Om/nu_c)^2/3 and at most 2/3 (Om/nu_c)^2 : em.error_offres,
+# (Om/nu_c)^2, is a conservative envelope, 3 times the simulated average and
+# 1.5 times its maximum.
+#
+# There is no analytic limit for shaped pulses. Their simulated errors are
+# below those of the default table em.err_offres_ps has shipped with since 1.0,
+# whose simulation settings are not recorded : a median ratio of 0.09 over
+# Om = 30 - 90 kHz, nu_c = 150 - 350 kHz, dzB = 50 - 150 T/m, down to 1/130
+# (3.6e-4 against 4.8e-2 at Om = 60 kHz, nu_c = 200 kHz, dzB = 150 T/m). The
+# tables of this module are therefore not validated against the default one,
+# default_table_ratio() reports the ratio and the offres command prints it.
+
+RAMP = 0.1 # Fraction of the gate time of each ramp of the shaped pulse
+N_FOCK = 10 # Number of Fock states of the gate mode
+STEPS_PER_PERIOD = 12 # RK4 steps per period of the fastest term, at nu + mu
+BATCH_SIZE = 256 # Gates integrated at once
+
+# Points of the calibration integrals over the gate
+CALIBRATION_POINTS = 20001
+
+# Two-ion spin operators, basis |s1 s2> with index 2 s1 + s2, 0 = down
+_SX = np.array([[0, 1], [1, 0]], dtype = complex)
+_SY = np.array([[0, -1j], [1j, 0]], dtype = complex)
+_I2 = np.eye(2)
+SIGMA_X = np.kron(_SX, _I2) + np.kron(_I2, _SX)
+
+def spin_y(vib_mode) :
+    # Collective spin sum_j s_j sigma_y^j coupling to the gate mode
+    if vib_mode in (em.VIB_MODE_AXIAL_COM, em.VIB_MODE_RADIAL_COM) :
+        return np.kron(_SY, _I2) + np.kron(_I2, _SY)
+    return - np.kron(_SY, _I2) + np.kron(_I2, _SY)
+
+
+# ------------------------------------------
+# Pulse envelope and calibration
+# ------------------------------------------
+
+def envelope(tau, ramp = RAMP) :
+    # Pulse envelope at times tau in units of the gate time
+    tau = np.asarray(tau, dtype = float)
+    if ramp <= 0 :
+        return np.ones_like(tau)
+    rise = np.sin(np.pi/2 * np.clip(tau/ramp, 0, 1))**2
+    fall = np.sin(np.pi/2 * np.clip((1 - tau)/ramp, 0, 1))**2
+    return rise * fall
+
+def _integral(f, tau) :
+    # Trapezoidal integral over the last axis
+    return np.sum((f[..., 1:] + f[..., :-1])/2 * np.diff(tau), axis = -1)
+
+def _loop(d, tau, g) :
+    # Real part of the spin dependent displacement at the end of the gate, up to
+    # the phase e^(i d/2) (the envelope is symmetric), for detunings d in units of 1/T
+    return _integral(g * np.cos(np.multiply.outer(d, tau - 0.5)), tau)
+
+def _phase(d, tau, g) :
+    # Geometric phase P of the resonant part per unit squared coupling, in units of T :
+    # phase = - int_0^1 dt1 int_0^t1 dt2 g(t1) g(t2) sin(d (t1 - t2))
+    dt = np.diff(tau)
+    def cumulative(f) :
+        return np.concatenate([[0], np.cumsum((f[1:] + f[:-1])/2 * dt)])
+    C = cumulative(g * np.cos(d * tau))
+    S = cumulative(g * np.sin(d * tau))
+    return - _integral(g * (np.sin(d * tau) * C - np.cos(d * tau) * S), tau)
+
+@functools.lru_cache(maxsize = None)
+def calibrate(ramp = RAMP, loops = 1) :
+    # Detuning d and coupling A = eta Om T/2 of a gate with the given envelope, in
+    # units of the gate time T, closing `loops` loops in phase space and giving
+    # the phase of exp(-i pi/8 S_y^2). Returns (d, A, phase).
+    tau = np.linspace(0, 1, CALIBRATION_POINTS)
+    g = envelope(tau, ramp)
+
+    # The loop closes at the zeros of _loop, the loops-th zero is bracketed on a
+    # grid and refined by bisection
+    grid = np.linspace(np.pi, 2*np.pi*(loops + 1)/(1 - 2*min(ramp, 0.49)), 400)
+    values = _loop(grid, tau, g)
+    crossings = np.flatnonzero(np.sign(values[1:]) != np.sign(values[:-1]))
+    if len(crossings) < loops :
+        raise ValueError('No closed loop found for ramp %g'%ramp)
+    low, high = grid[crossings[loops - 1]], grid[crossings[loops - 1] + 1]
+    for _ in range(60) :
+        mid = (low + high)/2
+        if np.sign(_loop(mid, tau, g)) == np.sign(_loop(low, tau, g)) :
+            low = mid
+        else :
+            high = mid
+    d = (low + high)/2
+
+    P = _phase(d, tau, g)
+    A = np.sqrt(np.pi/8/abs(P))
+    return d, A, A**2 * P
+
+def gate_parameters(Om, dzB, nu_c, nu_XY = None, vib_mode = em.VIB_MODE_AXIAL_STR, ramp = RAMP, loops = 1) :
+    # Gate mode frequency nu, Lamb-Dicke parameter eta, gate time T, detuning delta
+    # and drive detuning mu = nu - delta (rad/s, s), arrays with the broadcast shape
+    # of the arguments
+    d, A, _ = calibrate(ramp, loops)
+    nu = em.compute_mode_frequency(np.asarray(nu_c, dtype = float), nu_XY, vib_mode)
+    eta = em.compute_eta(nu, dzB)
+    T = 2*A/(eta * np.asarray(Om, dtype = float))
+    shape = np.broadcast_shapes(np.shape(nu), np.shape(T))
+    nu, eta, T = [np.broadcast_to(x, shape).astype(float) for x in (nu, eta, T)]
+    delta = d/T
+    return {"nu" : nu, "eta" : eta, "T" : T, "delta" : delta, "mu" : nu - delta}
+
+def target_state(vib_mode = em.VIB_MODE_AXIAL_STR, ramp = RAMP, loops = 1) :
+    # Ideal spin state exp(-i phase S_y^2) |down, down>
+    _, _, phase = calibrate(ramp, loops)
+    Sy = spin_y(vib_mode)
+    w, v = np.linalg.eigh(Sy @ Sy)
+    U = v @ np.diag(np.exp(-1j * phase * w)) @ v.conj().T
+    return U[:, 0]
+
+
+# ------------------------------------------
+# Batched integration
+# ------------------------------------------
+
+def _steps(nu, mu, T, steps_per_period) :
+    # RK4 steps resolving the fastest oscillation, at nu + mu
+    return np.ceil((nu + np.abs(mu)) * T/(2*np.pi) * steps_per_period).astype(int) + 1
+
+# Time steps of which the coefficients of H are computed at once
+COEFFICIENT_BLOCK = 1024
+
+def _integrate(Om, eta, nu, mu, T, vib_mode, ramp, n_fock, n_steps, carrier) :
+    # Final states of a batch of gates, shape (4, n_fock, batch), all arguments
+    # 1-D arrays of the batch but vib_mode, ramp, n_fock and carrier. n_steps is
+    # the number of RK4 steps of every gate (or of all). In units of the gate
+    # time, d psi/d tau = -i T H psi. The batch is the last axis, so that the spin
+    # operators act on all gates and Fock states with a single matrix product.
+    # Gates leave the batch as they complete their steps, so that the cost is
+    # that of their own steps and not of the longest gate.
+    n = len(Om)
+    n_steps = np.broadcast_to(n_steps, (n,)).astype(int)
+    order = np.argsort(n_steps, kind = 'stable')
+    Om, eta, nu, mu, T, n_steps = [np.asarray(x)[order] for x in (Om, eta, nu, mu, T, n_steps)]
+    h = 1/n_steps
+
+    X = -1j * SIGMA_X if carrier else np.zeros((4, 4), dtype = complex)
+    Sy = spin_y(vib_mode)
+    sqrt_n = np.sqrt(np.arange(1, n_fock))[:, None]
+
+    def derivative(psi, c, e, eta) :
+        # c : drive of the carrier and sidebands, e : phase of the mode, shape (batch,)
+        # (a^+ e - a e*) psi
+        moved = np.empty_like(psi)
+        moved[:, 0] = 0
+        moved[:, 1:] = (sqrt_n * e) * psi[:, :-1]
+        moved[:, :-1] -= (sqrt_n * np.conj(e)) * psi[:, 1:]
+        out = (X @ psi.reshape(4, -1)).reshape(psi.shape)
+        out += (Sy @ (moved * eta).reshape(4, -1)).reshape(psi.shape)
+        return out * c
+
+    out = np.empty((4, n_fock, n), dtype = complex)
+    psi = np.zeros((4, n_fock, n), dtype = complex)
+    psi[0, 0] = 1
+    first = 0 # Gates before first are done
+    k = 0
+    while first < n :
+        # Steps up to the next gate to complete, at most COEFFICIENT_BLOCK
+        stop = min(k + COEFFICIENT_BLOCK, n_steps[first])
+        active = slice(first, n)
+        hk = h[active]
+        # Coefficients at the start, middle and end of the steps
+        tau = (np.arange(k, stop)[:, None, None] + np.array([0, 0.5, 1])[:, None]) * hk
+        c = (Om * T)[active] * envelope(tau, ramp) * np.cos(tau * (mu * T)[active])
+        e = np.exp(1j * tau * (nu * T)[active])
+        eta_k = eta[active]
+        for j in range(stop - k) :
+            k1 = derivative(psi, c[j, 0], e[j, 0], eta_k)
+            k2 = derivative(psi + hk/2 * k1, c[j, 1], e[j, 1], eta_k)
+            k3 = derivative(psi + hk/2 * k2, c[j, 1], e[j, 1], eta_k)
+            k4 = derivative(psi + hk * k3, c[j, 2], e[j, 2], eta_k)
+            psi = psi + hk/6 * (k1 + 2*k2 + 2*k3 + k4)
+        k = stop
+
+        # Completed gates leave the batch
+        done = int(np.searchsorted(n_steps, k, side = 'right'))
+        if done > first :
+            out[..., first:done] = psi[..., :done - first]
+            psi = np.ascontiguousarray(psi[..., done - first:])
+            first = done
+
+    result = np.empty_like(out)
+    result[..., order] = out
+    return result
+
+def _simulate_batch(Om, eta, nu, mu, T, vib_mode, ramp, loops, n_fock, steps_per_period, carrier) :
+    psi = _integrate(Om, eta, nu, mu, T, vib_mode, ramp, n_fock, _steps(nu, mu, T, steps_per_period), carrier)
+    overlap = np.einsum('s,snb->nb', target_state(vib_mode, ramp, loops).conj(), psi)
+    # RK4 is not unitary, the norm lost over the gate is an integration error
+    norm = np.sum(np.abs(psi)**2, axis = (0, 1))
+    return 1 - np.sum(np.abs(overlap)**2, axis = 0)/norm
+
+def simulate(Om, dzB, nu_c, nu_XY = None, vib_mode = em.VIB_MODE_AXIAL_STR, pulse_shaping = True,
+             ramp = RAMP, loops = 1, n_fock = N_FOCK, steps_per_period = STEPS_PER_PERIOD,
+             carrier = True, batch_size = BATCH_SIZE, workers = None, progress = None) :
+    # Infidelity of simulated gates.
+    # Om : MS sideband power (rad/s), dzB : gradient (T/m), nu_c : COM frequency (rad/s),
+    # broadcast against each other. nu_XY is only needed for the radial modes.
+    # pulse_shaping : shaped pulse with ramps of `ramp`, otherwise a square pulse
+    # carrier : include the off-resonant carrier term (False leaves the errors of
+    #           the counter-rotating sidebands and of the integration)
+    # workers : number of worker processes, None or 1 integrates in this process
+    # progress : optional callback progress(gates_done, gates_total)
+    # Gates are sorted by their number of RK4 steps and integrated in batches, the
+    # result does not depend on the batches nor on the number of workers.
+    ramp = ramp if pulse_shaping else 0
+    params = gate_parameters(Om, dzB, nu_c, nu_XY, vib_mode, ramp, loops)
+    shape = params['T'].shape
+    Om = np.broadcast_to(np.asarray(Om, dtype = float), shape).reshape(-1)
+    flat = {name : value.reshape(-1) for name, value in params.items()}
+
+    order = np.argsort(_steps(flat['nu'], flat['mu'], flat['T'], steps_per_period), kind = 'stable')
+    batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    tasks = [(Om[b], flat['eta'][b], flat['nu'][b], flat['mu'][b], flat['T'][b], vib_mode, ramp, loops,
+              n_fock, steps_per_period, carrier) for b in batches]
+
+    infid = np.empty(len(order))
+    done = 0
+    if workers is None or workers <= 1 :
+        for b, task in zip(batches, tasks) :
+            infid[b] = _simulate_batch(*task)
+            done += len(b)
+            if progress is not None :
+                progress(done, len(order))
+    else :
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers = workers) as pool :
+            futures = {pool.submit(_simulate_batch, *task) : b for b, task in zip(batches, tasks)}
+            for future in as_completed(futures) :
+                b = futures[future]
+                infid[b] = future.result()
+                done += len(b)
+                if progress is not None :
+                    progress(done, len(order))
+    return infid.reshape(shape)
+
+
+# ------------------------------------------
+# Off-resonant tables
+# ------------------------------------------
+
+def simulate_table(om, dzB, nu, **options) :
+    # Infidelities over the grid of sideband powers om (kHz), gradients dzB (T/m)
+    # and COM frequencies nu (kHz), as em.OffResInterpolator expects them.
+    # options : keyword arguments of simulate
+    # Returns (om, dzB, nu, infid) with infid of shape (len(om), len(dzB), len(nu))
+    om, dzB, nu = [np.sort(np.asarray(x, dtype = float)) for x in (om, dzB, nu)]
+    infid = simulate(om[:, None, None]*em.KHZ, dzB[None, :, None], nu[None, None, :]*em.KHZ, **options)
+    return om, dzB, nu, infid
+
+def square_pulse_error(Om, dzB, nu_c, nu_XY = None, vib_mode = em.VIB_MODE_AXIAL_STR, loops = 1) :
+    # Analytic off-resonant carrier error 2 (Om/mu)^2 sin^2(mu T) of the square
+    # pulse gate simulated by simulate(..., pulse_shaping = False), see the top of
+    # this module for the agreement
+    params = gate_parameters(Om, dzB, nu_c, nu_XY, vib_mode, 0, loops)
+    return 2 * (Om/params['mu'])**2 * np.sin(params['mu'] * params['T'])**2
+
+def default_table_ratio(om, dzB, nu, infid) :
+    # Median ratio of a table (see simulate_table) to the default table of
+    # em.err_offres_ps over the cells within the range of the default table, nan
+    # if none is
+    default = em.get_offres_interpolator(em.OFFRES_DEFAULT)
+    inside = (((om >= default.om[0]) & (om <= default.om[-1]))[:, None, None]
+              & ((dzB >= default.dzB[0]) & (dzB <= default.dzB[-1]))[None, :, None]
+              & ((nu >= default.nu[0]) & (nu <= default.nu[-1]))[None, None, :])
+    if not inside.any() :
+        return np.nan
+    reference = em.err_offres_ps(om[:, None, None]*em.KHZ, dzB[None, :, None], nu[None, None, :]*em.KHZ)
+    return float(np.median((infid/reference)[inside]))
+
+def save_table(path, om, dzB, nu, infid, **meta) :
+    # Write a table loadable by em.load_offres_table (.npy and .json header, see
+    # em.save_offres_table), meta holds the simulation options (JSON serializable)
+    em.save_offres_table(path, om, dzB, nu, infid, **meta)
@@ -0,0 +1,100 @@
+import numpy as np
+import errormodel as em
+
+# Grids of COM frequencies. The infidelity curves are smooth and flat over most of
+# the range, so a uniform grid spends most of its evaluations where nothing
+# happens and under-resolves the minimum. adaptive() starts from a coarse grid
+# and bisects intervals
+#   - next to the current minimum, until they are narrower than the resolution
+#   - where log10 of the total infidelity departs from the chord of its
+#     neighbours by more than the tolerance (high curvature)
+# within a budget of model evaluations. The minimum is then refined by the
+# parabolic vertex of em.optimize_fidelity_batch on the nonuniform grid.
+#
+# Settings (frequencies in kHz) :
+#   nu_min, nu_max : range of COM frequencies, also the range searched for the optimum
+#   adaptive : refine adaptively, otherwise a uniform grid of points
+#   points : number of points of the uniform grid, also used by batched tools
+#            (heatmap, error budget) which evaluate many curves on one grid
+#   coarse : number of points of the initial adaptive grid
+#   tol : curvature tolerance, in decades of infidelity
+#   resolution : width of the intervals around the minimum
+#   max_points : budget of the adaptive grid
+
+DEFAULT_SETTINGS = {"nu_min" : 100, "nu_max" : 500, "adaptive" : True, "points" : 100,
+                    "coarse" : 17, "tol" : 0.01, "resolution" : 0.05, "max_points" : 200}
+
+
+def get_settings(settings = None) :
+    # Settings filled in with DEFAULT_SETTINGS
+    out = dict(DEFAULT_SETTINGS)
+    out.update(settings or {})
+    return out
+
+def uniform(settings = None) :
+    # Uniform grid of the settings, in rad/s
+    settings = get_settings(settings)
+    return np.linspace(settings['nu_min'], settings['nu_max'], settings['points'])*em.KHZ
+
+def _log_total(total) :
+    with np.errstate(divide = 'ignore', invalid = 'ignore') :
+        return np.where(total > 0, np.log10(np.where(total > 0, total, 1)), np.nan)
+
+def _split(nu, total, settings) :
+    # Indices i of the intervals [nu[i], nu[i+1]] to bisect, most important first
+    resolution = settings['resolution']*em.KHZ
+    width = np.diff(nu)
+    candidates = []
+
+    # Around the minimum
+    masked = np.where(np.isfinite(total), total, np.inf)
+    if np.isfinite(masked).any() :
+        i1 = int(np.argmin(masked))
+        candidates += [i for i in (i1 - 1, i1) if 0 <= i < len(width) and width[i] > resolution]
+
+    # Where the curve bends away from its chords
+    y = _log_total(total)
+    t = (nu[1:-1] - nu[:-2])/(nu[2:] - nu[:-2])
+    deviation = np.abs(y[1:-1] - (y[:-2] + t*(y[2:] - y[:-2])))
+    deviation = np.where(np.isfinite(deviation), deviation, 0)
+    for i in np.argsort(-deviation) :
+        if deviation[i] <= settings['tol'] :
+            break
+        # Interior point i + 1 and its two intervals
+        candidates += [j for j in (i, i + 1) if width[j] > resolution]
+
+    # Unique, keeping the order of importance
+    return list(dict.fromkeys(candidates))
+
+def adaptive(model, settings = None) :
+    # Adaptive grid of COM frequencies for one set of curves.
+    # model : function of an array of COM frequencies (rad/s) returning a list of
+    #         arrays (or scalars) over them, the last of which is the total
+    #         infidelity the grid adapts to
+    # Returns (nu, values) : the sorted grid and the list of arrays over it
+    settings = get_settings(settings)
+    if not settings['adaptive'] :
+        nu = uniform(settings)
+        return nu, [em._as_full_array(v, nu.shape) for v in model(nu)]
+
+    nu = np.linspace(settings['nu_min'], settings['nu_max'], settings['coarse'])*em.KHZ
+    values = [em._as_full_array(v, nu.shape) for v in model(nu)]
+    while len(nu) < settings['max_points'] :
+        split = _split(nu, values[-1], settings)[:settings['max_points'] - len(nu)]
+        if not split :
+            break
+        split = np.sort(split)
+        new_nu = (nu[split] + nu[np.asarray(split) + 1])/2
+        new_values = [em._as_full_array(v, new_nu.shape) for v in model(new_nu)]
+
+        # Merge, the midpoints go after the left end of their interval
+        index = np.asarray(split) + 1
+        nu = np.insert(nu, index, new_nu)
+        values = [np.insert(v, index, w) for v, w in zip(values, new_values)]
+    return nu, values
+
+def optimize(nu, total, settings = None) :
+    # Minimum of a curve over the range of the settings, see em.optimize_fidelity_batch
+    settings = get_settings(settings)
+    err_min, nu_opt = em.optimize_fidelity_batch(nu, total, settings['nu_min']*em.KHZ, settings['nu_max']*em.KHZ)
+    return float(err_min), float(nu_opt)
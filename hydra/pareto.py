@@ -0,0 +1,214 @@
+import bisect
+
+import numpy as np
+import errormodel as em
+import nugrid
+
+# Pareto front of competing objectives of the error model, e.g. gate time against
+# infidelity, over a box of parameters. Candidate configurations are sampled in
+# the box, evaluated in batched model calls, and reduced to the non-dominated set
+# (all objectives are minimized).
+
+# Objectives which can be traded off
+OBJECTIVES = ('tgate', 'infidelity', 'heating_rate')
+
+# Parameters which can span the box : the COM frequency and the parameters of
+# em.compute_total_errors
+BOX_PARAMS = ('nu_c', 'dzB', 'Om', 'nuSE', 'SBa', 'SV', 'nu_XY', 'chi', 'SA', 'nbar', 'sym_fluc')
+
+# Default box : the slider ranges of dzB and Om, and the COM frequencies of the
+# default grid settings, see default_box
+DEFAULT_BOX = {"dzB" : (25, 200), "Om" : (25*em.KHZ, 150*em.KHZ),
+               "nu_c" : (nugrid.DEFAULT_SETTINGS['nu_min']*em.KHZ, nugrid.DEFAULT_SETTINGS['nu_max']*em.KHZ)}
+
+# Parameters spanning decades, sampled uniformly in log space
+LOG_PARAMS = ('nuSE', 'SBa', 'SV', 'chi', 'SA', 'nbar')
+
+# Number of candidates evaluated at once
+CHUNK_SIZE = 2**20
+
+
+# ------------------------------------------
+# Non-dominated sort
+# ------------------------------------------
+
+def non_dominated(objectives) :
+    # Mask of the non-dominated rows of objectives, shape (n, m), all minimized.
+    # A row is dominated by another which is no worse in every objective and
+    # differs in at least one. Of rows with identical objectives only the first is
+    # kept. Rows with nan objectives are never kept.
+    #   m = 2 : sort and running minimum, O(n log n), vectorized
+    #   m = 3 : sort and staircase of the front in the other two objectives,
+    #           O(n log n + n * front size) with a fast inner loop
+    #   m > 3 : block-wise comparison with the current front
+    f = np.asarray(objectives, dtype = float)
+    n, m = f.shape
+    keep = np.zeros(n, dtype = bool)
+    valid = np.flatnonzero(~np.isnan(f).any(axis = 1))
+    f = f[valid]
+    if len(f) == 0 :
+        return keep
+
+    # Lexicographic order : a row can only be dominated by rows before it
+    order = np.lexsort(f.T[::-1])
+    fs = f[order]
+
+    if m == 1 :
+        front = np.zeros(len(fs), dtype = bool)
+        front[0] = True
+    elif m == 2 :
+        previous_min = np.concatenate(([np.inf], np.minimum.accumulate(fs[:-1, 1])))
+        front = fs[:, 1] < previous_min
+    elif m == 3 :
+        front = _non_dominated_3d(fs)
+    else :
+        front = _non_dominated_blocks(fs)
+
+    keep[valid[order[front]]] = True
+    return keep
+
+def _non_dominated_3d(fs) :
+    # fs sorted lexicographically. The front seen so far is kept as a staircase in
+    # the last two objectives : second objective increasing, third decreasing.
+    # A row is dominated when the staircase has a point with a smaller or equal
+    # second objective whose third objective is not larger.
+    front = np.zeros(len(fs), dtype = bool)
+    stair_y, stair_z = [], []
+    ys, zs = fs[:, 1].tolist(), fs[:, 2].tolist()
+    for i in range(len(fs)) :
+        y, z = ys[i], zs[i]
+        k = bisect.bisect_right(stair_y, y)
+        if k > 0 and stair_z[k - 1] <= z :
+            continue
+        front[i] = True
+        # Remove the staircase points the new one dominates in (y, z)
+        j = k
+        while j < len(stair_y) and stair_z[j] >= z :
+            j += 1
+        stair_y[k:j] = [y]
+        stair_z[k:j] = [z]
+    return front
+
+def _non_dominated_blocks(fs, block = 1024) :
+    # fs sorted lexicographically. Each block is compared with the front of the
+    # previous blocks, then within itself.
+    front = np.zeros(len(fs), dtype = bool)
+    front_rows = np.empty((0, fs.shape[1]))
+    for start in range(0, len(fs), block) :
+        rows = fs[start:start + block]
+        dominated = np.zeros(len(rows), dtype = bool)
+        if len(front_rows) :
+            dominated = np.all(front_rows[:, None, :] <= rows[None, :, :], axis = -1).any(axis = 0)
+        # Within the block only earlier rows can dominate later ones
+        le = np.all(rows[:, None, :] <= rows[None, :, :], axis = -1)
+        dominated |= np.triu(le, k = 1).any(axis = 0)
+        front[start:start + len(rows)] = ~dominated
+        front_rows = np.concatenate((front_rows, rows[~dominated]))
+    return front
+
+
+# ------------------------------------------
+# Candidates
+# ------------------------------------------
+
+def default_box(nu_grid = None) :
+    # DEFAULT_BOX with the COM frequencies over the range of the nugrid settings nu_grid
+    settings = nugrid.get_settings(nu_grid)
+    return dict(DEFAULT_BOX, nu_c = (settings['nu_min']*em.KHZ, settings['nu_max']*em.KHZ))
+
+def sample_box(box, n_samples, seed = None) :
+    # Uniform random candidates in a box {name : (low, high)}, log-uniform for
+    # LOG_PARAMS. Returns a dict of arrays of shape (n_samples,)
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for name in sorted(box) :
+        if name not in BOX_PARAMS :
+            raise ValueError("Parameter '%s' cannot span the box"%name)
+        low, high = box[name]
+        if name in LOG_PARAMS :
+            samples[name] = 10**rng.uniform(np.log10(low), np.log10(high), n_samples)
+        else :
+            samples[name] = rng.uniform(low, high, n_samples)
+    return samples
+
+def evaluate_objectives(candidates, params, objectives = ('tgate', 'infidelity'), include_offres = True) :
+    # Objectives of the candidates, dict of arrays of shape (n,)
+    # candidates : dict of arrays of shape (n,) of the box parameters
+    # params : the other keyword arguments of em.compute_total_errors, and nu_c if
+    #          it is not a box parameter
+    values = dict(params)
+    values.update(candidates)
+    nu_c = values.pop('nu_c')
+
+    vib_mode = values.get('vib_mode', em.VIB_MODE_AXIAL_STR)
+    nu_mode = em.compute_mode_frequency(nu_c, values['nu_XY'], vib_mode)
+    out = {}
+    if 'infidelity' in objectives :
+        errors = em.compute_total_errors(nu_c, **values)
+        out['infidelity'] = errors[0] + errors[1] + errors[2] + errors[4]
+        if include_offres :
+            out['infidelity'] = out['infidelity'] + errors[3]
+    if 'tgate' in objectives :
+        out['tgate'] = em.compute_tgate(nu_mode, values['dzB'], values['Om'])
+    if 'heating_rate' in objectives :
+        out['heating_rate'] = em.compute_ndot(nu_c, nu_mode, values['nuSE'], vib_mode)
+    n = len(next(iter(candidates.values())))
+    return {name : np.broadcast_to(out[name], (n,)) for name in objectives}
+
+
+class ParetoResult :
+    # params : dict of the box parameters of the front, arrays sorted by the first objective
+    # objectives : dict of the objectives of the front, same order
+    # n_candidates : number of configurations evaluated
+
+    def __init__(self, params, objectives, n_candidates) :
+        self.params = params
+        self.objectives = objectives
+        self.n_candidates = n_candidates
+
+    def __len__(self) :
+        return len(next(iter(self.objectives.values())))
+
+    def __repr__(self) :
+        return 'ParetoResult(%d of %d candidates)'%(len(self), self.n_candidates)
+
+    def point(self, i) :
+        # Box parameters and objectives of the i-th point of the front
+        out = {name : float(values[i]) for name, values in self.params.items()}
+        out.update({name : float(values[i]) for name, values in self.objectives.items()})
+        return out
+
+
+def pareto_front(box, params, objectives = ('tgate', 'infidelity'), n_samples = 10**6, seed = None,
+                 include_offres = True, chunk_size = CHUNK_SIZE) :
+    # Pareto front of the objectives over a box of parameters.
+    # box : {name : (low, high)} of BOX_PARAMS, in compute_total_errors units
+    #       (nu_c in rad/s)
+    # params : values of the other parameters (scalars)
+    # objectives : names in OBJECTIVES, all minimized
+    # n_samples : number of random candidates
+    # Every chunk is reduced to its own front before the fronts are merged, so
+    # that memory does not grow with n_samples.
+    for name in objectives :
+        if name not in OBJECTIVES :
+            raise ValueError("Unknown objective '%s', expected one of %s"%(name, ', '.join(OBJECTIVES)))
+
+    rng = np.random.default_rng(seed)
+    front_params = {name : np.empty(0) for name in box}
+    front_objectives = {name : np.empty(0) for name in objectives}
+    for start in range(0, n_samples, chunk_size) :
+        candidates = sample_box(box, min(chunk_size, n_samples - start), rng)
+        values = evaluate_objectives(candidates, params, objectives, include_offres)
+        keep = non_dominated(np.stack([values[name] for name in objectives], axis = 1))
+        for name in box :
+            front_params[name] = np.concatenate((front_params[name], candidates[name][keep]))
+        for name in objectives :
+            front_objectives[name] = np.concatenate((front_objectives[name], values[name][keep]))
+
+    # Merge the fronts of the chunks
+    stacked = np.stack([front_objectives[name] for name in objectives], axis = 1)
+    keep = np.flatnonzero(non_dominated(stacked))
+    keep = keep[np.argsort(stacked[keep, 0], kind = 'stable')]
+
+    return ParetoResult({name : values[keep] for name, values in front_params.items()},
+                        {name : values[keep] for name, values in front_objectives.items()}, n_samples)
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Timing instrumentation of the hot paths : model evaluation, optimization,
+# interpolation and plotting. Stages are timed with
+#
+#   with profiling.stage('model') :
+#       ...
+#
+# which costs nothing unless profiling is enabled, with HYDRA_PROFILE=1 or
+# enable(). The last MAX_SAMPLES durations of every stage are kept in memory and
+# summarized by stats() and report().
+#
+# cProfile traces are recorded between start_cprofile() and stop_cprofile(path),
+# which saves them in the pstats format read by snakeviz, flameprof or gprof2dot.
+
+ENABLED = bool(os.environ.get('HYDRA_PROFILE'))
+
+# Number of durations kept per stage
+MAX_SAMPLES = 1000
+
+PERCENTILES = (50, 90, 99)
+
+_samples = {}
+_lock = threading.Lock()
+
+
+def enable(flag = True) :
+    global ENABLED
+    ENABLED = bool(flag)
+
+def is_enabled() :
+    return ENABLED
+
+def record(name, seconds) :
+    # Add a duration in seconds to a stage
+    with _lock :
+        if name not in _samples :
+            _samples[name] = deque(maxlen = MAX_SAMPLES)
+        _samples[name].append(seconds)
+
+def reset() :
+    with _lock :
+        _samples.clear()
+
+
+class _Stage :
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name) :
+        self.name = name
+
+    def __enter__(self) :
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) :
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NullStage :
+    __slots__ = ()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc) :
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name) :
+    # Context manager timing a stage, a no-op when profiling is disabled
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+def stats() :
+    # Summary of every stage : {name : {"count", "mean", "p50", "p90", "p99", "max"}},
+    # durations in seconds over the last MAX_SAMPLES calls
+    with _lock :
+        samples = {name : np.array(values) for name, values in _samples.items() if values}
+
+    out = {}
+    for name, values in sorted(samples.items()) :
+        summary = {"count" : len(values), "mean" : float(values.mean())}
+        for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)) :
+            summary['p%d'%p] = float(value)
+        summary['max'] = float(values.max())
+        out[name] = summary
+    return out
+
+def report() :
+    # Text table of stats() in milliseconds
+    lines = ['%-16s %7s %9s %9s %9s %9s %9s'%('stage', 'count', 'mean', 'p50', 'p90', 'p99', 'max')]
+    for name, summary in stats().items() :
+        lines += ['%-16s %7d %9.3f %9.3f %9.3f %9.3f %9.3f'%(name, summary['count'], summary['mean']*1e3,
+                  summary['p50']*1e3, summary['p90']*1e3, summary['p99']*1e3, summary['max']*1e3)]
+    return '\n'.join(lines)
+
+
+# ------------------------------------------
+# cProfile traces
+# ------------------------------------------
+
+# Profiler of the thread which called start_cprofile, and the profiles collected
+# from other threads with cprofile_thread()
+_cprofile = {"main" : None, "threads" : []}
+
+def cprofile_running() :
+    return _cprofile['main'] is not None
+
+def start_cprofile() :
+    import cProfile
+    if cprofile_running() :
+        return
+    _cprofile['threads'] = []
+    _cprofile['main'] = cProfile.Profile()
+    _cprofile['main'].enable()
+
+def stop_cprofile(path) :
+    # Stop profiling and save the trace of all threads to path (pstats format)
+    import pstats
+    profiler = _cprofile['main']
+    if profiler is None :
+        raise RuntimeError('cProfile is not running')
+    profiler.disable()
+    _cprofile['main'] = None
+
+    trace = pstats.Stats(profiler)
+    for thread_profiler in _cprofile['threads'] :
+        trace.add(thread_profiler)
+    _cprofile['threads'] = []
+    trace.dump_stats(path)
+
+class cprofile_thread :
+    # Context manager profiling a block run in a worker thread while cProfile is
+    # running, cProfile only follows the thread it was enabled in
+
+    def __enter__(self) :
+        self.profiler = None
+        if cprofile_running() :
+            import cProfile
+            self.profiler = cProfile.Profile()
+            try :
+                self.profiler.enable()
+            except ValueError :
+                # Another profiler is active (single profiler interpreters)
+                self.profiler = None
+        return self
+
+    def __exit__(self, *exc) :
+        if self.profiler is not None :
+            self.profiler.disable()
+            _cprofile['threads'].append(self.profiler)
+        return False
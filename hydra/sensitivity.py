@@ -0,0 +1,260 @@
+import numpy as np
+import errormodel as em
+import graph
+import nugrid
+
+# Sensitivity of the infidelity to every parameter of the error model, using
+# forward-mode automatic differentiation. The nodes of graph.NODES are evaluated
+# on dual numbers carrying the derivatives with respect to all parameters at
+# once, so that the full gradient costs a single vectorized model evaluation.
+#
+# At the optimal COM frequency the derivative of the infidelity with respect to
+# nu_c vanishes (or nu_c sits at the edge of the searched range), so the gradient
+# of the minimum infidelity is the partial gradient at fixed nu_opt.
+
+# Parameters of em.compute_total_errors the gradient is taken with respect to
+GRADIENT_PARAMS = ('Om', 'dzB', 'nuSE', 'SBa', 'SV', 'nu_XY', 'g_factor', 'chi', 'SA', 'nbar', 'sym_fluc')
+
+# Relative step of the gate time for the derivative of the dephasing of a noise
+# spectrum (filterfunction.py), which is not differentiated exactly
+DEPHASING_STEP = 1e-4
+
+
+# ------------------------------------------
+# Dual numbers
+# ------------------------------------------
+
+def _lift(x) :
+    # Align a value with the trailing derivative axis of a dual number
+    return np.asarray(x)[..., None]
+
+def _parts(x) :
+    if isinstance(x, Dual) :
+        return x.val, x.der
+    return np.asarray(x), 0.
+
+class Dual :
+    # Value with derivatives with respect to k parameters.
+    # val : value, any shape
+    # der : derivatives, shape val.shape + (k,) (or broadcastable to it)
+    # Arithmetic and the numpy ufuncs used by the error model propagate the
+    # derivatives, unsupported numpy functions raise a TypeError.
+
+    __slots__ = ('val', 'der')
+
+    def __init__(self, val, der) :
+        self.val = np.asarray(val, dtype = float)
+        self.der = np.asarray(der, dtype = float)
+
+    def __repr__(self) :
+        return 'Dual(%r, %r)'%(self.val, self.der)
+
+    @property
+    def shape(self) :
+        return self.val.shape
+
+    @property
+    def ndim(self) :
+        return self.val.ndim
+
+    # Derivatives of the supported ufuncs, as functions of the values and
+    # derivatives of their arguments
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs) :
+        if method != '__call__' or kwargs :
+            return NotImplemented
+
+        if ufunc in _COMPARISONS :
+            return ufunc(*[_parts(x)[0] for x in inputs])
+        if ufunc not in _DERIVATIVES :
+            return NotImplemented
+
+        vals, ders = zip(*[_parts(x) for x in inputs])
+        val = ufunc(*vals)
+        return Dual(val, _DERIVATIVES[ufunc](val, *vals, *ders))
+
+    def __array_function__(self, func, types, args, kwargs) :
+        if func is np.where :
+            cond, x, y = args
+            (xv, xd), (yv, yd) = _parts(x), _parts(y)
+            return Dual(np.where(cond, xv, yv), np.where(_lift(cond), xd, yd))
+        if func in (np.shape, np.ndim, np.size) :
+            return func(args[0].val)
+        if func in (np.any, np.all) :
+            return func(args[0].val, *args[1:], **kwargs)
+        return NotImplemented
+
+    def __add__(self, other) : return np.add(self, other)
+    def __radd__(self, other) : return np.add(other, self)
+    def __sub__(self, other) : return np.subtract(self, other)
+    def __rsub__(self, other) : return np.subtract(other, self)
+    def __mul__(self, other) : return np.multiply(self, other)
+    def __rmul__(self, other) : return np.multiply(other, self)
+    def __truediv__(self, other) : return np.true_divide(self, other)
+    def __rtruediv__(self, other) : return np.true_divide(other, self)
+    def __pow__(self, other) : return np.power(self, other)
+    def __rpow__(self, other) : return np.power(other, self)
+    def __neg__(self) : return np.negative(self)
+    def __pos__(self) : return self
+
+    def __lt__(self, other) : return np.less(self, other)
+    def __le__(self, other) : return np.less_equal(self, other)
+    def __gt__(self, other) : return np.greater(self, other)
+    def __ge__(self, other) : return np.greater_equal(self, other)
+    def __eq__(self, other) : return np.equal(self, other)
+    def __ne__(self, other) : return np.not_equal(self, other)
+    __hash__ = None
+
+
+def _d_power(val, a, b, da, db) :
+    der = _lift(b * a**(b - 1.)) * da
+    if np.any(db) :
+        with np.errstate(divide = 'ignore', invalid = 'ignore') :
+            der = der + _lift(val * np.log(a)) * db
+    return der
+
+_DERIVATIVES = {
+    np.add : lambda val, a, b, da, db : da + db,
+    np.subtract : lambda val, a, b, da, db : da - db,
+    np.multiply : lambda val, a, b, da, db : da * _lift(b) + _lift(a) * db,
+    np.true_divide : lambda val, a, b, da, db : (da * _lift(b) - _lift(a) * db)/_lift(b**2),
+    np.power : _d_power,
+    np.negative : lambda val, a, da : -da,
+    np.exp : lambda val, a, da : _lift(val) * da,
+    np.sqrt : lambda val, a, da : da/_lift(2*val),
+    np.log : lambda val, a, da : da/_lift(a),
+    np.log10 : lambda val, a, da : da/_lift(a*np.log(10)),
+    np.floor : lambda val, a, da : 0. * da,
+    np.absolute : lambda val, a, da : _lift(np.sign(a)) * da,
+}
+
+_COMPARISONS = (np.less, np.less_equal, np.greater, np.greater_equal, np.equal, np.not_equal, np.isfinite)
+
+
+# ------------------------------------------
+# Model evaluation on dual numbers
+# ------------------------------------------
+
+def _offres_ps(Om, dzB, nu_c, scheme = em.OFFRES_DEFAULT) :
+    # Dual version of em.OffResInterpolator.__call__ : cells are located on the
+    # values, the interpolation weights carry the derivatives
+    interp = em.get_offres_interpolator(scheme)
+    return interp.interpolate(*interp.weights(Om, dzB, nu_c, value = lambda x : _parts(x)[0]))
+
+def _dephasing(tgate, spectrum, sequence) :
+    # Dual version of spectrum.dephasing, differentiated by central differences
+    t, dt = _parts(tgate)
+    chi = spectrum.dephasing(t, sequence)
+    if not isinstance(tgate, Dual) :
+        return chi
+    step = DEPHASING_STEP * t
+    slope = (spectrum.dephasing(t + step, sequence) - spectrum.dephasing(t - step, sequence))/(2*step)
+    return Dual(chi, _lift(slope) * dt)
+
+def _model_errors(inputs) :
+    # Error channels of graph.ERROR_NODES evaluated from the (possibly dual) inputs
+    values = dict(graph.DEFAULT_INPUTS)
+    values.update(inputs)
+
+    def get(name) :
+        if name not in values :
+            deps, func = graph.NODES[name]
+            if name == 'err_offres' and values['pulse_shaping'] :
+                values[name] = _offres_ps(get('Om'), get('dzB'), get('nu_c'),
+                                          em.offres_scheme(values['pulse_shaping']))
+            elif name == 'dephasing' and values['spectrum'] is not None :
+                values[name] = _dephasing(get('tgate'), values['spectrum'], values['sequence'])
+            else :
+                values[name] = func(*[get(dep) for dep in deps])
+        return values[name]
+
+    with np.errstate(invalid = 'ignore') :
+        return [get(name) for name in graph.ERROR_NODES]
+
+
+def gradient(nu_c, params, include_offres = True, wrt = GRADIENT_PARAMS) :
+    # Error channels and gradient of the total infidelity at the COM frequencies nu_c.
+    # nu_c : COM frequencies, any shape broadcasting with the parameters
+    # params : keyword arguments of em.compute_total_errors
+    # wrt : parameters the gradient is taken with respect to, 'nu_c' is allowed
+    # Returns (channels, total, grad) where channels maps each name of
+    # graph.ERROR_NODES to its value, and grad maps each name in wrt to the
+    # derivative of the total infidelity, all with the broadcast shape.
+    inputs = dict(params, nu_c = nu_c)
+    for name in wrt :
+        if name not in inputs :
+            raise ValueError("Cannot differentiate with respect to '%s', it is not set"%name)
+
+    k = len(wrt)
+    for n, name in enumerate(wrt) :
+        der = np.zeros(np.shape(inputs[name]) + (k,))
+        der[..., n] = 1
+        inputs[name] = Dual(inputs[name], der)
+
+    errors = _model_errors(inputs)
+    total = errors[0] + errors[1] + errors[2] + errors[4]
+    if include_offres :
+        total = total + errors[3]
+
+    shape = np.broadcast_shapes(*[np.shape(_parts(err)[0]) for err in errors])
+    channels = {name : em._as_full_array(_parts(err)[0], shape) for name, err in zip(graph.ERROR_NODES, errors)}
+    total_val, total_der = _parts(total)
+    total_der = np.broadcast_to(total_der, shape + (k,))
+    grad = {name : total_der[..., n].copy() for n, name in enumerate(wrt)}
+    return channels, em._as_full_array(total_val, shape), grad
+
+
+# ------------------------------------------
+# Sensitivity at the optimum
+# ------------------------------------------
+
+def sensitivity(params, nu_c_list = nugrid.uniform(), include_offres = True,
+                wrt = GRADIENT_PARAMS) :
+    # Gradient of the minimum infidelity over nu_c_list with respect to every
+    # parameter in wrt. Parameters may be arrays, all outputs then have their
+    # broadcast shape.
+    # Returns a dict with :
+    #   err_min, nu_opt : minimum infidelity and optimal COM frequency
+    #   channels : error channels at nu_opt, {name : value}
+    #   gradient : {param : d err_min / d param}
+    #   elasticity : {param : d ln(err_min) / d ln(param)}, the relative change of
+    #                the infidelity per relative change of the parameter
+    nu_c_list = np.asarray(nu_c_list, dtype = float)
+    grid_params = {name : np.asarray(value)[..., None] if name in GRADIENT_PARAMS else value
+                   for name, value in params.items()}
+    errors = em.compute_total_errors(nu_c_list, **grid_params)
+    err_tot = errors[0] + errors[1] + errors[2] + errors[4]
+    if include_offres :
+        err_tot = err_tot + errors[3]
+    _, nu_opt = em.optimize_fidelity_batch(nu_c_list, err_tot, nu_c_list[0], nu_c_list[-1])
+
+    channels, err_min, grad = gradient(nu_opt, params, include_offres, wrt)
+    with np.errstate(divide = 'ignore', invalid = 'ignore') :
+        elasticity = {name : grad[name] * np.asarray(params[name])/err_min for name in wrt}
+
+    return {"err_min" : err_min, "nu_opt" : nu_opt, "channels" : channels,
+            "gradient" : grad, "elasticity" : elasticity, "include_offres" : include_offres}
+
+def error_budget(result) :
+    # Ranked error budget of a sensitivity() result for scalar parameters.
+    # Returns (channels, params) :
+    #   channels : [(error node, infidelity, fraction of the total)], largest first
+    #   params : [(param, elasticity, gradient)], by decreasing |elasticity|
+    channels = [(name, float(value), float(value/result['err_min']))
+                for name, value in result['channels'].items()
+                if name != 'err_offres' or result['include_offres']]
+    channels.sort(key = lambda item : -item[1])
+
+    params = [(name, float(result['elasticity'][name]), float(result['gradient'][name]))
+              for name in result['gradient']]
+    params.sort(key = lambda item : -abs(np.nan_to_num(item[1])))
+    return channels, params
+
+def format_budget(result) :
+    # Text table of error_budget(result)
+    channels, params = error_budget(result)
+    lines = ['Infidelity %.3e at nu_opt = %.1f kHz'%(result['err_min'], result['nu_opt']/em.KHZ), '',
+             '%-16s %11s %9s'%('channel', 'infidelity', 'fraction')]
+    lines += ['%-16s %11.3e %8.1f%%'%(name, value, 100*fraction) for name, value, fraction in channels]
+    lines += ['', '%-16s %11s %11s'%('parameter', 'elasticity', 'gradient')]
+    lines += ['%-16s %11.3g %11.3e'%(name, elasticity, grad) for name, elasticity, grad in params]
+    return '\n'.join(lines)
@@ -0,0 +1,244 @@
+import numpy as np
+import errormodel as em
+import nugrid
+
+# Parameters of compute_total_errors which can be swept
+SWEEP_PARAMS = ('dzB', 'Om', 'nuSE', 'SBa', 'SV', 'nu_XY', 'chi', 'SA', 'nbar', 'sym_fluc',
+                'vib_mode', 'g_factor')
+REQUIRED_PARAMS = ('dzB', 'Om', 'nuSE', 'SBa', 'SV', 'nu_XY')
+
+# Error channels returned by compute_total_errors, in order
+CHANNELS = ('heating', 'decoherence', 'trap_fluc', 'offres', 'amp_noise')
+OUTPUTS = CHANNELS + ('total', 'nu_opt')
+
+# Uniform grid of the default nugrid settings, as the GUI and the command line
+NU_C_LIST = nugrid.uniform()
+
+# Number of (grid point, COM frequency) evaluations held in memory at once
+CHUNK_EVALUATIONS = 2**21
+
+
+# ------------------------------------------
+# Sweep results
+# ------------------------------------------
+
+class SweepResult :
+    # Labelled N-D result of a parameter sweep.
+    # dims : names of the swept parameters, one per array axis
+    # coords : dict mapping each swept parameter to its grid values
+    # data : dict mapping each output (see OUTPUTS) to an array of shape self.shape
+    # fixed : dict of the parameters held constant during the sweep
+
+    def __init__(self, dims, coords, data, fixed) :
+        self.dims = tuple(dims)
+        self.coords = coords
+        self.data = data
+        self.fixed = fixed
+
+    @property
+    def shape(self) :
+        return tuple(len(self.coords[dim]) for dim in self.dims)
+
+    def __getitem__(self, name) :
+        return self.data[name]
+
+    def __repr__(self) :
+        axes = ', '.join('%s: %d'%(dim, len(self.coords[dim])) for dim in self.dims)
+        return 'SweepResult(%s)'%axes
+
+    def isel(self, **indices) :
+        # Select by integer index along the named dimensions. Selected dimensions
+        # are dropped and their value moved to self.fixed.
+        index = tuple(indices.get(dim, slice(None)) for dim in self.dims)
+        dims = [dim for dim in self.dims if dim not in indices]
+        coords = {dim : self.coords[dim] for dim in dims}
+        fixed = dict(self.fixed)
+        fixed.update({dim : self.coords[dim][i] for dim, i in indices.items()})
+        data = {name : arr[index] for name, arr in self.data.items()}
+        return SweepResult(dims, coords, data, fixed)
+
+    def sel(self, **values) :
+        # Select the grid points nearest to the given parameter values
+        indices = {dim : int(np.argmin(np.abs(np.asarray(self.coords[dim]) - value)))
+                   for dim, value in values.items()}
+        return self.isel(**indices)
+
+
+# ------------------------------------------
+# Evaluation
+# ------------------------------------------
+
+def split_params(params) :
+    # Split sweep parameters into grid axes (1-D sequences) and fixed values (scalars)
+    # Returns (dims, coords, fixed)
+    for name in params :
+        if name not in SWEEP_PARAMS :
+            raise TypeError("sweep() got an unexpected parameter '%s'"%name)
+    missing = [name for name in REQUIRED_PARAMS if name not in params]
+    if missing :
+        raise ValueError('Missing sweep parameters : %s'%', '.join(missing))
+
+    dims, coords, fixed = [], {}, {}
+    for name, value in params.items() :
+        if np.ndim(value) == 0 :
+            fixed[name] = value
+        elif np.ndim(value) == 1 :
+            dims += [name]
+            coords[name] = np.asarray(value)
+        else :
+            raise ValueError("Sweep axis '%s' must be one dimensional"%name)
+    return dims, coords, fixed
+
+def evaluate_points(start, stop, dims, coords, fixed, nu_c_list, pulse_shaping = False,
+                    include_offres = True) :
+    # Evaluate the flattened grid points [start, stop) of a sweep
+    # Returns a dict mapping each output to a 1-D array of length stop - start
+    shape = tuple(len(coords[dim]) for dim in dims)
+    indices = np.unravel_index(np.arange(start, stop), shape) if dims else ()
+
+    params = dict(fixed)
+    for dim, idx in zip(dims, indices) :
+        params[dim] = coords[dim][idx][:, None]
+
+    nu_c_list = np.asarray(nu_c_list)
+    errors = em.compute_total_errors(nu_c_list[None, :], pulse_shaping = pulse_shaping, **params)
+
+    err_tot = errors[0] + errors[1] + errors[2] + errors[4]
+    if include_offres :
+        err_tot = err_tot + errors[3]
+
+    # Optimal COM frequency, then the error channels evaluated there
+    _, nu_opt = em.optimize_fidelity_batch(nu_c_list, err_tot, nu_c_list[0], nu_c_list[-1])
+    errors = em.compute_total_errors(nu_opt[:, None], pulse_shaping = pulse_shaping, **params)
+
+    out = {name : err[:, 0] for name, err in zip(CHANNELS, errors)}
+    out['total'] = out['heating'] + out['decoherence'] + out['trap_fluc'] + out['amp_noise']
+    if include_offres :
+        out['total'] = out['total'] + out['offres']
+    out['nu_opt'] = nu_opt
+    return out
+
+def chunk_bounds(n_points, chunk_size) :
+    # Deterministic list of (start, stop) flat index ranges covering n_points
+    return [(start, min(start + chunk_size, n_points)) for start in range(0, n_points, chunk_size)]
+
+class SweepCancelled(Exception) :
+    # Raised by sweep() when the cancel callback requests cancellation
+    pass
+
+def _is_cancelled(cancel) :
+    # cancel : None, a callable returning True to cancel, or an object with is_set() (threading.Event)
+    if cancel is None :
+        return False
+    if hasattr(cancel, 'is_set') :
+        return cancel.is_set()
+    return bool(cancel())
+
+def sweep(nu_c_list = NU_C_LIST, pulse_shaping = False, include_offres = True, chunk_size = None,
+          dtype = float, out = None, workers = None, progress = None, cancel = None, **params) :
+    # Evaluate the error model over a full-factorial grid of parameters.
+    # nu_c_list : COM frequencies over which each grid point is optimized
+    # pulse_shaping : use the pulse shaping off-resonant error model
+    # include_offres : add the off-resonant error to the total infidelity
+    # chunk_size : number of grid points evaluated at once, by default chosen so
+    #              that CHUNK_EVALUATIONS model evaluations are held in memory
+    # dtype : dtype of the output arrays, e.g. np.float32 to halve memory use
+    # out : optional dict of preallocated output arrays (e.g. memory maps) with
+    #       the grid shape, one per name in OUTPUTS
+    # workers : number of worker processes. None or 1 evaluates in this process.
+    # progress : optional callback progress(points_done, points_total), called
+    #            after every chunk
+    # cancel : optional callable (or threading.Event) polled after every chunk,
+    #          SweepCancelled is raised once it returns True
+    # params : values of the parameters in SWEEP_PARAMS, in compute_total_errors
+    #          units. 1-D sequences are swept, in the order given, scalars are fixed.
+    #
+    # Returns a SweepResult holding, for every grid point, each error channel and
+    # the total infidelity at the optimal COM frequency, and the optimal COM
+    # frequency itself. Results do not depend on the number of workers.
+    dims, coords, fixed = split_params(params)
+    shape = tuple(len(coords[dim]) for dim in dims)
+    n_points = int(np.prod(shape))
+
+    if chunk_size is None :
+        chunk_size = max(1, CHUNK_EVALUATIONS//len(nu_c_list))
+
+    if out is None :
+        out = {name : np.empty(shape, dtype = dtype) for name in OUTPUTS}
+    for name in OUTPUTS :
+        if out[name].shape != shape or not out[name].flags.c_contiguous :
+            raise ValueError("Output array '%s' must be C-contiguous with shape %s"%(name, shape))
+
+    chunks = chunk_bounds(n_points, chunk_size)
+    task = (dims, coords, fixed, nu_c_list, pulse_shaping, include_offres)
+
+    if workers is None or workers <= 1 :
+        flat_out = {name : out[name].reshape(-1) for name in OUTPUTS}
+        done = 0
+        for start, stop in chunks :
+            if _is_cancelled(cancel) :
+                raise SweepCancelled()
+            values = evaluate_points(start, stop, *task)
+            for name in OUTPUTS :
+                flat_out[name][start:stop] = values[name]
+            done += stop - start
+            if progress is not None :
+                progress(done, n_points)
+    else :
+        _sweep_parallel(chunks, n_points, task, out, workers, progress, cancel)
+
+    return SweepResult(dims, coords, out, fixed)
+
+
+# ------------------------------------------
+# Parallel evaluation
+# ------------------------------------------
+
+# State of a worker process, set once by _init_worker
+_worker = {}
+
+def _init_worker(task, dtypes) :
+    _worker['task'] = task
+    _worker['dtypes'] = dtypes
+
+def _run_chunk(start, stop) :
+    # Evaluate one chunk, cast to the dtypes of the output arrays
+    values = evaluate_points(start, stop, *_worker['task'])
+    return start, stop, {name : values[name].astype(dtype, copy = False)
+                         for name, dtype in _worker['dtypes'].items()}
+
+def _sweep_parallel(chunks, n_points, task, out, workers, progress, cancel) :
+    # Shard the chunks over a process pool. Each chunk is written straight into
+    # the output arrays as it comes back, so that besides out only the chunks in
+    # flight are held in memory, whatever the size of the sweep.
+    # The process pool machinery is only imported when a parallel sweep is run.
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    flat_out = {name : out[name].reshape(-1) for name in OUTPUTS}
+    dtypes = {name : out[name].dtype for name in OUTPUTS}
+
+    with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                             initargs = (task, dtypes)) as pool :
+        # Chunks are submitted in order, a bounded number at a time, so that
+        # cancellation does not have to wait for a long queue to drain
+        pending = set()
+        next_chunk = 0
+        done = 0
+        while next_chunk < len(chunks) or pending :
+            while next_chunk < len(chunks) and len(pending) < 2*workers :
+                pending.add(pool.submit(_run_chunk, *chunks[next_chunk]))
+                next_chunk += 1
+
+            finished, pending = wait(pending, return_when = FIRST_COMPLETED)
+            for future in finished :
+                start, stop, values = future.result()
+                for name in OUTPUTS :
+                    flat_out[name][start:stop] = values[name]
+                done += stop - start
+
+            if progress is not None :
+                progress(done, n_points)
+            if _is_cancelled(cancel) :
+                for future in pending :
+                    future.cancel()
+                raise SweepCancelled()
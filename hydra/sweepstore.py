@@ -0,0 +1,215 @@
+import json
+import os
+
+import numpy as np
+import sweep
+
+# On-disk storage of sweeps larger than memory. A store is a directory holding
+#
+#   meta.json : grid axes, fixed parameters, evaluation options, chunking, and
+#               the schema version of the preset the sweep was built from
+#   <output>.npy : one array per name in sweep.OUTPUTS with the grid shape,
+#                  written in place through np.memmap
+#   done.npy : one flag per chunk, set once the chunk is on disk
+#
+# Chunks are evaluated in the order of sweep.chunk_bounds and flushed before
+# they are flagged, so an interrupted sweep resumes from the chunks not yet
+# flagged. Results are read back as memory maps, slices of which are views into
+# the files and do not copy the data.
+#
+#   store = sweepstore.create('big.sweep', dzB = ..., Om = ..., ...)
+#   store.run(workers = 8)
+#   result = sweepstore.load('big.sweep')   # SweepResult of memory maps
+#   result.isel(dzB = 10)['total']
+
+FORMAT_VERSION = 1
+
+META_FILE = 'meta.json'
+DONE_FILE = 'done.npy'
+
+
+def _jsonable(value) :
+    value = np.asarray(value)
+    return value.tolist()
+
+class SweepStore :
+
+    def __init__(self, path) :
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f :
+            self.meta = json.load(f)
+        if self.meta['format_version'] > FORMAT_VERSION :
+            raise ValueError('Sweep store %s has format version %d, newer than supported (%d)'
+                             %(path, self.meta['format_version'], FORMAT_VERSION))
+
+        self.dims = tuple(self.meta['dims'])
+        self.coords = {dim : np.asarray(values) for dim, values in self.meta['coords'].items()}
+        self.fixed = self.meta['fixed']
+        self.shape = tuple(self.meta['shape'])
+        self.chunks = sweep.chunk_bounds(int(np.prod(self.shape)), self.meta['chunk_size'])
+
+    def __repr__(self) :
+        return 'SweepStore(%s, %d / %d chunks done)'%(self.path, self.done().sum(), len(self.chunks))
+
+    def _file(self, name) :
+        return os.path.join(self.path, name + '.npy')
+
+    def arrays(self, mode = 'r') :
+        # Memory maps of the outputs, mode 'r' or 'r+'
+        return {name : np.load(self._file(name), mmap_mode = mode) for name in sweep.OUTPUTS}
+
+    def done(self) :
+        return np.load(os.path.join(self.path, DONE_FILE))
+
+    @property
+    def complete(self) :
+        return bool(self.done().all())
+
+    def result(self) :
+        # SweepResult backed by memory maps of the outputs. Chunks not yet computed
+        # hold nan.
+        return sweep.SweepResult(self.dims, self.coords, self.arrays('r'), dict(self.fixed))
+
+    def task(self) :
+        meta = self.meta
+        return (list(self.dims), self.coords, self.fixed, np.asarray(meta['nu_c_list']),
+                meta['pulse_shaping'], meta['include_offres'])
+
+    def run(self, workers = None, progress = None, cancel = None) :
+        # Evaluate the chunks not yet done.
+        # workers : number of worker processes, None or 1 evaluates in this process
+        # progress : optional callback progress(points_done, points_total), called
+        #            after every chunk, points_done includes previous runs
+        # cancel : optional callable (or threading.Event), sweep.SweepCancelled is
+        #          raised once it returns True. Completed chunks are kept.
+        # Returns self.result()
+        done = np.load(os.path.join(self.path, DONE_FILE), mmap_mode = 'r+')
+        n_points = int(np.prod(self.shape))
+        todo = [i for i in range(len(self.chunks)) if not done[i]]
+        points_done = n_points - sum(self.chunks[i][1] - self.chunks[i][0] for i in todo)
+
+        def mark(i) :
+            nonlocal points_done
+            done[i] = True
+            done.flush()
+            points_done += self.chunks[i][1] - self.chunks[i][0]
+            if progress is not None :
+                progress(points_done, n_points)
+
+        if workers is None or workers <= 1 :
+            _init_worker(self.path)
+            try :
+                for i in todo :
+                    if sweep._is_cancelled(cancel) :
+                        raise sweep.SweepCancelled()
+                    _run_chunk(i)
+                    mark(i)
+            finally :
+                _worker.clear()
+        else :
+            self._run_parallel(todo, workers, mark, cancel)
+
+        del done
+        return self.result()
+
+    def _run_parallel(self, todo, workers, mark, cancel) :
+        # Workers open the memory maps themselves and write their chunks in place,
+        # only chunk indices are sent back
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+        with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                                 initargs = (self.path,)) as pool :
+            pending = set()
+            next_chunk = 0
+            while next_chunk < len(todo) or pending :
+                while next_chunk < len(todo) and len(pending) < 2*workers :
+                    pending.add(pool.submit(_run_chunk, todo[next_chunk]))
+                    next_chunk += 1
+
+                finished, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in finished :
+                    mark(future.result())
+
+                if sweep._is_cancelled(cancel) :
+                    for future in pending :
+                        future.cancel()
+                    # Chunks already running are completed and flagged
+                    for future in wait(pending)[0] :
+                        if not future.cancelled() :
+                            mark(future.result())
+                    raise sweep.SweepCancelled()
+
+
+# State of a process evaluating chunks of a store, set by _init_worker
+_worker = {}
+
+def _init_worker(path) :
+    store = SweepStore(path)
+    _worker['store'] = store
+    _worker['arrays'] = {name : array.reshape(-1) for name, array in store.arrays('r+').items()}
+    _worker['task'] = store.task()
+
+def _run_chunk(i) :
+    # Evaluate chunk i and flush it to disk
+    start, stop = _worker['store'].chunks[i]
+    values = sweep.evaluate_points(start, stop, *_worker['task'])
+    for name, array in _worker['arrays'].items() :
+        array[start:stop] = values[name]
+        array.flush()
+    return i
+
+
+def create(path, nu_c_list = sweep.NU_C_LIST, pulse_shaping = False, include_offres = True,
+           chunk_size = None, dtype = float, schema_version = None, resume = True, **params) :
+    # Create a store for a sweep with the arguments of sweep.sweep (see there),
+    # preallocating its output files, nan filled.
+    # schema_version : version of the preset schema the parameters come from
+    # resume : if a store with the same sweep already exists at path, return it
+    #          so that run() completes it. A store of a different sweep is an error.
+    # Returns the SweepStore, run() evaluates it.
+    dims, coords, fixed = sweep.split_params(params)
+    shape = tuple(len(coords[dim]) for dim in dims)
+    if chunk_size is None :
+        chunk_size = max(1, sweep.CHUNK_EVALUATIONS//len(nu_c_list))
+
+    meta = {"format_version" : FORMAT_VERSION,
+            "schema_version" : schema_version,
+            "dims" : list(dims),
+            "coords" : {dim : _jsonable(coords[dim]) for dim in dims},
+            "fixed" : {name : _jsonable(value) for name, value in fixed.items()},
+            "shape" : list(shape),
+            "outputs" : list(sweep.OUTPUTS),
+            "dtype" : np.dtype(dtype).str,
+            "chunk_size" : int(chunk_size),
+            "nu_c_list" : _jsonable(nu_c_list),
+            "pulse_shaping" : pulse_shaping if isinstance(pulse_shaping, str) else bool(pulse_shaping),
+            "include_offres" : bool(include_offres)}
+
+    meta_path = os.path.join(path, META_FILE)
+    if os.path.exists(meta_path) :
+        with open(meta_path) as f :
+            existing = json.load(f)
+        if not resume :
+            raise FileExistsError('Sweep store %s already exists'%path)
+        if existing != json.loads(json.dumps(meta)) :
+            raise ValueError('Sweep store %s holds a different sweep'%path)
+        return SweepStore(path)
+
+    os.makedirs(path, exist_ok = True)
+    for name in sweep.OUTPUTS :
+        array = np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode = 'w+',
+                                          dtype = dtype, shape = shape)
+        array.reshape(-1)[:] = np.nan
+        array.flush()
+        del array
+    n_chunks = len(sweep.chunk_bounds(int(np.prod(shape)), chunk_size))
+    np.save(os.path.join(path, DONE_FILE), np.zeros(n_chunks, dtype = bool))
+
+    # The metadata is written last, a store without it is incomplete and recreated
+    with open(meta_path, 'w') as f :
+        json.dump(meta, f, indent = 1)
+    return SweepStore(path)
+
+def load(path) :
+    # SweepResult of a store, backed by memory maps
+    return SweepStore(path).result()
@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'hydra/window.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtWidgets
+
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        MainWindow.setObjectName("MainWindow")
+        MainWindow.resize(1343, 700)
+        self.centralwidget = QtWidgets.QWidget(MainWindow)
+        self.centralwidget.setObjectName("centralwidget")
+        self.tabWidget = QtWidgets.QTabWidget(self.centralwidget)
+        self.tabWidget.setEnabled(True)
+        self.tabWidget.setGeometry(QtCore.QRect(10, 0, 1321, 651))
+        self.tabWidget.setTabBarAutoHide(False)
+        self.tabWidget.setObjectName("tabWidget")
+        self.tab = QtWidgets.QWidget()
+        self.tab.setObjectName("tab")
+        self.tableInfo = QtWidgets.QTableWidget(self.tab)
+        self.tableInfo.setEnabled(True)
+        self.tableInfo.setGeometry(QtCore.QRect(1050, 430, 251, 121))
+        self.tableInfo.setMaximumSize(QtCore.QSize(421, 16777215))
+        self.tableInfo.setObjectName("tableInfo")
+        self.tableInfo.setColumnCount(0)
+        self.tableInfo.setRowCount(0)
+        self.tableInfo.horizontalHeader().setVisible(False)
+        self.tableInfo.horizontalHeader().setDefaultSectionSize(120)
+        self.tableInfo.horizontalHeader().setHighlightSections(False)
+        self.tableInfo.verticalHeader().setVisible(False)
+        self.tableInfo.verticalHeader().setDefaultSectionSize(29)
+        self.tableInfo.verticalHeader().setHighlightSections(False)
+        self.tableInfo.verticalHeader().setMinimumSectionSize(15)
+        self.graphWidget = PlotWidget(self.tab)
+        self.graphWidget.setGeometry(QtCore.QRect(20, 30, 541, 501))
+        self.graphWidget.setObjectName("graphWidget")
+        self.comboBoxArchitecture = QtWidgets.QComboBox(self.tab)
+        self.comboBoxArchitecture.setGeometry(QtCore.QRect(1180, 170, 101, 22))
+        self.comboBoxArchitecture.setObjectName("comboBoxArchitecture")
+        self.comboBoxArchitecture.addItem("")
+        self.comboBoxArchitecture.addItem("")
+        self.comboBoxVNoise = QtWidgets.QComboBox(self.tab)
+        self.comboBoxVNoise.setGeometry(QtCore.QRect(1180, 200, 101, 22))
+        self.comboBoxVNoise.setObjectName("comboBoxVNoise")
+        self.comboBoxVNoise.addItem("")
+        self.comboBoxVNoise.addItem("")
+        self.label_8 = QtWidgets.QLabel(self.tab)
+        self.label_8.setGeometry(QtCore.QRect(1060, 170, 101, 16))
+        self.label_8.setObjectName("label_8")
+        self.label_9 = QtWidgets.QLabel(self.tab)
+        self.label_9.setGeometry(QtCore.QRect(1060, 200, 101, 16))
+        self.label_9.setObjectName("label_9")
+        self.comboBoxVibMode = QtWidgets.QComboBox(self.tab)
+        self.comboBoxVibMode.setGeometry(QtCore.QRect(1180, 230, 101, 22))
+        self.comboBoxVibMode.setObjectName("comboBoxVibMode")
+        self.comboBoxVibMode.addItem("")
+        self.comboBoxVibMode.addItem("")
+        self.comboBoxVibMode.addItem("")
+        self.comboBoxVibMode.addItem("")
+        self.label_10 = QtWidgets.QLabel(self.tab)
+        self.label_10.setGeometry(QtCore.QRect(1060, 230, 111, 16))
+        self.label_10.setObjectName("label_10")
+        self.line = QtWidgets.QFrame(self.tab)
+        self.line.setGeometry(QtCore.QRect(1030, 20, 21, 581))
+        self.line.setFrameShape(QtWidgets.QFrame.VLine)
+        self.line.setFrameShadow(QtWidgets.QFrame.Sunken)
+        self.line.setObjectName("line")
+        self.line_2 = QtWidgets.QFrame(self.tab)
+        self.line_2.setGeometry(QtCore.QRect(1050, 140, 241, 16))
+        self.line_2.setFrameShape(QtWidgets.QFrame.HLine)
+        self.line_2.setFrameShadow(QtWidgets.QFrame.Sunken)
+        self.line_2.setObjectName("line_2")
+        self.line_3 = QtWidgets.QFrame(self.tab)
+        self.line_3.setGeometry(QtCore.QRect(570, 30, 21, 571))
+        self.line_3.setFrameShape(QtWidgets.QFrame.VLine)
+        self.line_3.setFrameShadow(QtWidgets.QFrame.Sunken)
+        self.line_3.setObjectName("line_3")
+        self.layoutWidget = QtWidgets.QWidget(self.tab)
+        self.layoutWidget.setGeometry(QtCore.QRect(610, 20, 57, 271))
+        self.layoutWidget.setObjectName("layoutWidget")
+        self.verticalLayout_3 = QtWidgets.QVBoxLayout(self.layoutWidget)
+        self.verticalLayout_3.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_3.setObjectName("verticalLayout_3")
+        self.label_2 = QtWidgets.QLabel(self.layoutWidget)
+        self.label_2.setObjectName("label_2")
+        self.verticalLayout_3.addWidget(self.label_2)
+        self.label_3 = QtWidgets.QLabel(self.layoutWidget)
+        self.label_3.setObjectName("label_3")
+        self.verticalLayout_3.addWidget(self.label_3)
+        self.label_4 = QtWidgets.QLabel(self.layoutWidget)
+        self.label_4.setObjectName("label_4")
+        self.verticalLayout_3.addWidget(self.label_4)
+        self.label_5 = QtWidgets.QLabel(self.layoutWidget)
+        self.label_5.setObjectName("label_5")
+        self.verticalLayout_3.addWidget(self.label_5)
+        self.label_6 = QtWidgets.QLabel(self.layoutWidget)
+        self.label_6.setObjectName("label_6")
+        self.verticalLayout_3.addWidget(self.label_6)
+        self.label_7 = QtWidgets.QLabel(self.layoutWidget)
+        self.label_7.setObjectName("label_7")
+        self.verticalLayout_3.addWidget(self.label_7)
+        self.label_16 = QtWidgets.QLabel(self.layoutWidget)
+        self.label_16.setObjectName("label_16")
+        self.verticalLayout_3.addWidget(self.label_16)
+        self.layoutWidget1 = QtWidgets.QWidget(self.tab)
+        self.layoutWidget1.setGeometry(QtCore.QRect(670, 20, 251, 281))
+        self.layoutWidget1.setObjectName("layoutWidget1")
+        self.verticalLayout = QtWidgets.QVBoxLayout(self.layoutWidget1)
+        self.verticalLayout.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.sliderGradient = QtWidgets.QSlider(self.layoutWidget1)
+        self.sliderGradient.setMinimum(24)
+        self.sliderGradient.setMaximum(200)
+        self.sliderGradient.setSingleStep(2)
+        self.sliderGradient.setProperty("value", 100)
+        self.sliderGradient.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderGradient.setTickPosition(QtWidgets.QSlider.NoTicks)
+        self.sliderGradient.setObjectName("sliderGradient")
+        self.verticalLayout.addWidget(self.sliderGradient)
+        self.sliderPower = QtWidgets.QSlider(self.layoutWidget1)
+        self.sliderPower.setMinimum(10)
+        self.sliderPower.setMaximum(150)
+        self.sliderPower.setProperty("value", 50)
+        self.sliderPower.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderPower.setObjectName("sliderPower")
+        self.verticalLayout.addWidget(self.sliderPower)
+        self.sliderENoise = QtWidgets.QSlider(self.layoutWidget1)
+        self.sliderENoise.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderENoise.setObjectName("sliderENoise")
+        self.verticalLayout.addWidget(self.sliderENoise)
+        self.sliderBAmbient = QtWidgets.QSlider(self.layoutWidget1)
+        self.sliderBAmbient.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderBAmbient.setObjectName("sliderBAmbient")
+        self.verticalLayout.addWidget(self.sliderBAmbient)
+        self.sliderVNoise = QtWidgets.QSlider(self.layoutWidget1)
+        self.sliderVNoise.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderVNoise.setObjectName("sliderVNoise")
+        self.verticalLayout.addWidget(self.sliderVNoise)
+        self.sliderNuXY = QtWidgets.QSlider(self.layoutWidget1)
+        self.sliderNuXY.setPageStep(1)
+        self.sliderNuXY.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderNuXY.setObjectName("sliderNuXY")
+        self.verticalLayout.addWidget(self.sliderNuXY)
+        self.sliderNbar = QtWidgets.QSlider(self.layoutWidget1)
+        self.sliderNbar.setPageStep(1)
+        self.sliderNbar.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderNbar.setObjectName("sliderNbar")
+        self.verticalLayout.addWidget(self.sliderNbar)
+        self.layoutWidget2 = QtWidgets.QWidget(self.tab)
+        self.layoutWidget2.setGeometry(QtCore.QRect(930, 20, 81, 271))
+        self.layoutWidget2.setObjectName("layoutWidget2")
+        self.verticalLayout_4 = QtWidgets.QVBoxLayout(self.layoutWidget2)
+        self.verticalLayout_4.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_4.setObjectName("verticalLayout_4")
+        self.labelGradient = QtWidgets.QLabel(self.layoutWidget2)
+        self.labelGradient.setObjectName("labelGradient")
+        self.verticalLayout_4.addWidget(self.labelGradient)
+        self.labelPower = QtWidgets.QLabel(self.layoutWidget2)
+        self.labelPower.setObjectName("labelPower")
+        self.verticalLayout_4.addWidget(self.labelPower)
+        self.labelENoise = QtWidgets.QLabel(self.layoutWidget2)
+        self.labelENoise.setObjectName("labelENoise")
+        self.verticalLayout_4.addWidget(self.labelENoise)
+        self.labelBAmbient = QtWidgets.QLabel(self.layoutWidget2)
+        self.labelBAmbient.setObjectName("labelBAmbient")
+        self.verticalLayout_4.addWidget(self.labelBAmbient)
+        self.labelVNoise = QtWidgets.QLabel(self.layoutWidget2)
+        self.labelVNoise.setObjectName("labelVNoise")
+        self.verticalLayout_4.addWidget(self.labelVNoise)
+        self.labelNuXY = QtWidgets.QLabel(self.layoutWidget2)
+        self.labelNuXY.setObjectName("labelNuXY")
+        self.verticalLayout_4.addWidget(self.labelNuXY)
+        self.labelNbar = QtWidgets.QLabel(self.layoutWidget2)
+        self.labelNbar.setObjectName("labelNbar")
+        self.verticalLayout_4.addWidget(self.labelNbar)
+        self.layoutWidget3 = QtWidgets.QWidget(self.tab)
+        self.layoutWidget3.setGeometry(QtCore.QRect(1100, 60, 151, 76))
+        self.layoutWidget3.setObjectName("layoutWidget3")
+        self.verticalLayout_2 = QtWidgets.QVBoxLayout(self.layoutWidget3)
+        self.verticalLayout_2.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_2.setObjectName("verticalLayout_2")
+        self.radioBtnPulseShaping = QtWidgets.QRadioButton(self.layoutWidget3)
+        self.radioBtnPulseShaping.setEnabled(False)
+        self.radioBtnPulseShaping.setAutoExclusive(False)
+        self.radioBtnPulseShaping.setObjectName("radioBtnPulseShaping")
+        self.verticalLayout_2.addWidget(self.radioBtnPulseShaping)
+        self.radioBtnShowOffRes = QtWidgets.QRadioButton(self.layoutWidget3)
+        self.radioBtnShowOffRes.setAutoExclusive(False)
+        self.radioBtnShowOffRes.setObjectName("radioBtnShowOffRes")
+        self.verticalLayout_2.addWidget(self.radioBtnShowOffRes)
+        self.radioBtnIncludeOffErr = QtWidgets.QRadioButton(self.layoutWidget3)
+        self.radioBtnIncludeOffErr.setAutoExclusive(False)
+        self.radioBtnIncludeOffErr.setObjectName("radioBtnIncludeOffErr")
+        self.verticalLayout_2.addWidget(self.radioBtnIncludeOffErr)
+        self.label = QtWidgets.QLabel(self.tab)
+        self.label.setGeometry(QtCore.QRect(1060, 30, 151, 16))
+        self.label.setObjectName("label")
+        self.radioBtnOptFid = QtWidgets.QRadioButton(self.tab)
+        self.radioBtnOptFid.setEnabled(True)
+        self.radioBtnOptFid.setGeometry(QtCore.QRect(1060, 400, 131, 20))
+        self.radioBtnOptFid.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.radioBtnOptFid.setChecked(True)
+        self.radioBtnOptFid.setAutoExclusive(False)
+        self.radioBtnOptFid.setObjectName("radioBtnOptFid")
+        self.sliderFixNu = QtWidgets.QSlider(self.tab)
+        self.sliderFixNu.setEnabled(False)
+        self.sliderFixNu.setGeometry(QtCore.QRect(1250, 400, 51, 22))
+        self.sliderFixNu.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderFixNu.setObjectName("sliderFixNu")
+        self.label_11 = QtWidgets.QLabel(self.tab)
+        self.label_11.setGeometry(QtCore.QRect(1200, 400, 55, 16))
+        self.label_11.setObjectName("label_11")
+        self.line_4 = QtWidgets.QFrame(self.tab)
+        self.line_4.setGeometry(QtCore.QRect(600, 300, 431, 16))
+        self.line_4.setFrameShape(QtWidgets.QFrame.HLine)
+        self.line_4.setFrameShadow(QtWidgets.QFrame.Sunken)
+        self.line_4.setObjectName("line_4")
+        self.comboBoxTraceNum = QtWidgets.QComboBox(self.tab)
+        self.comboBoxTraceNum.setGeometry(QtCore.QRect(1140, 290, 141, 22))
+        self.comboBoxTraceNum.setObjectName("comboBoxTraceNum")
+        self.comboBoxTraceNum.addItem("")
+        self.comboBoxTraceNum.addItem("")
+        self.comboBoxTraceNum.addItem("")
+        self.comboBoxTraceNum.addItem("")
+        self.label_12 = QtWidgets.QLabel(self.tab)
+        self.label_12.setGeometry(QtCore.QRect(1060, 290, 101, 16))
+        self.label_12.setObjectName("label_12")
+        self.radioBtnTraceUpdate = QtWidgets.QRadioButton(self.tab)
+        self.radioBtnTraceUpdate.setEnabled(True)
+        self.radioBtnTraceUpdate.setGeometry(QtCore.QRect(1050, 320, 111, 20))
+        self.radioBtnTraceUpdate.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.radioBtnTraceUpdate.setChecked(True)
+        self.radioBtnTraceUpdate.setAutoExclusive(False)
+        self.radioBtnTraceUpdate.setObjectName("radioBtnTraceUpdate")
+        self.radioBtnTraceHide = QtWidgets.QRadioButton(self.tab)
+        self.radioBtnTraceHide.setEnabled(True)
+        self.radioBtnTraceHide.setGeometry(QtCore.QRect(1050, 350, 111, 20))
+        self.radioBtnTraceHide.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.radioBtnTraceHide.setChecked(False)
+        self.radioBtnTraceHide.setAutoExclusive(False)
+        self.radioBtnTraceHide.setObjectName("radioBtnTraceHide")
+        self.line_5 = QtWidgets.QFrame(self.tab)
+        self.line_5.setGeometry(QtCore.QRect(1050, 260, 241, 16))
+        self.line_5.setFrameShape(QtWidgets.QFrame.HLine)
+        self.line_5.setFrameShadow(QtWidgets.QFrame.Sunken)
+        self.line_5.setObjectName("line_5")
+        self.line_7 = QtWidgets.QFrame(self.tab)
+        self.line_7.setGeometry(QtCore.QRect(1050, 380, 241, 16))
+        self.line_7.setFrameShape(QtWidgets.QFrame.HLine)
+        self.line_7.setFrameShadow(QtWidgets.QFrame.Sunken)
+        self.line_7.setObjectName("line_7")
+        self.radioBtnAmpNoise = QtWidgets.QRadioButton(self.tab)
+        self.radioBtnAmpNoise.setEnabled(True)
+        self.radioBtnAmpNoise.setGeometry(QtCore.QRect(600, 320, 131, 20))
+        self.radioBtnAmpNoise.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.radioBtnAmpNoise.setChecked(False)
+        self.radioBtnAmpNoise.setAutoExclusive(False)
+        self.radioBtnAmpNoise.setObjectName("radioBtnAmpNoise")
+        self.sliderChi = QtWidgets.QSlider(self.tab)
+        self.sliderChi.setEnabled(False)
+        self.sliderChi.setGeometry(QtCore.QRect(680, 350, 249, 22))
+        self.sliderChi.setMinimum(24)
+        self.sliderChi.setMaximum(200)
+        self.sliderChi.setSingleStep(2)
+        self.sliderChi.setProperty("value", 100)
+        self.sliderChi.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderChi.setTickPosition(QtWidgets.QSlider.NoTicks)
+        self.sliderChi.setObjectName("sliderChi")
+        self.label_13 = QtWidgets.QLabel(self.tab)
+        self.label_13.setGeometry(QtCore.QRect(630, 340, 55, 34))
+        self.label_13.setObjectName("label_13")
+        self.labelChi = QtWidgets.QLabel(self.tab)
+        self.labelChi.setGeometry(QtCore.QRect(940, 340, 79, 32))
+        self.labelChi.setObjectName("labelChi")
+        self.radioBtnCCWNoise = QtWidgets.QRadioButton(self.tab)
+        self.radioBtnCCWNoise.setEnabled(True)
+        self.radioBtnCCWNoise.setGeometry(QtCore.QRect(600, 380, 151, 20))
+        self.radioBtnCCWNoise.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.radioBtnCCWNoise.setChecked(False)
+        self.radioBtnCCWNoise.setAutoExclusive(False)
+        self.radioBtnCCWNoise.setObjectName("radioBtnCCWNoise")
+        self.labelSA = QtWidgets.QLabel(self.tab)
+        self.labelSA.setGeometry(QtCore.QRect(940, 400, 79, 32))
+        self.labelSA.setObjectName("labelSA")
+        self.sliderSA = QtWidgets.QSlider(self.tab)
+        self.sliderSA.setEnabled(True)
+        self.sliderSA.setGeometry(QtCore.QRect(680, 410, 249, 22))
+        self.sliderSA.setMinimum(24)
+        self.sliderSA.setMaximum(200)
+        self.sliderSA.setSingleStep(2)
+        self.sliderSA.setProperty("value", 100)
+        self.sliderSA.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderSA.setTickPosition(QtWidgets.QSlider.NoTicks)
+        self.sliderSA.setObjectName("sliderSA")
+        self.label_14 = QtWidgets.QLabel(self.tab)
+        self.label_14.setGeometry(QtCore.QRect(630, 400, 55, 34))
+        self.label_14.setObjectName("label_14")
+        self.radioBtnSymFluc = QtWidgets.QRadioButton(self.tab)
+        self.radioBtnSymFluc.setEnabled(True)
+        self.radioBtnSymFluc.setGeometry(QtCore.QRect(600, 440, 201, 20))
+        self.radioBtnSymFluc.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.radioBtnSymFluc.setChecked(False)
+        self.radioBtnSymFluc.setAutoExclusive(False)
+        self.radioBtnSymFluc.setObjectName("radioBtnSymFluc")
+        self.labelSymFluc = QtWidgets.QLabel(self.tab)
+        self.labelSymFluc.setGeometry(QtCore.QRect(940, 460, 79, 32))
+        self.labelSymFluc.setObjectName("labelSymFluc")
+        self.sliderSymFluc = QtWidgets.QSlider(self.tab)
+        self.sliderSymFluc.setEnabled(True)
+        self.sliderSymFluc.setGeometry(QtCore.QRect(680, 470, 249, 22))
+        self.sliderSymFluc.setMinimum(24)
+        self.sliderSymFluc.setMaximum(200)
+        self.sliderSymFluc.setSingleStep(2)
+        self.sliderSymFluc.setProperty("value", 100)
+        self.sliderSymFluc.setOrientation(QtCore.Qt.Horizontal)
+        self.sliderSymFluc.setTickPosition(QtWidgets.QSlider.NoTicks)
+        self.sliderSymFluc.setObjectName("sliderSymFluc")
+        self.label_15 = QtWidgets.QLabel(self.tab)
+        self.label_15.setGeometry(QtCore.QRect(630, 460, 55, 34))
+        self.label_15.setObjectName("label_15")
+        self.legendWidget = PlotWidget(self.tab)
+        self.legendWidget.setGeometry(QtCore.QRect(20, 540, 541, 71))
+        self.legendWidget.setObjectName("legendWidget")
+        self.tabWidget.addTab(self.tab, "")
+        self.tab_2 = QtWidgets.QWidget()
+        self.tab_2.setObjectName("tab_2")
+        self.tabWidget_2 = QtWidgets.QTabWidget(self.tab_2)
+        self.tabWidget_2.setGeometry(QtCore.QRect(30, 20, 1261, 521))
+        self.tabWidget_2.setObjectName("tabWidget_2")
+        self.tab_3 = QtWidgets.QWidget()
+        self.tab_3.setObjectName("tab_3")
+        self.tabWidget_2.addTab(self.tab_3, "")
+        self.tab_4 = QtWidgets.QWidget()
+        self.tab_4.setObjectName("tab_4")
+        self.tabWidget_2.addTab(self.tab_4, "")
+        self.tab_5 = QtWidgets.QWidget()
+        self.tab_5.setObjectName("tab_5")
+        self.tabWidget_2.addTab(self.tab_5, "")
+        self.tab_6 = QtWidgets.QWidget()
+        self.tab_6.setObjectName("tab_6")
+        self.tabWidget_2.addTab(self.tab_6, "")
+        self.tabWidget.addTab(self.tab_2, "")
+        MainWindow.setCentralWidget(self.centralwidget)
+        self.menubar = QtWidgets.QMenuBar(MainWindow)
+        self.menubar.setGeometry(QtCore.QRect(0, 0, 1343, 26))
+        self.menubar.setObjectName("menubar")
+        self.menuFile = QtWidgets.QMenu(self.menubar)
+        self.menuFile.setObjectName("menuFile")
+        self.menuPresets = QtWidgets.QMenu(self.menubar)
+        self.menuPresets.setObjectName("menuPresets")
+        self.menuTools = QtWidgets.QMenu(self.menubar)
+        self.menuTools.setObjectName("menuTools")
+        MainWindow.setMenuBar(self.menubar)
+        self.statusbar = QtWidgets.QStatusBar(MainWindow)
+        self.statusbar.setObjectName("statusbar")
+        MainWindow.setStatusBar(self.statusbar)
+        self.actionLoadMacro = QtWidgets.QAction(MainWindow)
+        self.actionLoadMacro.setObjectName("actionLoadMacro")
+        self.actionLoadChip = QtWidgets.QAction(MainWindow)
+        self.actionLoadChip.setObjectName("actionLoadChip")
+        self.actionLoadPresetFile = QtWidgets.QAction(MainWindow)
+        self.actionLoadPresetFile.setObjectName("actionLoadPresetFile")
+        self.actionSavePresetFile = QtWidgets.QAction(MainWindow)
+        self.actionSavePresetFile.setObjectName("actionSavePresetFile")
+        self.actionProfiling = QtWidgets.QAction(MainWindow)
+        self.actionProfiling.setCheckable(True)
+        self.actionProfiling.setObjectName("actionProfiling")
+        self.actionProfilingStats = QtWidgets.QAction(MainWindow)
+        self.actionProfilingStats.setObjectName("actionProfilingStats")
+        self.actionStartCProfile = QtWidgets.QAction(MainWindow)
+        self.actionStartCProfile.setObjectName("actionStartCProfile")
+        self.actionSaveCProfile = QtWidgets.QAction(MainWindow)
+        self.actionSaveCProfile.setEnabled(False)
+        self.actionSaveCProfile.setObjectName("actionSaveCProfile")
+        self.actionMonteCarlo = QtWidgets.QAction(MainWindow)
+        self.actionMonteCarlo.setCheckable(True)
+        self.actionMonteCarlo.setObjectName("actionMonteCarlo")
+        self.actionMonteCarloSettings = QtWidgets.QAction(MainWindow)
+        self.actionMonteCarloSettings.setObjectName("actionMonteCarloSettings")
+        self.actionErrorBudget = QtWidgets.QAction(MainWindow)
+        self.actionErrorBudget.setObjectName("actionErrorBudget")
+        self.actionFitMeasurements = QtWidgets.QAction(MainWindow)
+        self.actionFitMeasurements.setObjectName("actionFitMeasurements")
+        self.actionNuGrid = QtWidgets.QAction(MainWindow)
+        self.actionNuGrid.setObjectName("actionNuGrid")
+        self.actionNoiseSpectrum = QtWidgets.QAction(MainWindow)
+        self.actionNoiseSpectrum.setObjectName("actionNoiseSpectrum")
+        self.menuPresets.addAction(self.actionLoadMacro)
+        self.menuPresets.addAction(self.actionLoadChip)
+        self.menuPresets.addSeparator()
+        self.menuPresets.addAction(self.actionLoadPresetFile)
+        self.menuPresets.addAction(self.actionSavePresetFile)
+        self.menuTools.addAction(self.actionProfiling)
+        self.menuTools.addAction(self.actionProfilingStats)
+        self.menuTools.addSeparator()
+        self.menuTools.addAction(self.actionStartCProfile)
+        self.menuTools.addAction(self.actionSaveCProfile)
+        self.menuTools.addSeparator()
+        self.menuTools.addAction(self.actionMonteCarlo)
+        self.menuTools.addAction(self.actionMonteCarloSettings)
+        self.menuTools.addSeparator()
+        self.menuTools.addAction(self.actionErrorBudget)
+        self.menuTools.addAction(self.actionFitMeasurements)
+        self.menuTools.addSeparator()
+        self.menuTools.addAction(self.actionNuGrid)
+        self.menuTools.addAction(self.actionNoiseSpectrum)
+        self.menubar.addAction(self.menuFile.menuAction())
+        self.menubar.addAction(self.menuPresets.menuAction())
+        self.menubar.addAction(self.menuTools.menuAction())
+
+        self.retranslateUi(MainWindow)
+        self.tabWidget.setCurrentIndex(0)
+        self.tabWidget_2.setCurrentIndex(0)
+        QtCore.QMetaObject.connectSlotsByName(MainWindow)
+
+    def retranslateUi(self, MainWindow):
+        _translate = QtCore.QCoreApplication.translate
+        MainWindow.setWindowTitle(_translate("MainWindow", "MainWindow"))
+        self.comboBoxArchitecture.setItemText(0, _translate("MainWindow", "Chip"))
+        self.comboBoxArchitecture.setItemText(1, _translate("MainWindow", "Macro"))
+        self.comboBoxVNoise.setItemText(0, _translate("MainWindow", "Correlated"))
+        self.comboBoxVNoise.setItemText(1, _translate("MainWindow", "Uncorrelated"))
+        self.label_8.setText(_translate("MainWindow", "Architecture :"))
+        self.label_9.setText(_translate("MainWindow", "Voltage noise :"))
+        self.comboBoxVibMode.setItemText(0, _translate("MainWindow", "Axial STR"))
+        self.comboBoxVibMode.setItemText(1, _translate("MainWindow", "Axial COM"))
+        self.comboBoxVibMode.setItemText(2, _translate("MainWindow", "Radial STR"))
+        self.comboBoxVibMode.setItemText(3, _translate("MainWindow", "Radial COM"))
+        self.label_10.setText(_translate("MainWindow", "Vibrational mode :"))
+        self.label_2.setText(_translate("MainWindow", "dzB :"))
+        self.label_3.setText(_translate("MainWindow", "Om :"))
+        self.label_4.setText(_translate("MainWindow", "nuSE :"))
+        self.label_5.setText(_translate("MainWindow", "SBa :"))
+        self.label_6.setText(_translate("MainWindow", "SV :"))
+        self.label_7.setText(_translate("MainWindow", "nuXY :"))
+        self.label_16.setText(_translate("MainWindow", "nbar :"))
+        self.labelGradient.setText(_translate("MainWindow", "100 T/m"))
+        self.labelPower.setText(_translate("MainWindow", "100 T/m"))
+        self.labelENoise.setText(_translate("MainWindow", "100 T/m"))
+        self.labelBAmbient.setText(_translate("MainWindow", "100 T/m"))
+        self.labelVNoise.setText(_translate("MainWindow", "100 T/m"))
+        self.labelNuXY.setText(_translate("MainWindow", "TextLabel"))
+        self.labelNbar.setText(_translate("MainWindow", "TextLabel"))
+        self.radioBtnPulseShaping.setText(_translate("MainWindow", "Pulse Shaping"))
+        self.radioBtnShowOffRes.setText(_translate("MainWindow", "Show"))
+        self.radioBtnIncludeOffErr.setText(_translate("MainWindow", "Include Error"))
+        self.label.setText(_translate("MainWindow", "Off-resonant coupling :"))
+        self.radioBtnOptFid.setText(_translate("MainWindow", "Optimize fidelity : "))
+        self.label_11.setText(_translate("MainWindow", "Fix nu :"))
+        self.comboBoxTraceNum.setItemText(0, _translate("MainWindow", "One"))
+        self.comboBoxTraceNum.setItemText(1, _translate("MainWindow", "Two"))
+        self.comboBoxTraceNum.setItemText(2, _translate("MainWindow", "Three"))
+        self.comboBoxTraceNum.setItemText(3, _translate("MainWindow", "Four"))
+        self.label_12.setText(_translate("MainWindow", "Trace :"))
+        self.radioBtnTraceUpdate.setText(_translate("MainWindow", "Update :       "))
+        self.radioBtnTraceHide.setText(_translate("MainWindow", "Hide :           "))
+        self.radioBtnAmpNoise.setText(_translate("MainWindow", "Amplitude noise :"))
+        self.label_13.setText(_translate("MainWindow", "Chi :"))
+        self.labelChi.setText(_translate("MainWindow", "100 T/m"))
+        self.radioBtnCCWNoise.setText(_translate("MainWindow", "CCW Current Noise :"))
+        self.labelSA.setText(_translate("MainWindow", "100 T/m"))
+        self.label_14.setText(_translate("MainWindow", "SA :"))
+        self.radioBtnSymFluc.setText(_translate("MainWindow", "Trap frequency fluctuations : "))
+        self.labelSymFluc.setText(_translate("MainWindow", "0"))
+        self.label_15.setText(_translate("MainWindow", "DeltaS"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab), _translate("MainWindow", "Error model"))
+        self.tabWidget_2.setTabText(self.tabWidget_2.indexOf(self.tab_3), _translate("MainWindow", "Heating"))
+        self.tabWidget_2.setTabText(self.tabWidget_2.indexOf(self.tab_4), _translate("MainWindow", "Decoherence"))
+        self.tabWidget_2.setTabText(self.tabWidget_2.indexOf(self.tab_5), _translate("MainWindow", "Kerr Coupling"))
+        self.tabWidget_2.setTabText(self.tabWidget_2.indexOf(self.tab_6), _translate("MainWindow", "Off-resonant coupling"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_2), _translate("MainWindow", "Help"))
+        self.menuFile.setTitle(_translate("MainWindow", "File"))
+        self.menuPresets.setTitle(_translate("MainWindow", "Presets"))
+        self.menuTools.setTitle(_translate("MainWindow", "Tools"))
+        self.actionLoadMacro.setText(_translate("MainWindow", "Load Macro"))
+        self.actionLoadChip.setText(_translate("MainWindow", "Load Chip"))
+        self.actionLoadPresetFile.setText(_translate("MainWindow", "Load from File"))
+        self.actionSavePresetFile.setText(_translate("MainWindow", "Save to File"))
+        self.actionProfiling.setText(_translate("MainWindow", "Enable Profiling"))
+        self.actionProfilingStats.setText(_translate("MainWindow", "Profiling Stats"))
+        self.actionStartCProfile.setText(_translate("MainWindow", "Start cProfile"))
+        self.actionSaveCProfile.setText(_translate("MainWindow", "Save cProfile Trace"))
+        self.actionMonteCarlo.setText(_translate("MainWindow", "Monte Carlo Bands"))
+        self.actionMonteCarloSettings.setText(_translate("MainWindow", "Monte Carlo Settings"))
+        self.actionErrorBudget.setText(_translate("MainWindow", "Error Budget"))
+        self.actionFitMeasurements.setText(_translate("MainWindow", "Fit to Measurements"))
+        self.actionNuGrid.setText(_translate("MainWindow", "COM Frequency Grid"))
+        self.actionNoiseSpectrum.setText(_translate("MainWindow", "Magnetic Noise Spectrum"))
+from pyqtgraph import PlotWidget
+
+UI_SOURCE_HASH = 'df2a9ae48b36a3ffafa93f3b1dc1aaaaf4fe477d'